@@ -0,0 +1,77 @@
+"""
+Benchmark the Secret admin changelist on a large table.
+
+Compares loading a page of full rows (what the changelist used to do)
+with the metadata-only queryset SecretAdmin uses now, and times a full
+changelist request.
+"""
+import argparse
+import datetime
+import os
+import uuid
+
+from common import setup_django, timed, report
+
+
+def populate(rows, size):
+    from django.utils import timezone
+    from django_secrets.models import Secret
+
+    now = timezone.now()
+    payload = 'x' * size
+    batch = []
+    for i in range(rows):
+        created_at = now - datetime.timedelta(seconds=i)
+        batch.append(Secret(
+            id=uuid.uuid4(), data=payload, salt=os.urandom(16), size=size,
+            created_at=created_at,
+            expires_at=created_at + datetime.timedelta(minutes=10)))
+        if len(batch) == 1000:
+            Secret.objects.bulk_create(batch)
+            batch = []
+    Secret.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=50 * 1024,
+                        help='ciphertext size per row in bytes')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from django_secrets.models import Secret
+
+    setup_test_environment()
+    print('populating %d rows of %d bytes...' % (args.rows, args.size))
+    populate(args.rows, args.size)
+
+    def full_rows():
+        list(Secret.objects.order_by('-created_at')[:100])
+
+    def metadata_rows():
+        list(Secret.objects.only('id', 'size', 'expires_at', 'created_at')
+             .order_by('-created_at')[:100])
+
+    User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+    client = Client()
+    client.login(username='bench', password='bench')
+    url = reverse('admin:django_secrets_secret_changelist')
+
+    def changelist():
+        response = client.get(url)
+        assert response.status_code == 200
+
+    report('page of 100 full rows', *timed(full_rows, args.repeat))
+    report('page of 100 metadata rows', *timed(metadata_rows, args.repeat))
+    report('admin changelist request', *timed(changelist, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
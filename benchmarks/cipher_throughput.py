@@ -0,0 +1,48 @@
+"""
+Encrypt/decrypt throughput of the cipher engines across payload sizes.
+
+Runs fernet_encrypt/fernet_decrypt and aead_encrypt/aead_decrypt from
+django_secrets.utils with a fixed key, so the PBKDF2 key derivation every
+real request also pays is left out, e.g.::
+
+    python benchmarks/cipher_throughput.py --sizes 1024 51200 1048576
+"""
+import argparse
+import os
+
+from common import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[256, 4 * 1024, 50 * 1024, 1024 * 1024])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django_secrets import utils
+
+    key = os.urandom(32)
+    engines = (
+        ('fernet', lambda plain: utils.fernet_encrypt(key, plain),
+         lambda token: utils.fernet_decrypt(key, token)),
+        ('aes-256-gcm', lambda plain: utils.aead_encrypt(key, plain, utils.AES_256_GCM),
+         lambda token: utils.aead_decrypt(key, token)),
+        ('chacha20-poly1305', lambda plain: utils.aead_encrypt(key, plain, utils.CHACHA20_POLY1305),
+         lambda token: utils.aead_decrypt(key, token)),
+    )
+
+    for size in args.sizes:
+        plain = os.urandom(size)
+        for name, encrypt, decrypt in engines:
+            token = encrypt(plain)
+            best_encrypt, _ = timed(lambda: encrypt(plain), args.repeat)
+            best_decrypt, _ = timed(lambda: decrypt(token), args.repeat)
+            print('%-18s %8d B   stored %8d B   encrypt %8.1f MB/s   decrypt %8.1f MB/s'
+                  % (name, size, len(token),
+                     size / best_encrypt / 1e6, size / best_decrypt / 1e6))
+
+
+if __name__ == '__main__':
+    main()
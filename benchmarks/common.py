@@ -0,0 +1,51 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks run against a throwaway database, never against the one
+configured for development. Run them from the repository root, e.g.::
+
+    python benchmarks/admin_changelist.py --rows 20000
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(settings_module='website.settings.testing', databases=None):
+    """Configure Django on a temporary SQLite file and migrate it"""
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    from django.conf import settings
+
+    if databases is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='secrets-bench-'), 'bench.sqlite3')
+        databases = {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': path,
+            }
+        }
+    settings.DATABASES = databases
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def timed(func, repeat=5):
+    """Run func repeat times and return (best, mean) wall time in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def report(label, best, mean):
+    print('%-48s best %8.2f ms   mean %8.2f ms' % (label, best * 1000, mean * 1000))
@@ -0,0 +1,80 @@
+"""
+Peak memory allocated by encrypting and decrypting one secret.
+
+Compares the current bytes-based path in django_secrets.utils with the
+previous one (Fernet, then base64 of the Fernet token), measured with
+tracemalloc. Both include the key derivation, which allocates little but
+dominates the time, e.g.::
+
+    python benchmarks/crypto_memory.py --sizes 1024 10240 51200
+"""
+import argparse
+import base64
+import tracemalloc
+
+from common import setup_django
+
+
+def previous_encrypt(data, passphrase, salt):
+    from cryptography.fernet import Fernet
+    from django_secrets.utils import passphrase_to_key
+
+    len(bytes(data.encode('utf-8')))  # the old size check in clean_data
+    token = Fernet(passphrase_to_key(passphrase, salt)).encrypt(data.encode('utf-8'))
+    return base64.b64encode(token).decode('ascii')
+
+
+def previous_decrypt(token, passphrase, salt):
+    from cryptography.fernet import Fernet
+    from django_secrets.utils import passphrase_to_key
+
+    token = base64.b64decode(token.encode('ascii'))
+    return Fernet(passphrase_to_key(passphrase, salt)).decrypt(token).decode('utf-8')
+
+
+def current_encrypt(data, passphrase, salt):
+    from django_secrets.utils import encrypt
+
+    len(data) if data.isascii() else len(data.encode('utf-8'))
+    return encrypt(data, passphrase, salt)
+
+
+def peak(func, *args):
+    """Peak bytes allocated while func runs, and its result"""
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 10 * 1024, 50 * 1024])
+    args = parser.parse_args()
+
+    setup_django()
+    from django_secrets.utils import decrypt, generate_salt
+
+    salt = generate_salt()
+    engines = (
+        ('previous', previous_encrypt, previous_decrypt),
+        ('current', current_encrypt, decrypt),
+    )
+    for name, encrypt, decrypt_ in engines:
+        # Warm up, so imports and caches aren't counted
+        decrypt_(encrypt('warm up', 'passphrase', salt), 'passphrase', salt)
+
+    for size in args.sizes:
+        data = 'x' * size
+        for name, encrypt, decrypt_ in engines:
+            create, token = peak(encrypt, data, 'passphrase', salt)
+            reveal, plain = peak(decrypt_, token, 'passphrase', salt)
+            assert plain == data
+            print('%-9s %6d B   stored %6d B   create peak %7.1f KiB   reveal peak %7.1f KiB'
+                  % (name, size, len(token), create / 1024, reveal / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Latency of the first requests a fresh process serves, with and without warm-up.
+
+Every run starts a new Python process, loads website.wsgi's application on
+a throwaway SQLite database (with SECRETS_WARMUP on or off) and, starting
+without a database connection like a freshly forked worker, times its
+first few GET requests to the create page and to a secret's page, which
+looks it up, then its first encryption with a fixed key. Warm runs open
+the connection the way gunicorn.conf.py's post_fork hook does, e.g.::
+
+    python benchmarks/first_request.py --runs 5
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from common import setup_django
+
+
+def get(application, path):
+    """Time one GET through the WSGI application, in seconds"""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    start = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for chunk in response:
+            pass
+    finally:
+        response.close()
+    elapsed = time.perf_counter() - start
+    if not statuses[0].startswith('200'):
+        raise SystemExit('%s answered %s' % (path, statuses[0]))
+    return elapsed
+
+
+def child(warm, requests):
+    from django.conf import settings
+    path = os.path.join(tempfile.mkdtemp(prefix='secrets-bench-'), 'bench.sqlite3')
+    # Connections kept between requests, as in the deployed settings
+    setup_django(databases={'default': {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'CONN_MAX_AGE': 600}})
+    settings.SECRETS_WARMUP = warm
+
+    from django_secrets.models import Secret
+    from django_secrets.utils import generate_salt
+    secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+    from django.db import connections
+    # What the master hands its workers
+    connections.close_all()
+
+    start = time.perf_counter()
+    from website.wsgi import application
+    load = time.perf_counter() - start
+
+    if warm:
+        from django_secrets import warmup
+        warmup.connect()
+
+    from django.urls import reverse
+    timings = [get(application, reverse('secrets:secret-create')) for _ in range(requests)]
+    lookups = [get(application, secret.get_absolute_url()) for _ in range(requests)]
+
+    from django_secrets import utils
+    key = os.urandom(32)
+    start = time.perf_counter()
+    utils.fernet_encrypt(key, b'x' * 1024)
+    encrypt = time.perf_counter() - start
+    print(json.dumps({'load': load, 'requests': timings, 'lookups': lookups,
+                      'encrypt': encrypt}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=3)
+    parser.add_argument('--child', choices=('warm', 'cold'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child == 'warm', args.requests)
+
+    for mode in ('cold', 'warm'):
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--child', mode, '--requests', str(args.requests)])
+            results.append(json.loads(output.decode().strip().splitlines()[-1]))
+        best = lambda values: min(values) * 1000
+        requests, lookups = (' '.join('%7.2f' % best([r[kind][i] for r in results])
+                                      for i in range(args.requests))
+                             for kind in ('requests', 'lookups'))
+        print('%-5s load %8.1f ms   create %s ms   lookup %s ms   first encrypt %6.2f ms'
+              % (mode, best([r['load'] for r in results]), requests, lookups,
+                 best([r['encrypt'] for r in results])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Memory and cost of tracking clients, per-IP cache entries against the sketch.
+
+Replays a flood of requests from many distinct addresses plus a few heavy
+clients, counting them once with one LocMemCache entry per IP (what
+django-ratelimit does) and once with heavy_hitters.Tracker, and reports
+the memory each kept, the time per request and whether the heavy clients
+were found, e.g.::
+
+    python benchmarks/heavy_hitters.py --clients 200000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from common import setup_django
+
+HEAVY = ['203.0.113.%d' % i for i in range(1, 6)]
+
+
+def traffic(clients, heavy_share):
+    rng = random.Random(0)
+    for i in range(clients):
+        yield '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)
+        if rng.random() < heavy_share:
+            yield rng.choice(HEAVY)
+
+
+def measure(label, make_counter, requests):
+    """Time one replay, then trace the memory another one keeps"""
+    count = make_counter()
+    start = time.perf_counter()
+    for address in requests:
+        count(address)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    kept = make_counter()
+    for address in requests:
+        kept(address)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('%-8s %8d requests   %8.2f us/request   %10.1f KiB kept'
+          % (label, len(requests), elapsed / len(requests) * 1e6, memory / 1024))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200000)
+    parser.add_argument('--heavy-share', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache.backends.locmem import LocMemCache
+    from django_secrets import heavy_hitters
+
+    def per_ip():
+        # The cache a worker uses, large enough to keep every client
+        cache = LocMemCache('bench', {'OPTIONS': {'MAX_ENTRIES': args.clients * 2}})
+        cache.clear()
+
+        def count(address):
+            key = 'rl:%s' % address
+            if not cache.add(key, 1, 3600):
+                cache.incr(key)
+        count.cache = cache
+        return count
+
+    def sketch():
+        tracker = heavy_hitters.Tracker()
+
+        def count(address):
+            tracker.record('requests', address)
+        count.tracker = tracker
+        return count
+
+    requests = list(traffic(args.clients, args.heavy_share))
+    cache = measure('cache', per_ip, requests).cache
+    tracker = measure('sketch', sketch, requests).tracker
+
+    found = [label for label, estimate in tracker.heaviest('requests', 'ip')[:len(HEAVY)]]
+    print('heavy clients found: %d of %d' % (len(set(found) & set(HEAVY)), len(HEAVY)))
+    for label, estimate in tracker.heaviest('requests', 'ip')[:len(HEAVY)]:
+        print('  %-16s estimate %6d   cache %6d' % (label, estimate, cache.get('rl:%s' % label)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Create/reveal throughput and WAL volume of logged vs UNLOGGED secrets tables.
+
+Creates a throwaway test database on the PostgreSQL configured by
+website.settings.testing_postgres (POSTGRES_HOST, POSTGRES_USER, ...),
+then for each table mode inserts --rows secrets and reveals them (fetch
+and delete) through the ORM, one transaction each like the views. The
+PBKDF2 key derivation is left out, since it costs the same either way.
+WAL volume is read from pg_current_wal_lsn() before and after, e.g.::
+
+    POSTGRES_HOST=/tmp python benchmarks/postgres_unlogged.py --rows 2000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+from common import ROOT
+
+
+def measure(connection, rows, size):
+    from django_secrets.models import Secret
+    from django_secrets.utils import generate_salt
+
+    def wal_position():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_current_wal_lsn()')
+            return cursor.fetchone()[0]
+
+    def wal_since(start):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)', [start])
+            return int(cursor.fetchone()[0])
+
+    data = 'x' * size
+    ids = [uuid.uuid4() for _ in range(rows)]
+
+    wal = wal_position()
+    start = time.perf_counter()
+    for pk in ids:
+        Secret.objects.create(id=pk, data=data, salt=generate_salt())
+    create_time, create_wal = time.perf_counter() - start, wal_since(wal)
+
+    wal = wal_position()
+    start = time.perf_counter()
+    for pk in ids:
+        secret = Secret.objects.get(pk=pk)
+        secret.delete()
+    reveal_time, reveal_wal = time.perf_counter() - start, wal_since(wal)
+    return create_time, create_wal, reveal_time, reveal_wal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=1400,
+                        help='Ciphertext size in bytes (1 KB of plaintext is about 1.4 KB).')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website.settings.testing_postgres')
+    import django
+    django.setup()
+    from django.db import connection
+    from django_secrets import unlogged
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        for logged in (True, False):
+            unlogged.set_logged(connection, logged)
+            create_time, create_wal, reveal_time, reveal_wal = measure(connection, args.rows, args.size)
+            print('%-9s create %8.0f/s  %8.0f WAL B/secret   reveal %8.0f/s  %8.0f WAL B/secret'
+                  % ('logged' if logged else 'unlogged',
+                     args.rows / create_time, create_wal / args.rows,
+                     args.rows / reveal_time, reveal_wal / args.rows))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Cost of reading the stored totals, from the counters against a table scan.
+
+Fills the secrets table with --rows rows, then times quota.usage() (a sum
+over the counter slots) and the COUNT/SUM over the secrets table it
+replaces, e.g.::
+
+    python benchmarks/quota_usage.py --rows 100000
+"""
+import argparse
+import datetime
+import uuid
+
+from common import report, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    from django.conf import settings
+    setup_django()
+    settings.SECRETS_QUOTA = {'MAX_BYTES': 1 << 30}
+
+    from django.db.models import Count, Sum
+    from django.utils import timezone
+    from django_secrets import quota
+    from django_secrets.models import Secret
+
+    expires_at = timezone.now() + datetime.timedelta(days=1)
+    for start in range(0, args.rows, 5000):
+        Secret.objects.bulk_create(
+            Secret(id=uuid.uuid4(), data='x' * 200, size=200, salt=b'0' * 16, expires_at=expires_at)
+            for _ in range(start, min(start + 5000, args.rows)))
+    quota.recount()
+
+    def counters():
+        for _ in range(args.repeat):
+            quota.usage()
+
+    def scan():
+        for _ in range(args.repeat):
+            Secret.objects.aggregate(secrets=Count('pk'), bytes=Sum('size'))
+
+    for label, func in (('counters', counters), ('table scan', scan)):
+        best, mean = timed(func)
+        report('%s, %d rows, per read' % (label, args.rows), best / args.repeat, mean / args.repeat)
+
+
+if __name__ == '__main__':
+    main()
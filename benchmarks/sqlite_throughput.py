@@ -0,0 +1,172 @@
+"""
+Create/reveal throughput of several gunicorn workers sharing one SQLite file.
+
+Starts gunicorn on a throwaway database using website.settings.single_node
+and drives it with concurrent clients, each creating a secret and then
+revealing it. Run once with the profile's pragmas and once with
+--no-pragmas to compare against SQLite's default rollback journal.
+
+Each create and reveal also runs PBKDF2, so HTTP numbers include that CPU
+cost. --orm skips HTTP and the KDF: --workers processes insert and delete
+secrets through the ORM directly, which isolates the database side.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT
+
+SETTINGS = '''
+from website.settings.single_node import *
+DATABASES['default']['NAME'] = %(db)r
+RATELIMIT_ENABLE = False
+# Measure the database, not load shedding
+SECRETS_ADMISSION = None
+# No collectstatic for a throwaway run
+STORAGES['staticfiles']['BACKEND'] = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+%(pragmas)s
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare(directory, pragmas):
+    with open(os.path.join(directory, 'bench_settings.py'), 'w') as f:
+        f.write(SETTINGS % {
+            'db': os.path.join(directory, 'bench.sqlite3'),
+            'pragmas': '' if pragmas else 'SECRETS_SQLITE_PRAGMAS = None',
+        })
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([directory, ROOT]),
+               DJANGO_SETTINGS_MODULE='bench_settings',
+               SECRET_KEY='benchmark-only-secret-key',
+               ALLOWED_HOSTS='127.0.0.1')
+    subprocess.check_call([sys.executable, os.path.join(ROOT, 'manage.py'),
+                           'migrate', '--verbosity', '0'], env=env)
+    return env
+
+
+def roundtrip(base_url):
+    """Create a secret and reveal it; return True when both succeed"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+
+    opener.open(base_url + '/').read()
+    token = next(c.value for c in jar if c.name == 'csrftoken')
+    headers = {'Referer': base_url + '/'}
+
+    body = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': token, 'data': 'x' * 1024, 'passphrase': 'bench',
+    }).encode()
+    response = opener.open(urllib.request.Request(base_url + '/', body, headers))
+    oid = re.search(r'/([A-Za-z0-9_-]+)/?$', response.geturl()).group(1)
+    response.read()
+
+    body = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': token, 'passphrase': 'bench',
+    }).encode()
+    response = opener.open(urllib.request.Request(
+        '%s/%s/' % (base_url, oid), body, headers))
+    return response.status == 200
+
+
+def orm_worker(env, count):
+    """Insert and delete count secrets the way a create and a reveal do"""
+    os.environ.update(env)
+    sys.path[:0] = env['PYTHONPATH'].split(os.pathsep)
+    import django
+    django.setup()
+    import uuid
+    from django_secrets.models import Secret
+    from django_secrets.sqlite import retry_on_locked
+
+    errors = 0
+    for _ in range(count):
+        try:
+            secret = retry_on_locked(lambda: Secret.objects.create(
+                id=uuid.uuid4(), data='x' * 1400, salt=os.urandom(16)))
+            retry_on_locked(secret.delete)
+        except Exception:
+            errors += 1
+    return errors
+
+
+def run_orm(args, env):
+    from multiprocessing import Pool
+
+    per_worker = args.roundtrips // args.workers
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        errors = sum(pool.starmap(orm_worker, [(env, per_worker)] * args.workers))
+    elapsed = time.perf_counter() - start
+    total = per_worker * args.workers
+
+    print('orm pragmas=%s workers=%d' % (args.pragmas, args.workers))
+    print('%d insert+delete pairs in %.2f s: %.1f/s, %d errors'
+          % (total, elapsed, total / elapsed, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--roundtrips', type=int, default=200)
+    parser.add_argument('--no-pragmas', dest='pragmas', action='store_false')
+    parser.add_argument('--orm', action='store_true',
+                        help='drive the database directly instead of over HTTP')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='secrets-bench-')
+    env = prepare(directory, args.pragmas)
+    if args.orm:
+        return run_orm(args, env)
+    port = free_port()
+    server = subprocess.Popen(
+        ['gunicorn', 'website.wsgi', '--workers', str(args.workers),
+         '--bind', '127.0.0.1:%d' % port, '--log-level', 'warning'],
+        cwd=ROOT, env=env)
+    base_url = 'http://127.0.0.1:%d' % port
+
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + '/').read()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        errors = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            futures = [pool.submit(roundtrip, base_url) for _ in range(args.roundtrips)]
+            for future in futures:
+                try:
+                    if not future.result():
+                        errors += 1
+                except Exception:
+                    errors += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    print('pragmas=%s workers=%d clients=%d' % (args.pragmas, args.workers, args.clients))
+    print('%d create+reveal roundtrips in %.2f s: %.1f/s, %d errors'
+          % (args.roundtrips, elapsed, args.roundtrips / elapsed, errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Render time of the public pages with the Django engine and with Jinja2.
+
+Both engines render the same pages from the same context: the create form
+(unbound and with errors), the reveal form and the revealed secret, e.g.::
+
+    python benchmarks/template_render.py --renders 1000
+"""
+import argparse
+import uuid
+
+from common import report, setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=1000)
+    args = parser.parse_args()
+
+    from django.conf import settings
+    setup_django()
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.TEMPLATES = [settings.JINJA2_TEMPLATES, *settings.TEMPLATES]
+
+    from django.template import engines
+    from django.test import RequestFactory
+    from django_secrets.forms import SecretCreateForm, SecretUpdateForm
+    from django_secrets.models import Secret
+
+    request = RequestFactory().get('/')
+    secret = Secret(id=uuid.uuid4())
+    secret.decrypted_data = 'correct horse battery staple'
+    invalid = SecretCreateForm(data={'data': '', 'passphrase': '', 'ttl': '3'})
+    invalid.is_valid()
+    pages = (
+        ('create', 'django_secrets/secret_create.html', lambda: {'form': SecretCreateForm()}),
+        ('create, errors', 'django_secrets/secret_create.html', lambda: {'form': invalid}),
+        ('update', 'django_secrets/secret_update.html',
+         lambda: {'form': SecretUpdateForm(instance=secret), 'object': secret}),
+        ('detail', 'django_secrets/secret_detail.html', lambda: {'object': secret}),
+    )
+
+    for label, name, context in pages:
+        for engine in ('django', 'jinja2'):
+            template = engines[engine].get_template(name)
+            # First render outside the timings, as a warm worker would
+            template.render(context(), request)
+
+            def render():
+                for _ in range(args.renders):
+                    template.render(context(), request)
+            best, mean = timed(render)
+            report('%s %s, per render' % (engine, label), best / args.renders, mean / args.renders)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,164 @@
+import datetime
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
 from django.template.defaultfilters import filesizeformat
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import gettext_lazy as _, ngettext
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+from django.utils import timezone
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
 from django.contrib import admin
-from .models import Secret
+from . import heavy_hitters, sharding, usage
+from .models import Secret, UsageBucket
+
+CURSOR_VAR = 'after'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner statistics for unfiltered lists"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            table = queryset.model._meta.db_table
+            with connection.cursor() as cursor:
+                # Sum over the table and its partitions, if it has any
+                cursor.execute(
+                    "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0) FROM pg_class "
+                    "WHERE oid = %s::regclass OR oid IN ("
+                    "SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                    [table, table])
+                estimate = int(cursor.fetchone()[0])
+            if estimate > 0:
+                return estimate
+        return super(EstimatedCountPaginator, self).count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist that pages on (created_at, id) instead of OFFSET, so the
+    cost of a page doesn't depend on how deep into the table it is.
+    """
+    next_cursor = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super(KeysetChangeList, self).get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing filters must restart from the first page
+        new_params = dict(new_params or {})
+        new_params.setdefault(CURSOR_VAR, None)
+        return super(KeysetChangeList, self).get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page)
+        queryset = self.queryset.order_by('-created_at', '-id')
+
+        cursor = self.params.get(CURSOR_VAR)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        page = list(queryset[:self.list_per_page + 1])
+        if len(page) > self.list_per_page:
+            page = page[:self.list_per_page]
+            self.next_cursor = encode_cursor(page[-1])
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = page
+        self.can_show_all = False
+        self.multi_page = bool(cursor or self.next_cursor)
+        self.paginator = paginator
+
+    def get_next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def get_first_page_url(self):
+        return self.get_query_string()
+
+
+def encode_cursor(obj):
+    return '%s_%s' % (obj.created_at.isoformat(), obj.pk.hex)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = cursor.rsplit('_', 1)
+        created_at = datetime.datetime.fromisoformat(created_at)
+        return created_at, Secret._meta.pk.to_python(pk)
+    except Exception:
+        raise IncorrectLookupParameters
+
+
+class CreatedWithinListFilter(admin.SimpleListFilter):
+    """Fixed time buckets, so drilling down never aggregates over the table"""
+    title = _('created')
+    parameter_name = 'created'
+    buckets = (
+        ('1', _('Last minute'), datetime.timedelta(minutes=1)),
+        ('5', _('Last 5 minutes'), datetime.timedelta(minutes=5)),
+        ('10', _('Last 10 minutes'), datetime.timedelta(minutes=10)),
+        ('60', _('Last hour'), datetime.timedelta(hours=1)),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, label, delta in self.buckets]
+
+    def queryset(self, request, queryset):
+        for value, label, delta in self.buckets:
+            if self.value() == value:
+                return queryset.filter(created_at__gte=timezone.now() - delta)
+        return queryset
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """Pick the database to list; SecretAdmin.get_queryset applies it"""
+    title = _('shard')
+    parameter_name = 'shard'
+
+    @classmethod
+    def get_shard(cls, request):
+        shards = sharding.get_shards()
+        alias = request.GET.get(cls.parameter_name) or shards[0]
+        if alias not in shards:
+            raise IncorrectLookupParameters
+        return alias
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.get_shards()]
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        current = self.value() or sharding.get_shards()[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': current == alias,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
 
 
 class SecretAdmin(admin.ModelAdmin):
-    actions = ('delete', )
+    actions = ('purge_selected', )
     list_display_links = None
     list_display = ('id', 'on_site', 'pretty_size', 'pretty_expire_at',
-                    'created_at', )
+                    'creator_ip', 'created_at', )
     list_filter = ('created_at', )
     date_hierarchy = 'created_at'
     ordering = ('-created_at', )
@@ -18,12 +166,55 @@ class SecretAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
 
+    def get_queryset(self, request):
+        # Listings only need metadata, never the (up to 50 KB) ciphertext
+        qs = super(SecretAdmin, self).get_queryset(request)
+        if sharding.is_enabled():
+            qs = qs.using(ShardListFilter.get_shard(request))
+        return qs.only('id', 'size', 'expires_at', 'creator_ip', 'created_at')
+
+    def get_object(self, request, object_id, from_field=None):
+        # A single secret is fetched from its own shard, whatever is listed
+        try:
+            alias = sharding.database_for(object_id)
+        except ValueError:
+            return None
+        queryset = self.get_queryset(request).using(alias)
+        try:
+            return queryset.get(pk=object_id)
+        except (Secret.DoesNotExist, ValidationError):
+            return None
+
+    def get_list_filter(self, request):
+        list_filter = super(SecretAdmin, self).get_list_filter(request)
+        if sharding.is_enabled():
+            list_filter = (ShardListFilter, ) + tuple(list_filter)
+        return list_filter
+
+    def get_actions(self, request):
+        # The stock action loads every selected row before deleting it
+        actions = super(SecretAdmin, self).get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description=_('Delete selected secrets'), permissions=['delete'])
+    def purge_selected(self, request, queryset):
+        batch_size = getattr(settings, 'SECRETS_PURGE_BATCH_SIZE', 1000)
+        deleted = batches = 0
+        for count in queryset.delete_in_batches(batch_size):
+            deleted += count
+            batches += 1
+        self.message_user(request, ngettext(
+            'Deleted %(count)d secret in %(batches)d batch(es).',
+            'Deleted %(count)d secrets in %(batches)d batch(es).',
+            deleted) % {'count': deleted, 'batches': batches})
+
     def pretty_size(self, obj):
         return filesizeformat(obj.size)
     pretty_size.short_description = _('size')
 
     def pretty_expire_at(self, obj):
-        return naturaltime(obj.expire_at)
+        return naturaltime(obj.expires_at)
     pretty_expire_at.short_description = _('expire at')
 
     def on_site(self, obj):
@@ -34,4 +225,67 @@ class SecretAdmin(admin.ModelAdmin):
     on_site.short_description = _('View on site')
 
 
-admin.site.register(Secret, SecretAdmin)
+class LargeTableSecretAdmin(SecretAdmin):
+    """
+    SecretAdmin for tables with millions of rows: estimated counts,
+    keyset pagination and fixed time buckets instead of a date hierarchy.
+    Enable it with SECRETS_ADMIN_LARGE_TABLE = True.
+    """
+    list_filter = (CreatedWithinListFilter, )
+    date_hierarchy = None
+    sortable_by = ()
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    change_list_template = 'admin/django_secrets/secret/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class UsageBucketAdmin(admin.ModelAdmin):
+    """Read-only dashboard over the per-minute usage counters"""
+    list_display = ('minute', 'created', 'revealed', 'expired', 'failed_attempts',
+                    'pretty_bytes_stored', 'average_size', )
+    date_hierarchy = 'minute'
+    change_list_template = 'admin/django_secrets/usagebucket/change_list.html'
+    windows = (
+        (_('Last hour'), datetime.timedelta(hours=1)),
+        (_('Last 24 hours'), datetime.timedelta(days=1)),
+        (_('Last 7 days'), datetime.timedelta(days=7)),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        now = timezone.now()
+        summary = []
+        for label, delta in self.windows:
+            counts = usage.totals(now - delta)
+            created = counts['created']
+            summary.append(dict(
+                counts, label=label,
+                reveal_rate=counts['revealed'] / created if created else None,
+                average_size=counts['bytes_stored'] // created if created else None))
+        extra_context = dict(extra_context or {}, usage_summary=summary,
+                             offenders=heavy_hitters.offenders())
+        return super(UsageBucketAdmin, self).changelist_view(request, extra_context)
+
+    def pretty_bytes_stored(self, obj):
+        return filesizeformat(obj.bytes_stored)
+    pretty_bytes_stored.short_description = _('bytes stored')
+
+    def average_size(self, obj):
+        return filesizeformat(obj.bytes_stored // obj.created) if obj.created else '-'
+    average_size.short_description = _('average size')
+
+
+admin.site.register(UsageBucket, UsageBucketAdmin)
+
+if getattr(settings, 'SECRETS_ADMIN_LARGE_TABLE', False):
+    admin.site.register(Secret, LargeTableSecretAdmin)
+else:
+    admin.site.register(Secret, SecretAdmin)
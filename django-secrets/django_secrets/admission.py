@@ -0,0 +1,137 @@
+"""
+Admission control for the views that run the key derivation.
+
+Every create and reveal POST spends a few hundred milliseconds of CPU in
+PBKDF2. Under a spike those requests queue behind each other until the
+server times them out, so each one fails slowly after using CPU. The
+``admission_control`` decorator sheds them early with a 503 and a
+Retry-After header instead, when either:
+
+- the request already waited longer than MAX_QUEUE_TIME seconds before
+  reaching Django, according to the X-Request-Start header set by the
+  router or proxy (Heroku, nginx, Apache); or
+- MAX_CONCURRENCY requests are already doing KDF work. The slots are
+  counted per process, or per node when LOCK_DIR names a directory all
+  workers share; each slot is then a file lock, released by the kernel
+  if its worker dies.
+
+Enable it with SECRETS_ADMISSION = {'MAX_CONCURRENCY': ...,
+'MAX_QUEUE_TIME': ..., 'LOCK_DIR': ..., 'RETRY_AFTER': ...}. Only
+decorated views (the POST handlers) are ever shed; static files and form
+pages are not.
+"""
+import contextlib
+import functools
+import os
+import random
+import threading
+import time
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.translation import gettext as _
+from . import metrics
+
+
+def get_config():
+    return getattr(settings, 'SECRETS_ADMISSION', None) or None
+
+
+def queue_time(request, now=None):
+    """Seconds the request waited before reaching Django, or None if unknown"""
+    value = request.META.get('HTTP_X_REQUEST_START', '')
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        start = float(value)
+    except ValueError:
+        return None
+    # Heroku sends milliseconds, Apache microseconds, nginx seconds
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max(0.0, (now or time.time()) - start)
+
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def process_slot(limit):
+    """Hold one of limit slots shared by the threads of this process, if free"""
+    with _semaphores_lock:
+        semaphore = _semaphores.get(limit)
+        if semaphore is None:
+            semaphore = _semaphores[limit] = threading.BoundedSemaphore(limit)
+    if not semaphore.acquire(blocking=False):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        semaphore.release()
+
+
+@contextlib.contextmanager
+def node_slot(directory, limit):
+    """Hold one of limit slots shared by every process on the node, if free"""
+    import fcntl
+
+    os.makedirs(directory, exist_ok=True)
+    first = random.randrange(limit)
+    for i in range(limit):
+        path = os.path.join(directory, 'slot-%d.lock' % ((first + i) % limit))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return
+    yield False
+
+
+def slot(config):
+    limit = config.get('MAX_CONCURRENCY')
+    if not limit:
+        return contextlib.nullcontext(True)
+    if config.get('LOCK_DIR'):
+        return node_slot(config['LOCK_DIR'], limit)
+    return process_slot(limit)
+
+
+def shed(config, reason):
+    metrics.increment('admission_shed_%s' % reason)
+    response = HttpResponse(
+        _('We are busy right now, please try again in a moment.'),
+        status=503, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(config.get('RETRY_AFTER', 1))
+    return response
+
+
+def admission_control(view):
+    """Shed requests to view once the KDF concurrency or queue budget is spent"""
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        config = get_config()
+        if config is None:
+            return view(request, *args, **kwargs)
+
+        budget = config.get('MAX_QUEUE_TIME')
+        if budget is not None:
+            waited = queue_time(request)
+            if waited is not None and waited > budget:
+                return shed(config, 'queue_time')
+
+        with slot(config) as admitted:
+            if not admitted:
+                return shed(config, 'concurrency')
+            metrics.increment('admission_admitted')
+            return view(request, *args, **kwargs)
+    return wrapped
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class SecretsConfig(AppConfig):
+    name = 'django_secrets'
+
+    def ready(self):
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
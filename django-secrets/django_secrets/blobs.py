@@ -0,0 +1,87 @@
+"""
+Ciphertext kept outside the database.
+
+When SECRETS_BLOB_STORAGE names an entry of STORAGES, new secrets write
+their ciphertext to that storage and the row keeps only the blob name, so
+the table, its cache footprint and its backups stay small whatever the
+payload size. Any Django storage backend works, including S3-compatible
+ones; ``BlobStorage`` is the local default. Blobs are removed together
+with their rows, by ``Secret.delete()`` and by batch purges.
+"""
+import contextlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+
+
+class BlobStorage(FileSystemStorage):
+    """Local storage that writes blobs atomically, readable by the owner only"""
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Readers only ever see a missing or a complete file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+        return str(name).replace('\\', '/')
+
+
+def get_storage():
+    """The storage configured by SECRETS_BLOB_STORAGE, or None"""
+    alias = getattr(settings, 'SECRETS_BLOB_STORAGE', None)
+    if not alias:
+        return None
+    return storages[alias]
+
+
+def is_enabled():
+    return get_storage() is not None
+
+
+def blob_name(pk):
+    # Fan out over 256 directories so none of them grows huge
+    return '%s/%s' % (pk.hex[:2], pk.hex)
+
+
+def write(pk, data):
+    """Store the ciphertext of a secret and return the blob name"""
+    return get_storage().save(blob_name(pk), ContentFile(data.encode('ascii')))
+
+
+def read(name):
+    """The ciphertext stored under name; FileNotFoundError if it is gone"""
+    storage = get_storage()
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        with storage.open(name, 'rb') as f:
+            return f.read().decode('ascii')
+
+    # A plain read: blobs are at most a few tens of KB, where mmap only
+    # adds system calls, and the str is a copy either way
+    with open(path, 'rb') as f:
+        return f.read().decode('ascii')
+
+
+def delete(*names):
+    """Remove blobs, ignoring ones that are already gone"""
+    storage = get_storage()
+    if storage is None:
+        return
+    for name in names:
+        if name:
+            storage.delete(name)
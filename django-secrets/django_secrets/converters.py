@@ -0,0 +1,14 @@
+from .utils import decode_id
+
+
+class OidConverter(object):
+    """Matches a base64-encoded UUID: 22 characters, the last one holding 2 bits"""
+    regex = '[A-Za-z0-9_-]{21}[AQgw]'
+
+    def to_python(self, value):
+        if decode_id(value) is None:
+            raise ValueError(value)
+        return value
+
+    def to_url(self, value):
+        return value
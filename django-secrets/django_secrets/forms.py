@@ -1,10 +1,41 @@
+import base64
+import datetime
 import uuid
 from cryptography.fernet import InvalidToken
+from django.core.validators import MaxValueValidator
 from django.template.defaultfilters import filesizeformat
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import gettext_lazy as _, ngettext
+from django.utils import timezone
+from django.conf import settings
 from django import forms
-from .models import Secret
-from .utils import encrypt, decrypt, generate_salt
+from django.db import router, transaction
+from django.http import Http404
+from django.urls import reverse
+from . import metrics, proof_of_work, quota
+from .models import Payload, Secret
+from .sharding import co_located_id
+from .utils import (ciphertext_size, encrypt, decrypt, derive_key, encrypt_with_key,
+                    generate_data_key, generate_salt, get_default_ttl, get_ttl_bounds, wipe)
+
+# A data key as wrapped by save_shared(), base64 of 32 bytes
+WRAPPED_KEY_SIZE = 44
+
+# Lifetimes offered on the create form, in minutes, within the configured bounds
+TTL_CHOICES = (1, 5, 10, 30, 60, 6 * 60, 24 * 60, 7 * 24 * 60)
+
+
+def ttl_label(minutes):
+    if minutes % (24 * 60) == 0:
+        days = minutes // (24 * 60)
+        return ngettext('%(count)d day', '%(count)d days', days) % {'count': days}
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return ngettext('%(count)d hour', '%(count)d hours', hours) % {'count': hours}
+    return ngettext('%(count)d minute', '%(count)d minutes', minutes) % {'count': minutes}
+
+
+def get_max_recipients():
+    return getattr(settings, 'SECRETS_MAX_RECIPIENTS', 10)
 
 
 class SecretCreateForm(forms.ModelForm):
@@ -17,10 +48,35 @@ class SecretCreateForm(forms.ModelForm):
         error_messages={
             'required': _('Oops! Double check that passphrase'),
         })
+    ttl = forms.TypedChoiceField(
+        coerce=int,
+        required=False,
+        label=_('Expires after'),
+        error_messages={
+            'invalid_choice': _('Oops! Pick one of the available lifetimes'),
+        })
+
+    recipients = forms.IntegerField(
+        required=False,
+        min_value=1,
+        initial=1,
+        label=_('Links'),
+        help_text=_('Each link shows the secret once.'),
+        error_messages={
+            'min_value': _('Oops! Ask for at least one link'),
+            'max_value': _('Oops! The maximum is %(limit_value)s links'),
+        })
+
+    # Random per page load, filled in by secrets.js; see idempotency.py
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, required=False, max_length=255)
+
+    # Filled in by secrets.js when SECRETS_PROOF_OF_WORK is set
+    pow_challenge = forms.CharField(widget=forms.HiddenInput, required=False, max_length=200)
+    pow_solution = forms.CharField(widget=forms.HiddenInput, required=False, max_length=32)
 
     class Meta:
         model = Secret
-        fields = ['data', 'passphrase', ]
+        fields = ['data', 'passphrase', 'ttl', ]
         labels = {
             'data': _(''),
         }
@@ -37,10 +93,85 @@ class SecretCreateForm(forms.ModelForm):
             }
         }
 
+    def __init__(self, *args, prerendered=False, **kwargs):
+        super(SecretCreateForm, self).__init__(*args, **kwargs)
+        self.max_ttl = None
+        self.offer_ttls(*get_ttl_bounds())
+        # Bound forms look at the quota in clean(), once the proof of work
+        # is verified, so unsolved requests never query it. Pre-rendered
+        # pages are served long after the quota state they would show.
+        if quota.is_enabled() and not self.is_bound and not prerendered:
+            self.limit_ttl(quota.max_ttl())
+
+        maximum = get_max_recipients()
+        if maximum > 1:
+            self.fields['recipients'].max_value = maximum
+            self.fields['recipients'].validators.append(MaxValueValidator(maximum))
+            self.fields['recipients'].widget.attrs['max'] = maximum
+        else:
+            del self.fields['recipients']
+
+        if proof_of_work.is_enabled():
+            # Fetched fresh by the browser, so pre-rendered forms work too
+            self.fields['pow_challenge'].widget.attrs['data-challenge-url'] = reverse('secrets:challenge')
+        else:
+            del self.fields['pow_challenge'], self.fields['pow_solution']
+
+    def offer_ttls(self, minimum, maximum):
+        default = min(get_default_ttl(), maximum)
+        minutes = {m for m in TTL_CHOICES if minimum <= datetime.timedelta(minutes=m) <= maximum}
+        minutes.add(int(default.total_seconds() // 60))
+        self.fields['ttl'].choices = [(m, ttl_label(m)) for m in sorted(minutes)]
+        self.fields['ttl'].initial = int(default.total_seconds() // 60)
+
+    def limit_ttl(self, max_ttl):
+        """Shorter lifetimes free up space sooner once the quota is near"""
+        if max_ttl is None:
+            return
+        minimum, maximum = get_ttl_bounds()
+        self.max_ttl = max(min(maximum, max_ttl), minimum)
+        self.offer_ttls(minimum, self.max_ttl)
+        self.fields['ttl'].help_text = _('Storage is nearly full, so secrets expire sooner for now.')
+
+    def clean(self):
+        cleaned_data = super(SecretCreateForm, self).clean()
+        # Checked first, so only solved forms query the quota, and only
+        # otherwise valid ones consume their challenge
+        if proof_of_work.is_enabled() and not self.errors:
+            try:
+                proof_of_work.verify(cleaned_data.get('pow_challenge', ''),
+                                     cleaned_data.get('pow_solution', ''))
+            except proof_of_work.InvalidSolution:
+                raise forms.ValidationError(
+                    _('Oops! Your browser could not complete the anti-abuse check, please try again'))
+        if quota.is_enabled() and not self.errors:
+            current = quota.usage()
+            self.limit_ttl(quota.max_ttl(current))
+            if self.max_ttl is not None:
+                cleaned_data['ttl'] = min(cleaned_data['ttl'], self.max_ttl)
+            recipients = cleaned_data.get('recipients') or 1
+            if not quota.has_room(recipients, self.stored_size(recipients), current):
+                metrics.increment('quota_refused')
+                raise forms.ValidationError(
+                    _('Sorry! We are storing as many secrets as we can, please try again in a few minutes'))
+        return cleaned_data
+
+    def stored_size(self, recipients):
+        """Bytes save() will store: the ciphertexts, not the plaintext"""
+        size = ciphertext_size(len(self.cleaned_data['data'].encode('utf-8')))
+        if recipients > 1:
+            size += recipients * ciphertext_size(WRAPPED_KEY_SIZE)
+        return size
+
+    def clean_ttl(self):
+        ttl = self.cleaned_data['ttl']
+        return get_default_ttl() if ttl in (None, '') else datetime.timedelta(minutes=ttl)
+
     def clean_data(self):
         max_size = 50 * 1024
         data = self.cleaned_data['data']
-        size = len(bytes(data.encode('utf-8')))
+        # ASCII text is as long in bytes as in characters; only encode otherwise
+        size = len(data) if data.isascii() else len(data.encode('utf-8'))
 
         if size > max_size:
             raise forms.ValidationError(
@@ -54,6 +185,8 @@ class SecretCreateForm(forms.ModelForm):
         data = self.cleaned_data['data']
 
         instance = super(SecretCreateForm, self).save(commit=False)
+        if (self.cleaned_data.get('recipients') or 1) > 1:
+            return self.save_shared(instance, commit)
 
         # Generate UUID and unique salt for this secret
         instance.id = uuid.uuid4()
@@ -62,11 +195,44 @@ class SecretCreateForm(forms.ModelForm):
 
         # Encrypt with unique salt
         instance.data = encrypt(data, passphrase, salt)
+        instance.expires_at = timezone.now() + self.cleaned_data['ttl']
+        self.recipients = [instance]
 
         if commit:
             instance.save()
         return instance
 
+    def save_shared(self, instance, commit=True):
+        """
+        Encrypt the data once with a random data key and give every
+        recipient its own secret holding only that key, wrapped with the
+        passphrase. The key derivation runs once, whatever the count.
+        """
+        expires_at = timezone.now() + self.cleaned_data['ttl']
+        data_key = generate_data_key()
+        salt = generate_salt()
+        try:
+            payload = Payload(
+                id=uuid.uuid4(), expires_at=expires_at,
+                data=encrypt_with_key(self.cleaned_data['data'], bytes(data_key)))
+            wrapped_key = base64.urlsafe_b64encode(data_key)
+            key = derive_key(self.cleaned_data['passphrase'], salt)
+            self.recipients = [
+                Secret(id=co_located_id(payload.pk), salt=salt, payload=payload,
+                       data=encrypt_with_key(wrapped_key, key), expires_at=expires_at,
+                       creator_ip=instance.creator_ip)
+                for i in range(self.cleaned_data['recipients'])]
+        finally:
+            wipe(data_key)
+
+        if commit:
+            with transaction.atomic(using=router.db_for_write(Payload, instance=payload)):
+                payload.save()
+                for recipient in self.recipients:
+                    recipient.save()
+        self.instance = self.recipients[0]
+        return self.instance
+
 
 class SecretUpdateForm(forms.ModelForm):
     passphrase = forms.CharField(
@@ -84,9 +250,20 @@ class SecretUpdateForm(forms.ModelForm):
     def clean_passphrase(self):
         passphrase = self.cleaned_data['passphrase']
 
+        try:
+            self.instance.load_ciphertext()
+        except Secret.DoesNotExist:
+            # Revealed by a concurrent request since the form was bound
+            raise Http404(_('This secret no longer exists'))
+
         try:
             # Use the unique salt stored with this secret
-            self.instance.decrypted_data = decrypt(self.instance.data, passphrase, bytes(self.instance.salt))
+            plain = decrypt(self.instance.data, passphrase, bytes(self.instance.salt))
+            if self.instance.payload_id:
+                plain = self.instance.open_payload(plain)
+            self.instance.decrypted_data = plain
+        except Secret.DoesNotExist:
+            raise Http404(_('This secret no longer exists'))
         except InvalidToken as e:
             raise forms.ValidationError(_('Oops! Double check that passphrase'))
         except Exception as e:
@@ -0,0 +1,265 @@
+"""
+Memory-bounded tracking of the clients that send the most requests.
+
+django-ratelimit keeps one cache entry per client IP. Under an attack
+from millions of addresses those entries churn the cache, evict the
+counters of legitimate clients and grow the worker. With
+SECRETS_HEAVY_HITTERS set, create and reveal POSTs and wrong passphrases
+are also counted in a count-min sketch, per client IP and per network
+prefix (/24 for IPv4, /64 for IPv6):
+
+- the sketch is DEPTH rows of WIDTH counters, however many clients there
+  are. An estimate never undercounts, and overcounts by about
+  e / WIDTH of the total with probability 1 - exp(-DEPTH);
+- counts cover a sliding WINDOW of seconds, from the sketch of the current
+  window plus the one of the previous window, weighted by how much of it
+  the sliding window still overlaps;
+- next to it, the TOP clients with the highest estimates are kept for each
+  kind of count, and listed on the usage dashboard in the admin.
+
+Requests from a client or prefix over one of REQUESTS_PER_IP,
+REQUESTS_PER_PREFIX, FAILURES_PER_IP or FAILURES_PER_PREFIX in the window
+are answered with 429 before any other work. Like admission control's
+slots, the counts are kept per process.
+"""
+import array
+import functools
+import hashlib
+import ipaddress
+import threading
+import time
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.translation import gettext as _, gettext_lazy
+from . import metrics
+
+EVENTS = ('requests', 'failures')
+SCOPES = ('ip', 'prefix')
+LABELS = {
+    ('requests', 'ip'): gettext_lazy('Requests per IP'),
+    ('requests', 'prefix'): gettext_lazy('Requests per prefix'),
+    ('failures', 'ip'): gettext_lazy('Wrong passphrases per IP'),
+    ('failures', 'prefix'): gettext_lazy('Wrong passphrases per prefix'),
+}
+
+
+def get_config():
+    return getattr(settings, 'SECRETS_HEAVY_HITTERS', None) or None
+
+
+class CountMinSketch(object):
+    """depth rows of width counters, updated conservatively"""
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.rows = [array.array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def indexes(self, key):
+        """One counter per row, from independent parts of a single hash"""
+        digest = hashlib.blake2b(key, digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i:i + 8], 'little') % self.width
+                for i in range(0, 8 * self.depth, 8)]
+
+    def estimate(self, indexes):
+        return min(row[i] for row, i in zip(self.rows, indexes))
+
+    def add(self, indexes, count=1):
+        """Raise only the counters below the new estimate; returns it"""
+        value = self.estimate(indexes) + count
+        for row, i in zip(self.rows, indexes):
+            if row[i] < value:
+                row[i] = value
+        return value
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = array.array('Q', bytes(8 * self.width))
+
+
+class TopK(object):
+    """The size keys with the highest estimates offered so far"""
+
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+        # Never above the smallest count kept, so most misses skip the scan
+        self.floor = 0
+
+    def offer(self, key, estimate):
+        if key in self.counts:
+            self.counts[key] = estimate
+            self.floor = min(self.floor, estimate)
+            return
+        if len(self.counts) < self.size:
+            self.counts[key] = estimate
+        elif estimate > self.floor:
+            smallest = min(self.counts, key=self.counts.get)
+            if estimate <= self.counts[smallest]:
+                self.floor = self.counts[smallest]
+                return
+            del self.counts[smallest]
+            self.counts[key] = estimate
+        else:
+            return
+        if len(self.counts) == self.size:
+            self.floor = min(self.counts.values())
+
+    def rescore(self, estimate):
+        """Replace every count by estimate(key), after the window moved"""
+        self.counts = {key: estimate(key) for key in self.counts}
+        self.floor = min(self.counts.values()) if len(self.counts) == self.size else 0
+
+
+def network(address):
+    """The address and its /24 or /64 prefix, or None if it isn't one"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    if ip.version == 4:
+        # Much cheaper than building an IPv4Network
+        label = str(ip)
+        return {'ip': label, 'prefix': '%s.0/24' % label.rsplit('.', 1)[0]}
+    prefix = ipaddress.IPv6Network((int(ip) >> 64 << 64, 64))
+    return {'ip': str(ip), 'prefix': str(prefix)}
+
+
+class Tracker(object):
+    """Sliding-window counts per event, client IP and prefix"""
+
+    def __init__(self, width=4096, depth=4, window=3600, top=20):
+        self.window = window
+        self.current = CountMinSketch(width, depth)
+        self.previous = CountMinSketch(width, depth)
+        self.started = time.time()
+        self.weight = 1.0
+        self.top = {(event, scope): TopK(top) for event in EVENTS for scope in SCOPES}
+        self.lock = threading.Lock()
+
+    def advance(self, now):
+        """Move to the window holding now and weight the previous one"""
+        elapsed = int((now - self.started) // self.window)
+        if elapsed > 0:
+            if elapsed == 1:
+                self.previous, self.current = self.current, self.previous
+            else:
+                self.previous.clear()
+            self.current.clear()
+            self.started += elapsed * self.window
+        self.weight = 1.0 - (now - self.started) / self.window
+        if elapsed > 0:
+            for (event, scope), top in self.top.items():
+                top.rescore(functools.partial(self._label_estimate, event, scope))
+
+    def _key(self, event, scope, label):
+        return self.current.indexes(('%s:%s:%s' % (event, scope, label)).encode())
+
+    def _label_estimate(self, event, scope, label):
+        return self._estimate(self._key(event, scope, label))
+
+    def _estimate(self, indexes):
+        return (self.current.estimate(indexes)
+                + int(self.previous.estimate(indexes) * self.weight))
+
+    def record(self, event, address, now=None):
+        """Count one event from address; returns the estimates per scope"""
+        return self._update(event, address, 1, now)
+
+    def estimates(self, event, address, now=None):
+        return self._update(event, address, 0, now)
+
+    def _update(self, event, address, count, now):
+        labels = network(address)
+        if labels is None:
+            return {}
+        with self.lock:
+            self.advance(now if now is not None else time.time())
+            estimates = {}
+            for scope, label in labels.items():
+                indexes = self._key(event, scope, label)
+                if count:
+                    current = self.current.add(indexes, count)
+                    estimates[scope] = (current
+                                        + int(self.previous.estimate(indexes) * self.weight))
+                    self.top[event, scope].offer(label, estimates[scope])
+                else:
+                    estimates[scope] = self._estimate(indexes)
+            return estimates
+
+    def heaviest(self, event, scope, now=None):
+        """Top clients as (label, estimate), most active first"""
+        with self.lock:
+            self.advance(now if now is not None else time.time())
+            counts = [(label, self._label_estimate(event, scope, label))
+                      for label in self.top[event, scope].counts]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+
+_tracker = None
+_tracker_config = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    """The tracker of this process, rebuilt when the settings change"""
+    global _tracker, _tracker_config
+    config = get_config()
+    with _tracker_lock:
+        if _tracker is None or _tracker_config != config:
+            _tracker_config = dict(config)
+            _tracker = Tracker(
+                width=config.get('WIDTH', 4096), depth=config.get('DEPTH', 4),
+                window=config.get('WINDOW', 3600), top=config.get('TOP', 20))
+        return _tracker
+
+
+def reset():
+    global _tracker
+    with _tracker_lock:
+        _tracker = None
+
+
+def over_limit(config, event, estimates):
+    for scope, estimate in estimates.items():
+        limit = config.get('%s_PER_%s' % (event.upper(), scope.upper()))
+        if limit is not None and estimate > limit:
+            return True
+    return False
+
+
+def record_failure(request):
+    """Count a wrong passphrase from the client of request"""
+    if get_config() is not None:
+        get_tracker().record('failures', request.META.get('REMOTE_ADDR'))
+
+
+def guard(view):
+    """Count requests to view and refuse the clients over a limit"""
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        config = get_config()
+        if config is None:
+            return view(request, *args, **kwargs)
+
+        tracker = get_tracker()
+        address = request.META.get('REMOTE_ADDR')
+        if (over_limit(config, 'requests', tracker.record('requests', address))
+                or over_limit(config, 'failures', tracker.estimates('failures', address))):
+            metrics.increment('heavy_hitters_blocked')
+            response = HttpResponse(
+                _('Too many requests from your network, please try again later.'),
+                status=429, content_type='text/plain; charset=utf-8')
+            response['Retry-After'] = str(config.get('WINDOW', 3600))
+            return response
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+def offenders():
+    """Top clients per kind of count, for the admin dashboard"""
+    if get_config() is None:
+        return []
+    tracker = get_tracker()
+    return [{'label': LABELS[event, scope], 'clients': tracker.heaviest(event, scope)}
+            for event in EVENTS for scope in SCOPES]
@@ -0,0 +1,130 @@
+"""
+Idempotency keys for creating secrets.
+
+A client that retries a create after a timeout sends the same
+Idempotency-Key header (or idempotency_key form field, which secrets.js
+fills in) as the first attempt. The first request to use a key holds it
+in the cache while it runs; the status and Location of its response, if
+it created a secret, are stored under the key for TTL seconds and replayed
+to every repeat without running the view again, so no key derivation or
+insert happens twice. Bodies are never stored: the page listing the links
+of a shared secret is shown once, and repeats of it get 409 Conflict.
+
+A repeat that arrives while the first request is still running waits up
+to WAIT seconds for its result, then gets 409 Conflict. If the first
+request fails, the key is released and the next attempt runs normally.
+
+Keys are scoped to the client address. With LocMemCache each worker only
+knows its own keys; use a shared cache to deduplicate across workers.
+Set SECRETS_IDEMPOTENCY = None to ignore keys altogether.
+"""
+import functools
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.translation import gettext as _
+
+PREFIX = 'secrets:idempotency:'
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FIELD = 'idempotency_key'
+MAX_LENGTH = 255
+IN_FLIGHT = 'in-flight'
+# Headers of a stored response worth replaying
+REPLAYED_HEADERS = ('Location', )
+
+
+def get_config():
+    return getattr(settings, 'SECRETS_IDEMPOTENCY', {})
+
+
+def get_cache():
+    return caches[get_config().get('CACHE', 'default')]
+
+
+def cache_key(request):
+    """Cache key of the request's idempotency key, or None if it has none"""
+    key = request.META.get(HEADER) or request.POST.get(FIELD)
+    if not key or len(key) > MAX_LENGTH:
+        return None
+    scope = '%s\n%s' % (request.META.get('REMOTE_ADDR', ''), key)
+    return PREFIX + hashlib.sha256(scope.encode('utf-8')).hexdigest()
+
+
+def mark(response):
+    """Flag response as the result of a completed create, to be replayed"""
+    response.idempotent = True
+    return response
+
+
+def store(response):
+    """What a repeat gets back: the status and Location, never the body"""
+    return {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+    }
+
+
+def replay(stored):
+    if stored['status'] == 200:
+        # The one-time links of a shared secret, which are not shown twice
+        response = HttpResponse(
+            _('These links were already shown once. If you did not get them, create a new secret.'),
+            status=409, content_type='text/plain; charset=utf-8')
+    else:
+        response = HttpResponse(status=stored['status'])
+        for name, value in stored['headers'].items():
+            response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def acquire(cache, key, config):
+    """Claim key and return None, or return the stored result once there is one"""
+    deadline = time.monotonic() + config.get('WAIT', 10)
+    delay = 0.05
+    while True:
+        if cache.add(key, IN_FLIGHT, timeout=config.get('LOCK_TIMEOUT', 60)):
+            return None
+        stored = cache.get(key)
+        if stored is not None and stored != IN_FLIGHT:
+            return stored
+        if time.monotonic() >= deadline:
+            return IN_FLIGHT
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def idempotent(view):
+    """Run view once per idempotency key and replay its result to repeats"""
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        config = get_config()
+        key = cache_key(request) if config is not None else None
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        cache = get_cache()
+        stored = acquire(cache, key, config)
+        if stored == IN_FLIGHT:
+            response = HttpResponse(
+                _('This request is still being processed, please try again in a moment.'),
+                status=409, content_type='text/plain; charset=utf-8')
+            response['Retry-After'] = '1'
+            return response
+        if stored is not None:
+            return replay(stored)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            cache.delete(key)
+            raise
+        if getattr(response, 'idempotent', False):
+            cache.set(key, store(response), timeout=config.get('TTL', 10 * 60))
+        else:
+            # Nothing was created, so a corrected retry may reuse the key
+            cache.delete(key)
+        return response
+    return wrapped
@@ -0,0 +1,50 @@
+"""
+Jinja2 environment for the public secret pages.
+
+Templates live in the ``jinja2`` directories of the app and the website.
+Enable them by listing a Jinja2 engine with this environment ahead of
+DjangoTemplates: pages found in a ``jinja2`` directory render with it and
+everything else, the admin included, falls through to the Django engine.
+
+Forms are rendered by the ``form_fields`` macro in
+``django_secrets/forms.html``, which reproduces the markup of the crispy
+foundation-6 pack without going through crispy's templates.
+"""
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext, ngettext
+from jinja2 import Environment
+
+# Same classes crispy gives widgets, see CRISPY_CLASS_CONVERTERS
+CLASS_CONVERTERS = {
+    'textinput': 'textinput textInput',
+    'passwordinput': 'textinput textInput',
+    'fileinput': 'fileinput fileUpload',
+}
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def widget(field):
+    """Render a bound field's widget with crispy's CSS classes"""
+    name = field.field.widget.__class__.__name__.lower()
+    css_class = '%s form-control' % CLASS_CONVERTERS.get(name, name)
+    if field.errors:
+        css_class += ' form-control-danger'
+    return field.as_widget(attrs={'class': css_class})
+
+
+def environment(**options):
+    options['extensions'] = [*options.get('extensions', ()), 'jinja2.ext.i18n']
+    env = Environment(**options)
+    env.install_gettext_callables(gettext, ngettext, newstyle=True)
+    env.globals.update({
+        'now': timezone.localtime,
+        'static': static,
+        'url': url,
+        'widget': widget,
+    })
+    return env
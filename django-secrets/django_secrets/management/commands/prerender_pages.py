@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from ... import prerender
+
+
+class Command(BaseCommand):
+    help = "Render static pages to files served without hitting Django views."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root', default=None,
+            help='Output directory. Defaults to SECRETS_PRERENDER_ROOT.')
+
+    def handle(self, *args, **options):
+        root = options['root'] or prerender.get_root()
+        if not root:
+            raise CommandError('Set SECRETS_PRERENDER_ROOT or pass --root.')
+
+        for name in prerender.get_pages():
+            try:
+                path, content = prerender.render_page(name)
+            except ValueError as e:
+                raise CommandError(str(e))
+            filename = prerender.write_page(root, path, content)
+            if options['verbosity'] > 0:
+                self.stdout.write('%s -> %s' % (path, filename))
@@ -0,0 +1,84 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.conf import settings
+from ... import sharding, usage
+from ...models import Payload, Secret
+
+
+class Command(BaseCommand):
+    help = ('Delete secrets matching the given filters in bounded batches, '
+            'without ever loading their ciphertext.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expired', action='store_true',
+            help='Delete secrets that are past their expiry.')
+        parser.add_argument(
+            '--older-than', type=int, metavar='MINUTES',
+            help='Delete secrets created more than MINUTES ago.')
+        parser.add_argument(
+            '--min-size', type=int, metavar='BYTES',
+            help='Delete secrets whose ciphertext is at least BYTES long.')
+        parser.add_argument(
+            '--ip', action='append', dest='ips', metavar='IP',
+            help='Delete secrets created from IP. May be repeated.')
+        parser.add_argument(
+            '--all', action='store_true', dest='delete_all',
+            help='Delete every secret.')
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'SECRETS_PURGE_BATCH_SIZE', 1000),
+            help='Rows deleted per query.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many secrets match.')
+
+    def handle(self, *args, **options):
+        queryset = Secret.objects.all()
+        filtered = False
+
+        if options['expired']:
+            queryset = queryset.filter(expires_at__lte=timezone.now())
+            filtered = True
+        if options['older_than'] is not None:
+            threshold = timezone.now() - datetime.timedelta(minutes=options['older_than'])
+            queryset = queryset.filter(created_at__lt=threshold)
+            filtered = True
+        if options['min_size'] is not None:
+            queryset = queryset.filter(size__gte=options['min_size'])
+            filtered = True
+        if options['ips']:
+            queryset = queryset.filter(creator_ip__in=options['ips'])
+            filtered = True
+
+        if not filtered and not options['delete_all']:
+            raise CommandError('Refusing to delete every secret without --all.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        if options['dry_run']:
+            matching = sum(shard.count() for shard in queryset.per_shard())
+            self.stdout.write('%d secrets match.' % matching)
+            return
+
+        deleted = 0
+        for shard in queryset.per_shard():
+            for count in shard.delete_in_batches(options['batch_size']):
+                deleted += count
+                if options['verbosity'] > 0:
+                    self.stdout.write('Deleted %d secrets (%d so far)' % (count, deleted))
+
+        # Shared payloads go once none of their recipients is left
+        for alias in sharding.get_shards():
+            orphans, _ = Payload.objects.using(alias).orphaned().delete()
+            if orphans and options['verbosity'] > 0:
+                self.stdout.write('Deleted %d shared payloads' % orphans)
+
+        if options['expired']:
+            usage.record(expired=deleted)
+            pruned = usage.prune()
+            if pruned and options['verbosity'] > 0:
+                self.stdout.write('Deleted %d old usage buckets' % pruned)
+
+        self.stdout.write(self.style.SUCCESS('Deleted %d secrets.' % deleted))
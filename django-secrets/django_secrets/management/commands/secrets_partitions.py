@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from ... import partitioning
+
+
+class Command(BaseCommand):
+    help = ('Maintain the partitioned secrets table on PostgreSQL: create '
+            'upcoming partitions and drop the ones whose secrets have all expired.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to maintain.')
+        parser.add_argument(
+            '--premake', type=int, default=partitioning.get_premake(),
+            help='Number of future partitions to keep ready.')
+        parser.add_argument(
+            '--partition-table', action='store_true',
+            help='Convert an existing plain secrets table to the partitioned layout.')
+        parser.add_argument(
+            '--unpartition-table', action='store_true',
+            help='Convert the partitioned secrets table back to a plain table.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is only supported on PostgreSQL.')
+
+        with transaction.atomic(using=connection.alias):
+            if options['unpartition_table']:
+                partitioning.unpartition_table(connection)
+                self.stdout.write('The secrets table is no longer partitioned.')
+                return
+            if options['partition_table']:
+                partitioning.partition_table(connection)
+            if not partitioning.is_partitioned(connection):
+                raise CommandError(
+                    'The secrets table is not partitioned, run with --partition-table first.')
+
+            for name in partitioning.create_partitions(connection, premake=options['premake']):
+                self.stdout.write('Created partition %s' % name)
+            for name in partitioning.drop_expired_partitions(connection):
+                self.stdout.write('Dropped partition %s' % name)
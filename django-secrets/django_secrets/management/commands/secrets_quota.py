@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from ... import quota
+
+
+class Command(BaseCommand):
+    help = ('Show the secrets and bytes counted against SECRETS_QUOTA, or reset '
+            'the counters from a full count of the tables with --recount.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Count every stored secret and payload and reset the counters.')
+
+    def handle(self, *args, **options):
+        if not quota.is_enabled():
+            raise CommandError('SECRETS_QUOTA is not set.')
+
+        current = quota.recount() if options['recount'] else quota.usage()
+        limits = quota.limits()
+        self.stdout.write('Secrets: %d of %s' % (
+            current['secrets'], limits['secrets'] if limits['secrets'] is not None else 'unlimited'))
+        self.stdout.write('Bytes: %s of %s' % (
+            filesizeformat(current['bytes']),
+            filesizeformat(limits['bytes']) if limits['bytes'] is not None else 'unlimited'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from ... import unlogged
+
+
+class Command(BaseCommand):
+    help = ('Switch the secrets tables on PostgreSQL to UNLOGGED, or back to '
+            'LOGGED with --logged. Each table is rewritten under an exclusive lock.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to change.')
+        parser.add_argument(
+            '--logged', action='store_true',
+            help='Make the tables logged (crash-safe and replicated) again.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('UNLOGGED tables are only supported on PostgreSQL.')
+
+        with transaction.atomic(using=connection.alias):
+            for name in unlogged.set_logged(connection, options['logged']):
+                self.stdout.write('%s is now %s' % (name, 'logged' if options['logged'] else 'unlogged'))
@@ -1,11 +1,74 @@
-import datetime
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from . import blobs, partitioning, quota, sharding
+from .utils import get_ttl_bounds
 
 
-class AvailableManager(models.Manager):
+class SecretQuerySet(models.QuerySet):
+    def available(self):
+        """Secrets that have not expired yet"""
+        now = timezone.now()
+        qs = self.filter(expires_at__gt=now)
+        if partitioning.is_enabled():
+            # Redundant bound on the partition key, so PostgreSQL can prune
+            qs = qs.filter(created_at__gt=now - get_ttl_bounds()[1])
+        return qs
+
+    def metadata(self):
+        """Secrets without their ciphertext and salt, for pages that never decrypt"""
+        return self.defer('data', 'salt')
+
+    def per_shard(self):
+        """This queryset once for every database holding secrets"""
+        if not sharding.is_enabled():
+            return [self]
+        return [self.using(alias) for alias in sharding.get_shards()]
+
+    def delete_in_batches(self, batch_size=1000):
+        """
+        Delete the matching secrets batch_size rows at a time and yield the
+        number deleted by each batch. Every batch is a single
+        DELETE ... WHERE id IN (SELECT id ... LIMIT n), so rows are never
+        loaded and no deletion collector runs. With a blob storage or a
+        quota the IDs, blob names and sizes are selected first, and blobs
+        are removed on commit.
+        """
+        manager = self.model._base_manager.db_manager(self.db)
+        while True:
+            if blobs.is_enabled() or quota.is_enabled():
+                # The blob names and sizes are needed afterwards, so select them first
+                rows = list(self.values_list('pk', 'blob', 'size')[:batch_size])
+                if not rows:
+                    return
+                batch = manager.filter(pk__in=[pk for pk, blob, size in rows])
+                names = [blob for pk, blob, size in rows if blob]
+                size = sum(size for pk, blob, size in rows)
+            else:
+                batch = manager.filter(
+                    pk__in=models.Subquery(self.values('pk')[:batch_size]))
+                names, size = [], 0
+            deleted = batch._raw_delete(batch.db)
+            if not deleted:
+                return
+            quota.add(secrets=-deleted, size=-size)
+            if names:
+                transaction.on_commit(lambda names=names: blobs.delete(*names), using=batch.db)
+            yield deleted
+
+
+class PayloadQuerySet(models.QuerySet):
+    def orphaned(self):
+        """Payloads none of whose recipients is left"""
+        return self.filter(recipients__isnull=True)
+
+    def delete(self):
+        size = self.aggregate(size=models.Sum('size'))['size'] if quota.is_enabled() else 0
+        result = super(PayloadQuerySet, self).delete()
+        if result[0]:
+            quota.add(size=-(size or 0))
+        return result
+
+
+class AvailableManager(models.Manager.from_queryset(SecretQuerySet)):
     def get_queryset(self):
-        qs = super(AvailableManager, self).get_queryset()
-        now = datetime.datetime.utcnow().replace(tzinfo=timezone.utc)
-        threshold = now - datetime.timedelta(minutes=10)
-        return qs.filter(created_at__gt=threshold)
+        return super(AvailableManager, self).get_queryset().available()
@@ -0,0 +1,241 @@
+"""
+Front-line filter that answers "might this secret exist?" from memory.
+
+Live secret IDs are kept in a counting Bloom filter stored in a file and
+mapped into every worker, so all workers on a node share one copy and an
+unknown oid is rejected without a database query. False positives only
+cost the query we would have run anyway; false negatives are avoided by
+construction:
+
+- the filter has two generations, each covering SECRETS_MAX_TTL, so a
+  secret is always in the current or the previous one while it lives and
+  whole generations are recycled instead of tracking expiry;
+- a secret is added to the generation of its created_at and removed from
+  that same generation once its deletion has committed;
+- a fresh file is populated from the database before first use.
+
+Every worker must see every create, so this only suits deployments where
+all workers share one filesystem (a single node). Enable it with
+SECRETS_ID_FILTER = {'PATH': ..., 'CAPACITY': ..., 'ERROR_RATE': ...}.
+"""
+import contextlib
+import hashlib
+import itertools
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from django.conf import settings
+from .utils import get_ttl_bounds
+
+MAGIC = b'SECRETID'
+VERSION = 1
+# magic, version, hashes, counters, period, epoch of slot 0, epoch of slot 1, populated
+HEADER = struct.Struct('<8sIIQQqqB')
+HEADER_SIZE = 64
+SLOTS = 2
+SATURATED = 255
+
+
+def filter_size(capacity, error_rate):
+    """Number of counters and hash functions for the given capacity and error rate"""
+    counters = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+    hashes = max(1, int(round(counters / capacity * math.log(2))))
+    return counters, hashes
+
+
+class SharedIdFilter(object):
+    """Two-generation counting Bloom filter in a shared memory-mapped file"""
+
+    def __init__(self, path, capacity, error_rate, period):
+        self.path = path
+        self.counters, self.hashes = filter_size(capacity, error_rate)
+        self.period = max(1, int(period))
+        self._thread_lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        size = HEADER_SIZE + SLOTS * self.counters
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.locked():
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) < HEADER.size or HEADER.unpack(header)[:5] != (
+                    MAGIC, VERSION, self.hashes, self.counters, self.period):
+                # New file or different configuration: start over
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(
+                    MAGIC, VERSION, self.hashes, self.counters, self.period, -1, -1, 0), 0)
+        self._map = mmap.mmap(self._fd, size)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Exclusive access across threads and processes"""
+        import fcntl
+
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self):
+        return HEADER.unpack_from(self._map, 0)
+
+    def _slot_epochs(self):
+        header = self._header()
+        return header[5], header[6]
+
+    def _set_slot_epoch(self, slot, epoch):
+        epochs = list(self._slot_epochs())
+        epochs[slot] = epoch
+        header = self._header()
+        HEADER.pack_into(self._map, 0, *(header[:5] + tuple(epochs) + header[7:]))
+
+    @property
+    def populated(self):
+        return bool(self._header()[7])
+
+    def mark_populated(self):
+        header = self._header()
+        HEADER.pack_into(self._map, 0, *(header[:7] + (1, )))
+
+    def epoch(self, moment):
+        return int(moment // self.period)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.counters for i in range(self.hashes)]
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * self.counters
+
+    def _claim_slot(self, epoch):
+        """Slot holding epoch, recycling the older generation if needed (locked)"""
+        slot = epoch % SLOTS
+        current = self._slot_epochs()[slot]
+        if current == epoch:
+            return slot
+        if current > epoch:
+            return None  # Already recycled for a newer generation
+        offset = self._offset(slot)
+        self._map[offset:offset + self.counters] = bytes(self.counters)
+        self._set_slot_epoch(slot, epoch)
+        return slot
+
+    def _increment(self, key, epoch):
+        slot = self._claim_slot(epoch)
+        if slot is None:
+            return
+        offset = self._offset(slot)
+        for position in self._positions(key):
+            value = self._map[offset + position]
+            if value < SATURATED:
+                self._map[offset + position] = value + 1
+
+    def add(self, key, created_at):
+        """Record a new ID; created_at is a POSIX timestamp"""
+        epoch = self.epoch(created_at)
+        if epoch < self.epoch(time.time()) - 1:
+            return  # Already older than any live secret
+        with self.locked():
+            self._increment(key, epoch)
+
+    def remove(self, key, created_at):
+        """Forget an ID previously added with the same created_at"""
+        epoch = self.epoch(created_at)
+        with self.locked():
+            slot = epoch % SLOTS
+            if self._slot_epochs()[slot] != epoch:
+                return
+            offset = self._offset(slot)
+            positions = self._positions(key)
+            if not all(self._map[offset + p] for p in positions):
+                return
+            for position in positions:
+                value = self._map[offset + position]
+                if value < SATURATED:
+                    self._map[offset + position] = value - 1
+
+    def might_contain(self, key, now=None):
+        current = self.epoch(time.time() if now is None else now)
+        positions = self._positions(key)
+        for slot, epoch in enumerate(self._slot_epochs()):
+            if epoch not in (current, current - 1):
+                continue
+            offset = self._offset(slot)
+            if all(self._map[offset + p] for p in positions):
+                return True
+        return False
+
+    def populate(self, pairs):
+        """Add (key, created_at) pairs and mark the filter as ready, once"""
+        with self.locked():
+            if self.populated:
+                return False
+            for key, created_at in pairs:
+                self._increment(key, self.epoch(created_at))
+            self.mark_populated()
+            return True
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_id_filter():
+    """The shared filter configured by SECRETS_ID_FILTER, or None"""
+    config = getattr(settings, 'SECRETS_ID_FILTER', None)
+    if not config:
+        return None
+
+    period = get_ttl_bounds()[1].total_seconds()
+    options = (config['PATH'], config.get('CAPACITY', 100000),
+               config.get('ERROR_RATE', 0.001), period)
+    with _filters_lock:
+        id_filter = _filters.get(options)
+        if id_filter is None:
+            id_filter = _filters[options] = SharedIdFilter(*options)
+    return id_filter
+
+
+def populate_from_database(id_filter):
+    """Load the IDs of live secrets into a fresh filter; True if this call did it"""
+    from .models import Secret
+
+    if id_filter.populated:
+        return False
+    rows = itertools.chain.from_iterable(
+        queryset.order_by().values_list('pk', 'created_at').iterator()
+        for queryset in Secret.available.per_shard())
+    return id_filter.populate((pk.bytes, created_at.timestamp()) for pk, created_at in rows)
+
+
+def might_exist(pk):
+    """False only when the secret with this ID certainly doesn't exist"""
+    id_filter = get_id_filter()
+    if id_filter is None:
+        return True
+    populate_from_database(id_filter)
+    return id_filter.might_contain(pk.bytes)
+
+
+def secret_created(secret):
+    id_filter = get_id_filter()
+    # A filter populated right now already saw the new row
+    if id_filter is not None and not populate_from_database(id_filter):
+        id_filter.add(secret.pk.bytes, secret.created_at.timestamp())
+
+
+def secret_deleted(pk, created_at):
+    id_filter = get_id_filter()
+    if id_filter is not None and id_filter.populated:
+        id_filter.remove(pk.bytes, created_at.timestamp())
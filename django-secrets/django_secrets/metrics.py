@@ -0,0 +1,64 @@
+"""
+Operational counters kept in a Django cache.
+
+With a shared cache backend (Memcached, Redis) the counters add up over
+every worker; with LocMemCache each process counts on its own. They are
+exposed in the Prometheus text format by ``views.prometheus_metrics``, to
+staff and to scrapers sending SECRETS_METRICS_TOKEN as a bearer token.
+"""
+import functools
+import hmac
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+
+PREFIX = 'secrets:metrics:'
+
+COUNTERS = {
+    'admission_admitted': 'KDF requests let through by admission control',
+    'admission_shed_concurrency': 'KDF requests shed because every slot was busy',
+    'admission_shed_queue_time': 'KDF requests shed because they queued too long',
+    'heavy_hitters_blocked': 'Requests refused because their IP or prefix was over a limit',
+    'quota_refused': 'Creates refused because the storage quota was full',
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'SECRETS_METRICS_CACHE', 'default')]
+
+
+def increment(name, value=1):
+    cache = get_cache()
+    key = PREFIX + name
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # First use, or evicted; a concurrent add() wins and we add to it
+        if not cache.add(key, value, timeout=None):
+            cache.incr(key, value)
+
+
+def get_counters():
+    """Current value of every counter, zero when never incremented"""
+    values = get_cache().get_many([PREFIX + name for name in COUNTERS])
+    return {name: values.get(PREFIX + name, 0) for name in COUNTERS}
+
+
+def has_valid_token(request):
+    """Whether request authenticates with SECRETS_METRICS_TOKEN as a bearer token"""
+    token = getattr(settings, 'SECRETS_METRICS_TOKEN', None)
+    scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return (bool(token) and scheme.lower() == 'bearer'
+            and hmac.compare_digest(value.encode('utf-8'), token.encode('utf-8')))
+
+
+def scraper_or_staff(view):
+    """Let scrapers with the metrics token in, and everyone else log in as staff"""
+    staff_view = staff_member_required(view)
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if has_valid_token(request):
+            return view(request, *args, **kwargs)
+        return staff_view(request, *args, **kwargs)
+    return wrapped
@@ -3,7 +3,7 @@
 # The old encryption scheme (shared salt) was fundamentally insecure
 
 import uuid
-from django.db import migrations, models
+from django.db import migrations, models, transaction
 
 
 def delete_old_secrets(apps, schema_editor):
@@ -15,14 +15,17 @@ def delete_old_secrets(apps, schema_editor):
     with schema_editor.connection.cursor() as cursor:
         # Try to delete from old table name (for existing installations)
         try:
-            cursor.execute("DELETE FROM secrets_secret;")
+            # Savepoint, so a missing table doesn't abort the migration on PostgreSQL
+            with transaction.atomic(using=db_alias):
+                cursor.execute("DELETE FROM secrets_secret;")
         except Exception:
             # Table might not exist, that's fine
             pass
 
         # Try to delete from new table name
         try:
-            cursor.execute("DELETE FROM django_secrets_secret;")
+            with transaction.atomic(using=db_alias):
+                cursor.execute("DELETE FROM django_secrets_secret;")
         except Exception:
             # Table might not exist, that's fine
             pass
@@ -0,0 +1,38 @@
+import datetime
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Length
+
+
+def populate_size_and_expires_at(apps, schema_editor):
+    Secret = apps.get_model('django_secrets', 'Secret')
+    Secret.objects.using(schema_editor.connection.alias).update(
+        size=Length('data'),
+        expires_at=F('created_at') + datetime.timedelta(minutes=10),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0004_security_update_uuid_and_salt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='secret',
+            name='size',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='size'),
+        ),
+        migrations.AddField(
+            model_name='secret',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='expires at'),
+        ),
+        migrations.RunPython(populate_size_and_expires_at, reverse_code=migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='secret',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, verbose_name='expires at'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0005_secret_size_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='secret',
+            index=models.Index(fields=['created_at', 'id'], name='secret_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0006_secret_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='secret',
+            name='creator_ip',
+            field=models.GenericIPAddressField(blank=True, db_index=True, editable=False, null=True, verbose_name='creator IP'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def partition_secrets(apps, schema_editor):
+    from django_secrets import partitioning
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and partitioning.is_enabled():
+        partitioning.partition_table(connection)
+
+
+def unpartition_secrets(apps, schema_editor):
+    from django_secrets import partitioning
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        partitioning.unpartition_table(connection)
+
+
+class Migration(migrations.Migration):
+    """Partition the secrets table on PostgreSQL when SECRETS_POSTGRES_PARTITIONING is set"""
+
+    dependencies = [
+        ('django_secrets', '0007_secret_creator_ip'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_secrets, reverse_code=unpartition_secrets),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0008_partition_secrets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='secret',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, editable=False, verbose_name='expires at'),
+        ),
+    ]
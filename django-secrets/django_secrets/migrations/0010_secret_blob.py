@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0009_secret_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='secret',
+            name='blob',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='blob'),
+        ),
+    ]
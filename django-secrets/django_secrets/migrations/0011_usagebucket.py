@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0010_secret_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageBucket',
+            fields=[
+                ('minute', models.DateTimeField(primary_key=True, serialize=False, verbose_name='minute')),
+                ('created', models.PositiveIntegerField(default=0, verbose_name='created')),
+                ('revealed', models.PositiveIntegerField(default=0, verbose_name='revealed')),
+                ('expired', models.PositiveIntegerField(default=0, verbose_name='expired')),
+                ('failed_attempts', models.PositiveIntegerField(default=0, help_text='Reveals refused for a wrong passphrase', verbose_name='failed attempts')),
+                ('bytes_stored', models.PositiveBigIntegerField(default=0, help_text='Ciphertext size of the secrets created', verbose_name='bytes stored')),
+            ],
+            options={
+                'verbose_name': 'usage bucket',
+                'ordering': ('-minute',),
+            },
+        ),
+    ]
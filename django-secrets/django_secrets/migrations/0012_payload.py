@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0011_usagebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payload',
+            fields=[
+                ('id', models.UUIDField(default=None, editable=False, primary_key=True, serialize=False)),
+                ('data', models.TextField(verbose_name='data')),
+                ('size', models.PositiveIntegerField(default=0, editable=False, verbose_name='size')),
+                ('expires_at', models.DateTimeField(db_index=True, editable=False, verbose_name='expires at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='secret',
+            name='payload',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='django_secrets.payload', verbose_name='payload'),
+        ),
+    ]
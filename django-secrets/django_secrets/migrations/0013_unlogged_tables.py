@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def make_unlogged(apps, schema_editor):
+    from django_secrets import unlogged
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and unlogged.is_enabled():
+        unlogged.set_logged(connection, False)
+
+
+def make_logged(apps, schema_editor):
+    from django_secrets import unlogged
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        unlogged.set_logged(connection, True)
+
+
+class Migration(migrations.Migration):
+    """Make the secrets tables UNLOGGED on PostgreSQL when SECRETS_POSTGRES_UNLOGGED is set"""
+
+    dependencies = [
+        ('django_secrets', '0012_payload'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_unlogged, reverse_code=make_logged),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_secrets', '0013_unlogged_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageCounter',
+            fields=[
+                ('slot', models.PositiveSmallIntegerField(primary_key=True, serialize=False, verbose_name='slot')),
+                ('secrets', models.BigIntegerField(default=0, verbose_name='secrets')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='bytes')),
+            ],
+            options={
+                'verbose_name': 'storage counter',
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.http import Http404
+from .membership import might_exist
+from .sharding import database_for
 from .utils import decode_id
 
 
@@ -25,7 +27,13 @@ class KnuthIdMixin(object):
         if pk is None:
             raise Http404(_("Invalid secret ID"))
 
-        queryset = queryset.filter(pk=pk)
+        # Most unknown IDs are answered from memory, without a query
+        if not might_exist(pk):
+            raise Http404(_("No %(verbose_name)s found matching the query") %
+                          {'verbose_name': queryset.model._meta.verbose_name})
+
+        # Only the shard holding this ID is queried
+        queryset = queryset.using(database_for(pk)).filter(pk=pk)
 
         try:
             obj = queryset.get()
@@ -1,11 +1,37 @@
-import datetime
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
-from django.utils.timezone import utc
+from django.utils import timezone
 from django.conf import settings
-from django.db import models
-from .managers import AvailableManager
-from .utils import encode_id
+import base64
+from django.db import models, transaction
+from . import blobs, membership, quota
+from .managers import AvailableManager, PayloadQuerySet, SecretQuerySet
+from .utils import decrypt_with_key, encode_id, get_default_ttl, wipe
+
+
+class Payload(models.Model):
+    """Ciphertext shared by several secrets, encrypted once with a data key"""
+    id = models.UUIDField(primary_key=True, default=None, editable=False)
+    data = models.TextField(verbose_name=_('data'))
+    size = models.PositiveIntegerField(
+        verbose_name=_('size'), default=0, editable=False)
+    expires_at = models.DateTimeField(
+        verbose_name=_('expires at'), editable=False, db_index=True)
+    created_at = models.DateTimeField(
+        verbose_name=_("created at"), auto_now_add=True, editable=False)
+
+    objects = PayloadQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            self.size = len(self.data)
+        super(Payload, self).save(*args, **kwargs)
+        if adding:
+            quota.add(size=self.size)
+
+    def __str__(self):
+        return str(self.pk)
 
 
 class Secret(models.Model):
@@ -18,14 +44,37 @@ class Secret(models.Model):
         max_length=16,
         verbose_name=_('salt'),
         help_text=_('Unique salt for key derivation'))
+    # Name of the ciphertext in the blob storage, when it isn't in data
+    blob = models.CharField(
+        verbose_name=_('blob'), max_length=100, blank=True, default='',
+        editable=False)
+    # Set for one recipient of a shared payload; data is then its wrapped key.
+    # No database constraint: its deferred trigger would block dropping
+    # partitions, and a payload that is gone is answered like a secret that is.
+    payload = models.ForeignKey(
+        Payload, verbose_name=_('payload'), related_name='recipients',
+        null=True, blank=True, editable=False, on_delete=models.CASCADE,
+        db_constraint=False)
+    # Denormalized so listings never have to read the ciphertext
+    size = models.PositiveIntegerField(
+        verbose_name=_('size'), default=0, editable=False)
+    expires_at = models.DateTimeField(
+        verbose_name=_('expires at'), editable=False, db_index=True)
+    creator_ip = models.GenericIPAddressField(
+        verbose_name=_('creator IP'), null=True, blank=True, editable=False,
+        db_index=True)
     created_at = models.DateTimeField(
         verbose_name=_("created at"), auto_now_add=True, editable=False)
 
-    objects = models.Manager()
+    objects = SecretQuerySet.as_manager()
     available = AvailableManager()
 
     class Meta:
         ordering = ('-created_at', )
+        indexes = [
+            # Keyset pagination in the admin walks (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='secret_created_at_id_idx'),
+        ]
 
     @property
     def oid(self):
@@ -33,17 +82,109 @@ class Secret(models.Model):
         return encode_id(self.pk)
 
     @property
-    def size(self):
-        return len(self.data.encode('utf-8'))
+    def expire_at(self):
+        return self.expires_at
 
     @property
-    def expire_at(self):
-        created_at = self.created_at.replace(tzinfo=utc)
-        expire_at = created_at + datetime.timedelta(minutes=10)
-        return expire_at
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def load_ciphertext(self):
+        """Fetch the ciphertext and salt in one query if they were deferred"""
+        deferred = self.get_deferred_fields() & {'data', 'salt'}
+        if deferred:
+            self.refresh_from_db(fields=deferred)
+        if self.blob and not self.data:
+            try:
+                self.data = blobs.read(self.blob)
+            except FileNotFoundError:
+                raise self.DoesNotExist('The ciphertext of this secret is gone')
+
+    def open_payload(self, wrapped_key):
+        """Decrypt the shared payload with the data key unwrapped from data"""
+        key = bytearray(base64.urlsafe_b64decode(wrapped_key))
+        try:
+            return decrypt_with_key(self.payload.data, bytes(key))
+        except Payload.DoesNotExist:
+            raise self.DoesNotExist('The payload of this secret is gone')
+        finally:
+            wipe(key)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            # The ciphertext is base64, so characters and bytes are the same
+            self.size = len(self.data)
+            if self.expires_at is None:
+                self.expires_at = timezone.now() + get_default_ttl()
+            # A wrapped key is too small to be worth a blob
+            if blobs.is_enabled() and self.data and not self.payload_id:
+                self.blob, self.data = blobs.write(self.pk, self.data), ''
+        try:
+            super(Secret, self).save(*args, **kwargs)
+        except Exception:
+            if adding and self.blob:
+                blobs.delete(self.blob)
+            raise
+        if adding:
+            membership.secret_created(self)
+            quota.add(secrets=1, size=self.size)
+
+    def delete(self, *args, **kwargs):
+        pk, created_at, blob = self.pk, self.created_at, self.blob
+        result = super(Secret, self).delete(*args, **kwargs)
+        if result[0]:
+            quota.add(secrets=-1, size=-self.size)
+        if self.payload_id:
+            # The last recipient takes the shared payload with it
+            Payload.objects.using(self._state.db).filter(pk=self.payload_id).orphaned().delete()
+
+        # Only forget the ID and drop the ciphertext once the row is really
+        # gone, and only once: a concurrent reveal may have deleted it first
+        def deleted():
+            membership.secret_deleted(pk, created_at)
+            blobs.delete(blob)
+        if result[0]:
+            transaction.on_commit(deleted, using=self._state.db)
+        return result
 
     def __str__(self):
         return str(self.oid)
 
     def get_absolute_url(self):
         return reverse('secrets:secret-update', kwargs={'oid': self.oid})
+
+
+class StorageCounter(models.Model):
+    """Part of the stored totals, kept up to date by django_secrets.quota"""
+    slot = models.PositiveSmallIntegerField(verbose_name=_('slot'), primary_key=True)
+    # Signed: a slot may see more deletes than creates
+    secrets = models.BigIntegerField(verbose_name=_('secrets'), default=0)
+    bytes = models.BigIntegerField(verbose_name=_('bytes'), default=0)
+
+    class Meta:
+        verbose_name = _('storage counter')
+
+    def __str__(self):
+        return str(self.slot)
+
+
+class UsageBucket(models.Model):
+    """Activity of one minute, kept up to date by django_secrets.usage"""
+    minute = models.DateTimeField(verbose_name=_('minute'), primary_key=True)
+    created = models.PositiveIntegerField(verbose_name=_('created'), default=0)
+    revealed = models.PositiveIntegerField(verbose_name=_('revealed'), default=0)
+    expired = models.PositiveIntegerField(verbose_name=_('expired'), default=0)
+    failed_attempts = models.PositiveIntegerField(
+        verbose_name=_('failed attempts'), default=0,
+        help_text=_('Reveals refused for a wrong passphrase'))
+    bytes_stored = models.PositiveBigIntegerField(
+        verbose_name=_('bytes stored'), default=0,
+        help_text=_('Ciphertext size of the secrets created'))
+
+    class Meta:
+        ordering = ('-minute', )
+        verbose_name = _('usage bucket')
+
+    def __str__(self):
+        return str(self.minute)
@@ -0,0 +1,180 @@
+"""
+Optional PostgreSQL layout where the secrets table is range-partitioned
+on created_at, so expired secrets go away by dropping whole partitions
+instead of deleting rows one at a time.
+
+PostgreSQL requires the partition key in the primary key, so the
+partitioned table's primary key is (id, created_at). Rows outside every
+window land in a DEFAULT partition, which purge_secrets keeps clean.
+"""
+import datetime
+import re
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import blobs, quota, unlogged
+from .utils import get_ttl_bounds
+
+TABLE = 'django_secrets_secret'
+DEFAULT_PARTITION = TABLE + '_default'
+
+_upper_bound_re = re.compile(r"TO \('([^']+)'\)")
+
+
+def is_enabled():
+    return getattr(settings, 'SECRETS_POSTGRES_PARTITIONING', False)
+
+
+def get_interval():
+    return datetime.timedelta(
+        minutes=getattr(settings, 'SECRETS_PARTITION_INTERVAL', 60))
+
+
+def get_premake():
+    return getattr(settings, 'SECRETS_PARTITION_PREMAKE', 3)
+
+
+def window_start(moment, interval):
+    """Start of the partition window containing moment"""
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    step = int(interval.total_seconds())
+    offset = int((moment - epoch).total_seconds()) // step * step
+    return epoch + datetime.timedelta(seconds=offset)
+
+
+def partition_name(start):
+    return '%s_p%s' % (TABLE, start.strftime('%Y%m%d%H%M'))
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """Return (name, upper bound) for every window partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+            [TABLE])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _upper_bound_re.search(bound)
+        if match is None:
+            continue  # the DEFAULT partition
+        partitions.append((name, datetime.datetime.fromisoformat(match.group(1))))
+    return partitions
+
+
+def create_partitions(connection, now=None, interval=None, premake=None):
+    """Create the current window and the next premake ones"""
+    now = now or timezone.now()
+    interval = interval or get_interval()
+    premake = get_premake() if premake is None else premake
+    quote = connection.ops.quote_name
+
+    created = []
+    start = window_start(now, interval)
+    with connection.cursor() as cursor:
+        for i in range(premake + 1):
+            lower = start + i * interval
+            upper = lower + interval
+            name = partition_name(lower)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(
+                "%s %s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)"
+                % (unlogged.create_table_sql(), quote(name), quote(TABLE)), [lower, upper])
+            created.append(name)
+    return created
+
+
+def drop_expired_partitions(connection, now=None, lifetime=None):
+    """Drop window partitions whose every row has expired"""
+    now = now or timezone.now()
+    lifetime = lifetime or get_ttl_bounds()[1]
+    quote = connection.ops.quote_name
+
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, upper in list_partitions(connection):
+            if upper + lifetime <= now:
+                if blobs.is_enabled():
+                    cursor.execute("SELECT blob FROM %s WHERE blob <> ''" % quote(name))
+                    names = [row[0] for row in cursor.fetchall()]
+                    transaction.on_commit(
+                        lambda names=names: blobs.delete(*names), using=connection.alias)
+                if quota.is_enabled():
+                    cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM %s" % quote(name))
+                    count, size = cursor.fetchone()
+                    quota.add(secrets=-count, size=-size)
+                cursor.execute("DROP TABLE %s" % quote(name))
+                dropped.append(name)
+    return dropped
+
+
+def _rebuild(connection, partition_by, primary_key):
+    """Recreate the secrets table with the same columns and indexes"""
+    quote = connection.ops.quote_name
+    old = TABLE + '_old'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+        pk_name = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname <> %s", [TABLE, pk_name])
+        indexes = cursor.fetchall()
+
+        cursor.execute("ALTER TABLE %s RENAME TO %s" % (quote(TABLE), quote(old)))
+        cursor.execute("ALTER TABLE %s DROP CONSTRAINT %s" % (quote(old), quote(pk_name)))
+        for name, definition in indexes:
+            cursor.execute("DROP INDEX %s" % quote(name))
+
+        # A partitioned parent has no storage, so only plain tables can be unlogged
+        cursor.execute(
+            "%s %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS) %s"
+            % ('CREATE TABLE' if partition_by else unlogged.create_table_sql(),
+               quote(TABLE), quote(old), partition_by))
+        cursor.execute(
+            "ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY (%s)"
+            % (quote(TABLE), quote(pk_name), ', '.join(map(quote, primary_key))))
+        if partition_by:
+            cursor.execute(
+                "%s %s PARTITION OF %s DEFAULT"
+                % (unlogged.create_table_sql(), quote(DEFAULT_PARTITION), quote(TABLE)))
+            create_partitions(connection)
+
+        cursor.execute("INSERT INTO %s SELECT * FROM %s" % (quote(TABLE), quote(old)))
+        cursor.execute("DROP TABLE %s CASCADE" % quote(old))
+        for name, definition in indexes:
+            cursor.execute(definition)
+
+
+def partition_table(connection):
+    """Convert the secrets table to a table partitioned on created_at"""
+    if is_partitioned(connection):
+        return False
+    _rebuild(connection, 'PARTITION BY RANGE (created_at)', ['id', 'created_at'])
+    return True
+
+
+def unpartition_table(connection):
+    """Convert the secrets table back to a plain table"""
+    if not is_partitioned(connection):
+        return False
+    _rebuild(connection, '', ['id'])
+    return True
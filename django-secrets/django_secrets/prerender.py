@@ -0,0 +1,81 @@
+"""
+Pages rendered once at build time and served as plain files.
+
+``python manage.py prerender_pages`` renders every URL named in
+SECRETS_PRERENDER_PAGES into SECRETS_PRERENDER_ROOT as
+``<path>/index.html``, next to a gzipped copy. With WHITENOISE_ROOT set to
+the same directory and WHITENOISE_INDEX_FILE = True, WhiteNoise answers
+GET requests for those URLs before any view, middleware or context
+processor runs.
+
+Pages are rendered without a session and without a CSRF token; forms on
+them fetch their token from the ``secrets:csrf`` endpoint when they load.
+"""
+import gzip
+import os
+from django.conf import settings
+from django.http import HttpRequest
+from django.urls import resolve, reverse
+
+
+def get_root():
+    return getattr(settings, 'SECRETS_PRERENDER_ROOT', None)
+
+
+def get_pages():
+    return getattr(settings, 'SECRETS_PRERENDER_PAGES', ('secrets:secret-create', ))
+
+
+def build_request(path):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    # Lets views leave out anything tied to a visitor
+    request.prerendered = True
+    return request
+
+
+def render_page(name):
+    """Render the GET response of a named URL; returns (path, content)"""
+    path = reverse(name)
+    match = resolve(path)
+    response = match.func(build_request(path), *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError('%s answered %d' % (path, response.status_code))
+    return path, response.content
+
+
+def write_page(root, path, content):
+    """Write a rendered page and its gzipped copy; returns the file name"""
+    filename = os.path.join(root, path.lstrip('/'), 'index.html')
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    for name, data in ((filename, content),
+                       (filename + '.gz', gzip.compress(content, mtime=0))):
+        tmp_name = name + '.tmp'
+        with open(tmp_name, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_name, name)
+    return filename
+
+
+def add_headers(headers, path, url):
+    """
+    WHITENOISE_ADD_HEADERS_FUNCTION giving pre-rendered pages a long cache
+    lifetime and the headers their middleware would have added.
+    """
+    root = get_root()
+    if not root or not path.startswith(os.path.abspath(root) + os.sep):
+        return
+    max_age = getattr(settings, 'SECRETS_PRERENDER_MAX_AGE', 60 * 60)
+    headers['Cache-Control'] = 'public, max-age=%d' % max_age
+    headers['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY')
+    try:
+        from csp.utils import build_policy
+    except ImportError:
+        return
+    policy = build_policy()
+    if policy:
+        headers['Content-Security-Policy'] = policy
@@ -0,0 +1,99 @@
+"""
+Hashcash-style proof of work for creating secrets.
+
+With SECRETS_PROOF_OF_WORK set, the create form carries a challenge signed
+by the server: a random nonce and a difficulty, with a timestamp. The
+browser searches for a solution such that SHA-256("<challenge>:<solution>")
+starts with that many zero bits, which takes about 2 ** difficulty hashes.
+The server checks the signature and computes a single hash before any key
+derivation or database work. Each challenge is accepted once, which
+takes a cache shared by every worker: with the default per-process
+LocMemCache a solution can be replayed once on each of them.
+
+The difficulty grows with the number of challenges solved in the current
+minute: every doubling over TARGET_RATE adds one bit, up to
+MAX_DIFFICULTY. Handing out challenges is free, so only solved ones count:
+raising the difficulty for everyone takes solving at the current one.
+Under attack, the expensive server path is then only reached by clients
+that paid for it.
+"""
+import hashlib
+import math
+import secrets
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+SALT = 'django_secrets.proof_of_work'
+CACHE_PREFIX = 'secrets:pow:'
+
+
+class InvalidSolution(Exception):
+    pass
+
+
+def get_config():
+    return getattr(settings, 'SECRETS_PROOF_OF_WORK', None) or None
+
+
+def is_enabled():
+    return get_config() is not None
+
+
+def current_difficulty(solved=None):
+    """Difficulty in bits for the load of the current minute"""
+    config = get_config()
+    base = config.get('DIFFICULTY', 16)
+    if solved is None:
+        solved = cache.get(load_key(), 0)
+    target = config.get('TARGET_RATE', 60)
+    extra = math.ceil(math.log2(solved / target)) if solved > target else 0
+    return min(base + extra, config.get('MAX_DIFFICULTY', 24))
+
+
+def load_key(now=None):
+    return '%ssolved:%d' % (CACHE_PREFIX, (now or time.time()) // 60)
+
+
+def issue():
+    """A new signed challenge and its difficulty"""
+    difficulty = current_difficulty()
+    value = '%s.%d' % (secrets.token_urlsafe(12), difficulty)
+    return signing.TimestampSigner(salt=SALT).sign(value), difficulty
+
+
+def leading_zero_bits(digest):
+    bits = 0
+    for byte in digest:
+        if byte:
+            return bits + 8 - byte.bit_length()
+        bits += 8
+    return bits
+
+
+def verify(challenge, solution):
+    """Check a solved challenge and consume it; raises InvalidSolution"""
+    config = get_config()
+    try:
+        value = signing.TimestampSigner(salt=SALT).unsign(
+            challenge, max_age=config.get('TTL', 5 * 60))
+        difficulty = int(value.rsplit('.', 1)[1])
+    except (signing.BadSignature, IndexError, ValueError):
+        raise InvalidSolution('Invalid or expired challenge')
+
+    digest = hashlib.sha256(('%s:%s' % (challenge, solution)).encode('utf-8')).digest()
+    if leading_zero_bits(digest) < difficulty:
+        raise InvalidSolution('Wrong solution')
+
+    # One secret per solved challenge
+    used = CACHE_PREFIX + 'used:' + hashlib.sha256(challenge.encode('utf-8')).hexdigest()
+    if not cache.add(used, 1, timeout=config.get('TTL', 5 * 60)):
+        raise InvalidSolution('Challenge already used')
+
+    key = load_key()
+    if not cache.add(key, 1, timeout=120):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
@@ -0,0 +1,131 @@
+"""
+Global quota on the secrets stored, from counters kept as they change.
+
+With SECRETS_QUOTA set, every secret and shared payload written adds its
+count and size to a StorageCounter row, and every one deleted (revealed,
+expired, purged, or in a dropped partition) subtracts them again, so the
+current usage is the sum of a handful of rows instead of a scan of the
+secrets table. Each change goes to one of SLOTS rows picked at random, so
+concurrent creates don't queue for the lock of a single hot row.
+
+The create form refuses new secrets once MAX_SECRETS or MAX_BYTES would be
+exceeded, and above NEAR of either limit it only offers lifetimes up to
+NEAR_MAX_TTL minutes so that space frees up sooner. Reveals are never
+refused. Usage is exported with the Prometheus metrics.
+
+Secrets expired but never revealed count until they are deleted: run
+``purge_secrets --expired`` periodically (e.g. from cron) with the quota
+on, or it fills up with secrets nobody can read.
+
+Counters live on the default database and are updated after the row is
+written, on a best-effort basis: a failing update (e.g. SQLite reporting
+the database as locked) is logged and the create or reveal still
+succeeds. So with shards, after such a failure or a crash between the
+write and the counter update, they may drift from the tables:
+``manage.py secrets_quota --recount`` sets them from a full count.
+"""
+import contextlib
+import datetime
+import logging
+import random
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return getattr(settings, 'SECRETS_QUOTA', None) or None
+
+
+def is_enabled():
+    return get_config() is not None
+
+
+def add(secrets=0, size=0):
+    """Add to (or, with negative values, subtract from) the stored totals"""
+    if not (secrets or size) or not is_enabled():
+        return
+    slot = random.randrange(get_config().get('SLOTS', 8))
+    # In a savepoint inside a transaction, so a failure doesn't abort it
+    in_transaction = transaction.get_connection().in_atomic_block
+    try:
+        with transaction.atomic() if in_transaction else contextlib.nullcontext():
+            update(slot, secrets, size)
+    except DatabaseError:
+        logger.warning('Could not update the storage quota by %d secrets, %d bytes',
+                       secrets, size, exc_info=True)
+
+
+def update(slot, secrets, size):
+    from .models import StorageCounter
+
+    counters = StorageCounter.objects.filter(slot=slot)
+    changes = {'secrets': F('secrets') + secrets, 'bytes': F('bytes') + size}
+    if counters.update(**changes):
+        return
+    try:
+        # First change in this slot; another worker may insert it first
+        with transaction.atomic():
+            StorageCounter.objects.create(slot=slot, secrets=secrets, bytes=size)
+    except IntegrityError:
+        counters.update(**changes)
+
+
+def usage():
+    """Secrets and bytes stored right now"""
+    from .models import StorageCounter
+
+    totals = StorageCounter.objects.aggregate(secrets=Sum('secrets'), bytes=Sum('bytes'))
+    return {name: max(value or 0, 0) for name, value in totals.items()}
+
+
+def limits():
+    config = get_config()
+    return {'secrets': config.get('MAX_SECRETS'), 'bytes': config.get('MAX_BYTES')}
+
+
+def fill(current=None):
+    """Highest fraction of a limit in use, 0.0 without limits"""
+    current = current or usage()
+    fractions = [current[name] / limit for name, limit in limits().items() if limit]
+    return max(fractions, default=0.0)
+
+
+def is_near(current=None):
+    return is_enabled() and fill(current) >= get_config().get('NEAR', 0.9)
+
+
+def max_ttl(current=None):
+    """Longest lifetime offered while the quota is near, or None"""
+    if not is_near(current):
+        return None
+    return datetime.timedelta(minutes=get_config().get('NEAR_MAX_TTL', 10))
+
+
+def has_room(secrets, size, current=None):
+    """Whether secrets more secrets of size bytes fit in the quota"""
+    if not is_enabled():
+        return True
+    current = current or usage()
+    wanted = {'secrets': current['secrets'] + secrets, 'bytes': current['bytes'] + size}
+    return all(limit is None or wanted[name] <= limit for name, limit in limits().items())
+
+
+def recount():
+    """Reset the counters from the tables of every shard; returns the totals"""
+    from .models import Payload, Secret, StorageCounter
+    from . import sharding
+
+    totals = {'secrets': 0, 'bytes': 0}
+    for alias in sharding.get_shards():
+        counts = Secret.objects.using(alias).aggregate(secrets=Count('pk'), bytes=Sum('size'))
+        totals['secrets'] += counts['secrets']
+        totals['bytes'] += counts['bytes'] or 0
+        totals['bytes'] += Payload.objects.using(alias).aggregate(
+            bytes=Sum('size'))['bytes'] or 0
+    with transaction.atomic():
+        StorageCounter.objects.all().delete()
+        StorageCounter.objects.create(slot=0, **totals)
+    return totals
@@ -0,0 +1,68 @@
+"""
+Secrets spread over several databases, keyed by their random UUID.
+
+SECRETS_SHARDS lists the database aliases holding secrets. A secret lives
+on SECRETS_SHARDS[id % len(SECRETS_SHARDS)], so its database is known from
+its oid alone: ShardRouter sends saves and deletes there and lookups by ID
+use database_for(). Queries without an ID (purges, the admin, the ID
+filter) run on every shard in turn. The recipients of a shared payload
+get IDs on the shard of the payload. Usage buckets stay in the default
+database.
+
+Changing the list moves the home of existing secrets, so only change it
+while the secrets tables are empty.
+"""
+import uuid
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+APP_LABEL = 'django_secrets'
+SHARDED_MODELS = {'secret', 'payload'}
+
+
+def is_enabled():
+    return bool(getattr(settings, 'SECRETS_SHARDS', None))
+
+
+def get_shards():
+    """The database aliases holding secrets"""
+    return tuple(getattr(settings, 'SECRETS_SHARDS', None) or (DEFAULT_DB_ALIAS, ))
+
+
+def database_for(pk):
+    """The alias of the database holding this secret, or None if unsharded"""
+    if not is_enabled():
+        return None
+    if not isinstance(pk, uuid.UUID):
+        pk = uuid.UUID(str(pk))
+    shards = get_shards()
+    return shards[pk.int % len(shards)]
+
+
+def co_located_id(pk):
+    """A new random ID for a row on the same database as pk"""
+    alias = database_for(pk)
+    while True:
+        candidate = uuid.uuid4()
+        if database_for(candidate) == alias:
+            return candidate
+
+
+class ShardRouter(object):
+    """Database router placing every secret on the shard of its ID"""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if (model._meta.app_label == APP_LABEL and model._meta.model_name in SHARDED_MODELS
+                and instance is not None and instance.pk is not None):
+            return database_for(instance.pk)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, **hints):
+        if app_label == APP_LABEL and is_enabled():
+            if hints.get('model_name', 'secret') not in SHARDED_MODELS:
+                return db == DEFAULT_DB_ALIAS
+            return db in get_shards()
+        return None
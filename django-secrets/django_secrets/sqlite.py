@@ -0,0 +1,65 @@
+"""
+Support for running on a single SQLite file shared by several workers.
+
+Set SECRETS_SQLITE_PRAGMAS to a dict of pragmas to apply to every new
+SQLite connection, e.g. {'journal_mode': 'wal', 'synchronous': 'normal'}.
+"""
+import time
+from django.conf import settings
+from django.db import OperationalError, connections
+
+_last_checkpoint = {}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Apply SECRETS_SQLITE_PRAGMAS to a new SQLite connection"""
+    pragmas = getattr(settings, 'SECRETS_SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+def is_locked_error(exc):
+    return 'locked' in str(exc) or 'busy' in str(exc)
+
+
+def retry_on_locked(func, attempts=None, delay=None):
+    """
+    Call func, retrying with exponential backoff while SQLite reports the
+    database as locked. Other errors, and the last failure, are raised.
+    """
+    if attempts is None:
+        attempts = getattr(settings, 'SECRETS_SQLITE_RETRY_ATTEMPTS', 5)
+    if delay is None:
+        delay = getattr(settings, 'SECRETS_SQLITE_RETRY_DELAY', 0.05)
+
+    for attempt in range(attempts):
+        try:
+            return func()
+        except OperationalError as e:
+            if not is_locked_error(e) or attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def checkpoint(using='default', mode='PASSIVE'):
+    """Copy the WAL back into the database file; returns (busy, log, checkpointed)"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA wal_checkpoint(%s)' % mode)
+        return cursor.fetchone()
+
+
+def maybe_checkpoint(using='default'):
+    """Run a passive checkpoint at most every SECRETS_SQLITE_CHECKPOINT_INTERVAL seconds"""
+    interval = getattr(settings, 'SECRETS_SQLITE_CHECKPOINT_INTERVAL', None)
+    if not interval or connections[using].vendor != 'sqlite':
+        return False
+    now = time.monotonic()
+    if now - _last_checkpoint.get(using, 0) < interval:
+        return False
+    _last_checkpoint[using] = now
+    checkpoint(using)
+    return True
@@ -8,4 +8,72 @@
     });
 
     clipboard.on('error', function(e) {});
+
+    // Pre-rendered forms ship without a CSRF token
+    $('input[data-csrf-url]').each(function() {
+        var input = $(this);
+        $.getJSON(input.data('csrf-url'), function(data) {
+            input.val(data.token);
+        });
+    });
+
+    // Resubmitting the same form must not create a second secret, while
+    // editing it (even after going back to it) makes a new one
+    $('input[name="idempotency_key"]').each(function() {
+        var key = this;
+        if (!(window.crypto && crypto.randomUUID)) {
+            return;
+        }
+        key.value = crypto.randomUUID();
+        $(key).closest('form').on('input change', ':input:visible', function() {
+            key.value = crypto.randomUUID();
+        });
+    });
+
+    // Proof of work: find a solution whose SHA-256 starts with enough zero bits
+    function leadingZeroBits(digest) {
+        var bits = 0;
+        for (var i = 0; i < digest.length; i++) {
+            if (digest[i]) {
+                return bits + Math.clz32(digest[i]) - 24;
+            }
+            bits += 8;
+        }
+        return bits;
+    }
+
+    // A loop, not a chain of promises, so memory stays the same however
+    // many attempts the difficulty takes
+    async function solve(challenge, difficulty) {
+        var encoder = new TextEncoder();
+        for (var counter = 0; ; counter++) {
+            var digest = await crypto.subtle.digest('SHA-256', encoder.encode(challenge + ':' + counter));
+            if (leadingZeroBits(new Uint8Array(digest)) >= difficulty) {
+                return String(counter);
+            }
+        }
+    }
+
+    $('input[data-challenge-url]').each(function() {
+        var challenge = $(this);
+        var form = challenge.closest('form');
+        var solution = form.find('input[name="pow_solution"]');
+        var solved = $.getJSON(challenge.data('challenge-url')).then(function(data) {
+            challenge.val(data.challenge);
+            return solve(data.challenge, data.difficulty);
+        }).then(function(value) {
+            solution.val(value);
+        });
+
+        form.on('submit', function(event) {
+            if (solution.val()) {
+                return;
+            }
+            event.preventDefault();
+            form.find(':submit').prop('disabled', true);
+            solved.then(function() {
+                form[0].submit();
+            });
+        });
+    });
 })();
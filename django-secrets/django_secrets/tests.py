@@ -1,18 +1,36 @@
 import datetime
+import os
+import time
 import uuid
-from unittest.mock import Mock, patch
-from django.test import TestCase, Client, RequestFactory
+from unittest import skipUnless
+from unittest.mock import Mock, PropertyMock, call, patch
+from io import StringIO
+from django.core.management import call_command, CommandError
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.db import connection, connections, OperationalError
+from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.admin.sites import AdminSite
-from django.http import Http404
-from cryptography.fernet import InvalidToken
-from .models import Secret
+from django.http import Http404, HttpResponse
+from cryptography.fernet import Fernet, InvalidToken
+from .models import Payload, Secret, StorageCounter, UsageBucket
 from .utils import encrypt, decrypt, generate_salt, encode_id, decode_id, passphrase_to_key
 from .forms import SecretCreateForm, SecretUpdateForm
-from .admin import SecretAdmin
+from .admin import (SecretAdmin, LargeTableSecretAdmin, EstimatedCountPaginator,
+                    CreatedWithinListFilter, ShardListFilter)
 from .mixins import KnuthIdMixin
-from .views import SecretUpdateView
+from .views import SecretCreateView, SecretUpdateView
+from . import (admission, blobs, heavy_hitters, idempotency, metrics, partitioning, prerender,
+               proof_of_work, quota, sharding, sqlite, membership, unlogged, usage, utils, warmup)
+from .converters import OidConverter
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
 
 
 class UtilsSecurityTests(TestCase):
@@ -71,6 +89,65 @@ class UtilsSecurityTests(TestCase):
         self.assertIsNone(result, "Invalid OID should return None")
 
 
+class CipherEngineTests(TestCase):
+    """Test the AEAD engines and their versioned envelope"""
+
+    def test_envelope_round_trip(self):
+        """Both engines decrypt what they encrypt and start with the version"""
+        salt = generate_salt()
+        for cipher in ('aes-256-gcm', 'chacha20-poly1305'):
+            with override_settings(SECRETS_CIPHER=cipher):
+                for data in ('', 'x' * 17, 'caf\u00e9' * 1000):
+                    token = encrypt(data, "pass", salt)
+                    self.assertTrue(token.startswith('AQ'))
+                    self.assertEqual(decrypt(token, "pass", salt), data)
+
+    def test_envelope_is_smaller_than_fernet(self):
+        """The envelope has no padding, timestamp or double MAC"""
+        salt = generate_salt()
+        fernet = encrypt('x' * 1000, "pass", salt)
+        with override_settings(SECRETS_CIPHER='aes-256-gcm'):
+            envelope = encrypt('x' * 1000, "pass", salt)
+        self.assertLess(len(envelope), len(fernet))
+
+    def test_ciphertext_size(self):
+        """The size is known before encrypting, for every engine"""
+        key = bytes(utils.generate_data_key())
+        for cipher in ('fernet', 'aes-256-gcm', 'chacha20-poly1305'):
+            with override_settings(SECRETS_CIPHER=cipher):
+                for length in (0, 1, 15, 16, 17, 44, 1000):
+                    self.assertEqual(utils.ciphertext_size(length),
+                                     len(utils.encrypt_with_key(b'x' * length, key)))
+
+    def test_fernet_rows_still_decrypt(self):
+        """Switching engines keeps existing Fernet secrets readable"""
+        salt = generate_salt()
+        token = encrypt("old row", "pass", salt)
+        with override_settings(SECRETS_CIPHER='chacha20-poly1305'):
+            self.assertEqual(decrypt(token, "pass", salt), "old row")
+
+    def test_tampered_envelope_rejected(self):
+        """Changing the header or the ciphertext fails authentication"""
+        import base64
+        salt = generate_salt()
+        key = utils.derive_key("pass", salt)
+        raw = bytearray(base64.urlsafe_b64decode(utils.aead_encrypt(key, b"secret")))
+        for position in (1, 2, 20, len(raw) - 1):
+            tampered = bytearray(raw)
+            tampered[position] ^= 1
+            with self.assertRaises(InvalidToken):
+                utils.aead_decrypt(key, base64.urlsafe_b64encode(tampered))
+        with self.assertRaises(InvalidToken):
+            decrypt(base64.urlsafe_b64encode(raw).decode('ascii'), "wrong", salt)
+
+    def test_unknown_cipher_rejected(self):
+        """A misspelled SECRETS_CIPHER is a configuration error"""
+        from django.core.exceptions import ImproperlyConfigured
+        with override_settings(SECRETS_CIPHER='aes-128-ecb'):
+            with self.assertRaises(ImproperlyConfigured):
+                encrypt("secret", "pass", generate_salt())
+
+
 class SecretModelTests(TestCase):
     """Test Secret model security features"""
 
@@ -105,7 +182,8 @@ class SecretModelTests(TestCase):
 
         # Manually set created_at to 11 minutes ago
         old_time = timezone.now() - datetime.timedelta(minutes=11)
-        Secret.objects.filter(pk=secret.pk).update(created_at=old_time)
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=old_time, expires_at=old_time + datetime.timedelta(minutes=10))
 
         # Refresh and check if it's in available queryset
         available_secrets = Secret.available.filter(pk=secret.pk)
@@ -180,7 +258,8 @@ class SecretViewTests(TestCase):
 
         # Manually expire it
         old_time = timezone.now() - datetime.timedelta(minutes=11)
-        Secret.objects.filter(pk=secret.pk).update(created_at=old_time)
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=old_time, expires_at=old_time + datetime.timedelta(minutes=10))
 
         # Try to view it
         response = self.client.post(reverse('secrets:secret-update', kwargs={'oid': oid}), {
@@ -190,6 +269,50 @@ class SecretViewTests(TestCase):
         self.assertEqual(response.status_code, 404,
                          "Expired secrets should return 404")
 
+    def _create(self, data='narrow row', passphrase='testpass'):
+        form = SecretCreateForm(data={'data': data, 'passphrase': passphrase})
+        self.assertTrue(form.is_valid())
+        return form.save()
+
+    def _data_queries(self, queries):
+        column = '"django_secrets_secret"."data"'
+        return [q['sql'] for q in queries.captured_queries
+                if column in q['sql'] and q['sql'].startswith('SELECT')]
+
+    def test_reveal_page_does_not_read_ciphertext(self):
+        """The passphrase form is rendered from the metadata columns only"""
+        secret = self._create()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(secret.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._data_queries(queries), [])
+
+    def test_expired_reveal_does_not_read_ciphertext(self):
+        """An expired secret is deleted without fetching its ciphertext"""
+        secret = self._create()
+        Secret.objects.filter(pk=secret.pk).update(expires_at=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(secret.get_absolute_url(), {'passphrase': 'testpass'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._data_queries(queries), [])
+
+    def test_ciphertext_read_once_to_check_passphrase(self):
+        """Checking the passphrase fetches the ciphertext in a single query"""
+        secret = self._create()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(secret.get_absolute_url(), {'passphrase': 'testpass'})
+        self.assertContains(response, 'narrow row')
+        self.assertEqual(len(self._data_queries(queries)), 1)
+
+    def test_load_ciphertext_after_concurrent_reveal(self):
+        """A secret revealed by another request meanwhile is a 404"""
+        secret = self._create()
+        deferred = Secret.available.metadata().get(pk=secret.pk)
+        Secret.objects.filter(pk=secret.pk).delete()
+        form = SecretUpdateForm(data={'passphrase': 'testpass'}, instance=deferred)
+        with self.assertRaises(Http404):
+            form.is_valid()
+
 
 class SecurityRegressionTests(TestCase):
     """Tests for specific security vulnerabilities that were fixed"""
@@ -380,6 +503,24 @@ class ModelPropertyTests(TestCase):
         # Size should account for UTF-8 encoding
         self.assertGreater(secret.size, 0)
 
+    def test_size_stored_at_creation(self):
+        """Test that the ciphertext size is stored in its own column"""
+        form = SecretCreateForm(data={'data': 'hello', 'passphrase': 'pass'})
+        self.assertTrue(form.is_valid())
+        secret = form.save()
+
+        stored = Secret.objects.values_list('size', flat=True).get(pk=secret.pk)
+        self.assertEqual(stored, len(secret.data.encode('utf-8')))
+
+    def test_expires_at_stored_at_creation(self):
+        """Test that the expiry is stored in its own column"""
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass'})
+        self.assertTrue(form.is_valid())
+        secret = form.save()
+
+        stored = Secret.objects.values_list('expires_at', flat=True).get(pk=secret.pk)
+        self.assertEqual(stored, secret.expire_at)
+
     def test_expire_at_property(self):
         """Test that expire_at is 10 minutes after creation"""
         form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass'})
@@ -442,7 +583,8 @@ class ManagerTests(TestCase):
 
         # Expire it
         old_time = timezone.now() - datetime.timedelta(minutes=11)
-        Secret.objects.filter(pk=secret.pk).update(created_at=old_time)
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=old_time, expires_at=old_time + datetime.timedelta(minutes=10))
 
         # Should no longer be available
         self.assertEqual(Secret.available.filter(pk=secret.pk).count(), 0)
@@ -459,7 +601,8 @@ class ManagerTests(TestCase):
 
         # Set to exactly 10 minutes ago (should be expired)
         boundary_time = timezone.now() - datetime.timedelta(minutes=10, seconds=1)
-        Secret.objects.filter(pk=secret.pk).update(created_at=boundary_time)
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=boundary_time, expires_at=boundary_time + datetime.timedelta(minutes=10))
 
         # Should be expired
         self.assertEqual(Secret.available.filter(pk=secret.pk).count(), 0)
@@ -480,7 +623,8 @@ class ManagerTests(TestCase):
             self.assertTrue(form.is_valid())
             secret = form.save()
             old_time = timezone.now() - datetime.timedelta(minutes=11)
-            Secret.objects.filter(pk=secret.pk).update(created_at=old_time)
+            Secret.objects.filter(pk=secret.pk).update(
+                created_at=old_time, expires_at=old_time + datetime.timedelta(minutes=10))
             expired_secrets.append(secret)
 
         # Available should only return valid ones
@@ -492,6 +636,59 @@ class ManagerTests(TestCase):
         self.assertEqual(total_count, 5)
 
 
+class ExpiryTests(TestCase):
+    """Test the stored expiry and per-secret lifetimes"""
+
+    def test_default_ttl(self):
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass'})
+        self.assertTrue(form.is_valid())
+        secret = form.save()
+        lifetime = secret.expires_at - secret.created_at
+        self.assertAlmostEqual(lifetime.total_seconds(), 600, delta=1)
+
+    def test_chosen_ttl(self):
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass', 'ttl': '5'})
+        self.assertTrue(form.is_valid())
+        secret = form.save()
+        lifetime = secret.expires_at - secret.created_at
+        self.assertAlmostEqual(lifetime.total_seconds(), 300, delta=1)
+
+    def test_ttl_outside_bounds_rejected(self):
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass', 'ttl': '60'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('ttl', form.errors)
+
+    @override_settings(SECRETS_MAX_TTL=24 * 60)
+    def test_ttl_bounds_are_configurable(self):
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass', 'ttl': '60'})
+        self.assertTrue(form.is_valid())
+        self.assertIn(24 * 60, dict(form.fields['ttl'].choices))
+        self.assertNotIn(7 * 24 * 60, dict(form.fields['ttl'].choices))
+
+    def test_expiry_follows_expires_at(self):
+        """A secret is available until its own expires_at, whatever its age"""
+        secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+        Secret.objects.filter(pk=secret.pk).update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertFalse(Secret.available.filter(pk=secret.pk).exists())
+
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=timezone.now() - datetime.timedelta(minutes=9),
+            expires_at=timezone.now() + datetime.timedelta(minutes=1))
+        self.assertTrue(Secret.available.filter(pk=secret.pk).exists())
+        self.assertFalse(Secret.objects.get(pk=secret.pk).is_expired)
+
+    def test_available_query_uses_expires_at_index(self):
+        """The availability predicate is served by the expires_at index"""
+        queryset = Secret.available.order_by()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertIn('expires_at', plan)
+        self.assertRegex(plan, r'(?i)index')
+
+
 class UtilsEdgeCaseTests(TestCase):
     """Test utility functions with edge cases"""
 
@@ -551,6 +748,53 @@ class UtilsEdgeCaseTests(TestCase):
 
         self.assertEqual(decrypted, unicode_data)
 
+    def test_token_is_stored_as_is(self):
+        """The stored ciphertext is a Fernet token, base64-encoded only once"""
+        salt = generate_salt()
+        token = encrypt("secret", "pass", salt)
+        self.assertTrue(token.startswith('gAAAAA'))
+        self.assertEqual(Fernet(passphrase_to_key("pass", salt)).decrypt(token.encode()), b"secret")
+
+    def test_decrypt_fernet_and_legacy_tokens(self):
+        """Tokens from Fernet itself and the old double-encoded rows decrypt"""
+        import base64
+        salt = generate_salt()
+        token = Fernet(passphrase_to_key("pass", salt)).encrypt("caf\u00e9".encode('utf-8'))
+        self.assertEqual(decrypt(token, "pass", salt), "caf\u00e9")
+        self.assertEqual(decrypt(base64.b64encode(token).decode('ascii'), "pass", salt), "caf\u00e9")
+
+    def test_encrypt_bytes_like_data(self):
+        """Bytes-like plaintext is encrypted without an extra copy"""
+        salt = generate_salt()
+        plain = bytearray(b"block" * 7)
+        token = encrypt(memoryview(plain), "pass", salt)
+        self.assertEqual(decrypt(token, "pass", salt), "block" * 7)
+
+    def test_tampered_token_rejected(self):
+        """A modified token fails authentication"""
+        salt = generate_salt()
+        token = encrypt("secret", "pass", salt)
+        tampered = token[:-6] + ('A' if token[-6] != 'A' else 'B') + token[-5:]
+        for bad in (tampered, token[:40], 'not a token'):
+            with self.assertRaises(InvalidToken):
+                decrypt(bad, "pass", salt)
+
+    def test_decrypted_buffer_is_wiped(self):
+        """The plaintext buffer is zeroed once decoded"""
+        salt = generate_salt()
+        token = encrypt("wipe me", "pass", salt)
+        buffers = []
+        real = utils.fernet_decrypt
+
+        def spy(key, token):
+            plain, length = real(key, token)
+            buffers.append(plain)
+            return plain, length
+
+        with patch.object(utils, 'fernet_decrypt', spy):
+            self.assertEqual(decrypt(token, "pass", salt), "wipe me")
+        self.assertEqual(bytes(buffers[0]), bytes(len(buffers[0])))
+
     def test_decrypt_wrong_passphrase_raises_error(self):
         """Test that wrong passphrase raises InvalidToken"""
         salt = generate_salt()
@@ -641,6 +885,139 @@ class MixinTests(TestCase):
             view.get_object()
 
 
+class OidConverterTests(TestCase):
+    """Test strict oid validation in the URL"""
+
+    def test_accepts_encoded_uuid(self):
+        oid = encode_id(uuid.uuid4())
+        self.assertEqual(OidConverter().to_python(oid), oid)
+        self.assertRegex(oid, '^%s$' % OidConverter.regex)
+
+    def test_malformed_oids_never_reach_the_view(self):
+        with patch.object(SecretUpdateView, 'get_object') as get_object:
+            for oid in ('short', 'a' * 23, encode_id(uuid.uuid4())[:-1] + 'B'):
+                response = self.client.get('/%s/' % oid)
+                self.assertEqual(response.status_code, 404)
+        get_object.assert_not_called()
+
+
+class SharedIdFilterTests(TestCase):
+    """Test the shared counting Bloom filter of live secret IDs"""
+
+    def setUp(self):
+        import tempfile
+        self.path = os.path.join(tempfile.mkdtemp(), 'ids.bin')
+        self.filter = membership.SharedIdFilter(self.path, 1000, 0.001, 600)
+        self.addCleanup(self.filter.close)
+        self.now = time.time()
+
+    def test_added_ids_are_found(self):
+        keys = [uuid.uuid4().bytes for _ in range(200)]
+        for key in keys:
+            self.filter.add(key, self.now)
+        self.assertTrue(all(self.filter.might_contain(key) for key in keys))
+
+    def test_unknown_ids_are_mostly_rejected(self):
+        for _ in range(1000):
+            self.filter.add(uuid.uuid4().bytes, self.now)
+        hits = sum(self.filter.might_contain(uuid.uuid4().bytes) for _ in range(2000))
+        self.assertLess(hits, 20)
+
+    def test_removed_ids_are_forgotten(self):
+        key = uuid.uuid4().bytes
+        self.filter.add(key, self.now)
+        self.filter.remove(key, self.now)
+        self.assertFalse(self.filter.might_contain(key))
+
+    def test_shared_between_mappings(self):
+        """Another process mapping the same file sees the same IDs"""
+        other = membership.SharedIdFilter(self.path, 1000, 0.001, 600)
+        self.addCleanup(other.close)
+        key = uuid.uuid4().bytes
+        self.filter.add(key, self.now)
+        self.assertTrue(other.might_contain(key))
+
+    def test_ids_live_for_two_generations(self):
+        key = uuid.uuid4().bytes
+        self.filter.add(key, self.now)
+        self.assertTrue(self.filter.might_contain(key, now=self.now + 600))
+        self.assertFalse(self.filter.might_contain(key, now=self.now + 1200))
+
+    def test_old_generation_is_recycled(self):
+        old, new = uuid.uuid4().bytes, uuid.uuid4().bytes
+        self.filter.add(old, self.now - 1200)
+        self.filter.add(new, self.now)
+        self.filter.add(uuid.uuid4().bytes, self.now + 1200)
+        self.assertFalse(self.filter.might_contain(old, now=self.now + 1200))
+
+    def test_settings_change_resets_file(self):
+        key = uuid.uuid4().bytes
+        self.filter.add(key, self.now)
+        other = membership.SharedIdFilter(self.path, 5000, 0.001, 600)
+        self.addCleanup(other.close)
+        self.assertFalse(other.might_contain(key))
+        self.assertFalse(other.populated)
+
+
+class IdFilterIntegrationTests(TestCase):
+    """Test the ID filter in the create, lookup and reveal paths"""
+
+    def setUp(self):
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'ids.bin')
+        override = override_settings(SECRETS_ID_FILTER={'PATH': path, 'CAPACITY': 1000})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_existing_secrets_loaded_on_first_use(self):
+        secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+        membership._filters.clear()
+        self.assertTrue(membership.might_exist(secret.pk))
+
+    def test_unknown_oid_answered_without_query(self):
+        membership.populate_from_database(membership.get_id_filter())
+        view = SecretUpdateView()
+        view.kwargs = {'oid': encode_id(uuid.uuid4())}
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                view.get_object(queryset=Secret.available.all())
+
+    def test_created_secret_is_found(self):
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass'})
+        self.assertTrue(form.is_valid())
+        secret = form.save()
+        view = SecretUpdateView()
+        view.kwargs = {'oid': secret.oid}
+        self.assertEqual(view.get_object().pk, secret.pk)
+
+    def test_deleted_secret_is_forgotten_on_commit(self):
+        secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+        pk = secret.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            secret.delete()
+        self.assertFalse(membership.might_exist(pk))
+
+    def test_racing_deletes_forget_the_id_once(self):
+        """The losing reveal of a race leaves the counters of other IDs alone"""
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'ids.bin')
+        # Two counters and one hash, so another ID can share the counter
+        with self.settings(SECRETS_ID_FILTER={'PATH': path, 'CAPACITY': 1, 'ERROR_RATE': 0.5}):
+            id_filter = membership.get_id_filter()
+            membership.populate_from_database(id_filter)
+            secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+            other = uuid.uuid4()
+            while id_filter._positions(other.bytes) != id_filter._positions(secret.pk.bytes):
+                other = uuid.uuid4()
+            Secret.objects.create(id=other, data='x', salt=generate_salt())
+
+            stale = Secret.objects.get(pk=secret.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                secret.delete()
+                self.assertEqual(stale.delete()[0], 0)
+            self.assertTrue(membership.might_exist(other))
+
+
 class AdminTests(TestCase):
     """Test admin interface"""
 
@@ -694,6 +1071,1564 @@ class AdminTests(TestCase):
         """Test admin default ordering"""
         self.assertEqual(self.admin.ordering, ('-created_at',))
 
+    def test_admin_queryset_defers_ciphertext(self):
+        """Test that the changelist queryset never loads the ciphertext"""
+        form = SecretCreateForm(data={'data': 'test', 'passphrase': 'pass'})
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        obj = self.admin.get_queryset(Mock()).get()
+        self.assertIn('data', obj.get_deferred_fields())
+
+    def test_admin_changelist_does_not_select_data(self):
+        """Test that rendering the changelist doesn't read the data column"""
+        for i in range(3):
+            form = SecretCreateForm(data={'data': f'secret{i}', 'passphrase': 'pass'})
+            self.assertTrue(form.is_valid())
+            form.save()
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        client.login(username='admin', password='password')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('admin:django_secrets_secret_changelist'))
+
+        self.assertEqual(response.status_code, 200)
+        column = '"django_secrets_secret"."data"'
+        self.assertFalse(any(column in q['sql'] for q in queries.captured_queries))
+
+
+class LargeTableAdminTests(TestCase):
+    """Test the admin mode for very large tables"""
+
+    def setUp(self):
+        self.site = AdminSite()
+        self.admin = LargeTableSecretAdmin(Secret, self.site)
+        self.admin.list_per_page = 2
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+        now = timezone.now()
+        self.secrets = []
+        for i in range(5):
+            secret = Secret.objects.create(
+                id=uuid.uuid4(), data=f'secret{i}', salt=generate_salt())
+            # Spread creation times and force a tie on the last two
+            created_at = now - datetime.timedelta(minutes=min(i, 3))
+            Secret.objects.filter(pk=secret.pk).update(created_at=created_at)
+            self.secrets.append(secret)
+
+    def changelist(self, **params):
+        request = self.factory.get('/', params)
+        request.user = self.user
+        return self.admin.get_changelist_instance(request)
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        """Following the cursor visits all rows in order without repeats"""
+        seen = []
+        cl = self.changelist()
+        while True:
+            seen.extend(obj.pk for obj in cl.result_list)
+            if not cl.next_cursor:
+                break
+            cl = self.changelist(after=cl.next_cursor)
+
+        expected = list(Secret.objects.order_by('-created_at', '-id')
+                        .values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_keyset_pagination_does_not_use_offset(self):
+        """Later pages are fetched with a range predicate, not OFFSET"""
+        cl = self.changelist()
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist(after=cl.next_cursor)
+        self.assertFalse(any('OFFSET' in q['sql'] for q in queries.captured_queries))
+
+    def test_invalid_cursor_rejected(self):
+        """A garbled cursor is reported as a bad lookup"""
+        from django.contrib.admin.options import IncorrectLookupParameters
+        with self.assertRaises(IncorrectLookupParameters):
+            self.changelist(after='garbage')
+
+    def test_filter_links_reset_cursor(self):
+        """Changing a filter starts again from the first page"""
+        cl = self.changelist()
+        cl = self.changelist(after=cl.next_cursor)
+        self.assertNotIn('after=', cl.get_query_string({'created': '5'}))
+
+    def test_created_within_filter(self):
+        """Time buckets filter on created_at"""
+        cl = self.changelist(created='1')
+        self.assertEqual(cl.result_count, 1)
+
+    def test_estimated_count_falls_back_to_exact_count(self):
+        """Without planner statistics the paginator counts exactly"""
+        paginator = EstimatedCountPaginator(Secret.objects.all(), 2)
+        self.assertEqual(paginator.count, 5)
+
+    def test_changelist_renders(self):
+        """The keyset changelist renders with a link to older rows"""
+        request = self.factory.get('/')
+        request.user = self.user
+        response = self.admin.changelist_view(request)
+        response.render()
+        self.assertContains(response, 'after=')
+
+
+class PurgeTests(TestCase):
+    """Test batched deletion in the admin and the purge_secrets command"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        for i in range(5):
+            Secret.objects.create(
+                id=uuid.uuid4(), data='x' * (i + 1) * 100, salt=generate_salt(),
+                creator_ip='10.0.0.%d' % (i % 2))
+        # Age the two largest secrets
+        old = Secret.objects.filter(size__gte=400)
+        old.update(created_at=self.now - datetime.timedelta(minutes=30),
+                   expires_at=self.now - datetime.timedelta(minutes=20))
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_secrets', *args, stdout=out)
+        return out.getvalue()
+
+    def test_delete_in_batches(self):
+        """Batches are bounded and one DELETE query is issued per batch"""
+        with CaptureQueriesContext(connection) as queries:
+            counts = list(Secret.objects.all().delete_in_batches(2))
+        self.assertEqual(counts, [2, 2, 1])
+        self.assertEqual(Secret.objects.count(), 0)
+        # Three batches plus the final empty one
+        self.assertEqual(len(queries.captured_queries), 4)
+        self.assertTrue(all(q['sql'].startswith('DELETE') for q in queries.captured_queries))
+
+    def test_delete_in_batches_never_reads_data(self):
+        """Batched deletion never selects the ciphertext"""
+        with CaptureQueriesContext(connection) as queries:
+            list(Secret.objects.filter(size__gte=300).delete_in_batches(1))
+        self.assertFalse(any('"data"' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(Secret.objects.count(), 2)
+
+    def test_purge_expired(self):
+        output = self.purge('--expired')
+        self.assertIn('Deleted 2 secrets.', output)
+        self.assertEqual(Secret.objects.count(), 3)
+
+    def test_purge_older_than(self):
+        self.purge('--older-than', '15')
+        self.assertFalse(Secret.objects.filter(size__gte=400).exists())
+
+    def test_purge_by_size_and_ip(self):
+        self.purge('--min-size', '200', '--ip', '10.0.0.0')
+        self.assertEqual(
+            sorted(Secret.objects.values_list('size', flat=True)), [100, 200, 400])
+
+    def test_purge_reports_progress(self):
+        output = self.purge('--all', '--batch-size', '2')
+        self.assertIn('(4 so far)', output)
+        self.assertIn('Deleted 5 secrets.', output)
+
+    def test_purge_dry_run(self):
+        output = self.purge('--expired', '--dry-run')
+        self.assertIn('2 secrets match.', output)
+        self.assertEqual(Secret.objects.count(), 5)
+
+    def test_purge_requires_a_filter(self):
+        with self.assertRaises(CommandError):
+            self.purge()
+        self.assertEqual(Secret.objects.count(), 5)
+
+    def test_admin_purge_action(self):
+        """The admin action deletes the selection in batches"""
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        client = Client()
+        client.login(username='admin', password='password')
+        selected = list(Secret.objects.filter(creator_ip='10.0.0.1')
+                        .values_list('pk', flat=True))
+
+        response = client.post(reverse('admin:django_secrets_secret_changelist'), {
+            'action': 'purge_selected',
+            '_selected_action': [str(pk) for pk in selected],
+        }, follow=True)
+
+        self.assertContains(response, 'Deleted 2 secrets')
+        self.assertFalse(Secret.objects.filter(pk__in=selected).exists())
+        self.assertEqual(Secret.objects.count(), 3)
+
+    def test_admin_hides_stock_delete_action(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        actions = SecretAdmin(Secret, AdminSite()).get_actions(request)
+        self.assertNotIn('delete_selected', actions)
+        self.assertIn('purge_selected', actions)
+
+
+class BlobStorageTests(TestCase):
+    """Test keeping the ciphertext in a blob storage instead of the row"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        storages = dict(settings.STORAGES, secrets={
+            'BACKEND': 'django_secrets.blobs.BlobStorage',
+            'OPTIONS': {'location': self.root},
+        })
+        override = override_settings(STORAGES=storages, SECRETS_BLOB_STORAGE='secrets')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create(self, data='kept outside', passphrase='pass'):
+        form = SecretCreateForm(data={'data': data, 'passphrase': passphrase})
+        self.assertTrue(form.is_valid())
+        return form.save()
+
+    def files(self):
+        return sorted(os.path.join(d, f) for d, _, names in os.walk(self.root) for f in names)
+
+    def test_row_keeps_only_a_reference(self):
+        """The ciphertext is written to the storage and the column stays empty"""
+        secret = self.create()
+        row = Secret.objects.get(pk=secret.pk)
+        self.assertEqual(row.data, '')
+        self.assertEqual(row.blob, blobs.blob_name(secret.pk))
+        self.assertEqual(self.files(), [os.path.join(self.root, row.blob)])
+        self.assertGreater(row.size, 0)
+
+    def test_blob_written_atomically(self):
+        """No temporary files are left behind and blobs are private"""
+        secret = self.create()
+        path, = self.files()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        with open(path) as f:
+            self.assertEqual(len(f.read()), secret.size)
+
+    def test_reveal_reads_blob_and_removes_it(self):
+        """A reveal decrypts the blob, then deletes it with the row"""
+        secret = self.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(secret.get_absolute_url(), {'passphrase': 'pass'},
+                                        REMOTE_ADDR='10.3.4.1')
+        self.assertContains(response, 'kept outside')
+        self.assertFalse(Secret.objects.filter(pk=secret.pk).exists())
+        self.assertEqual(self.files(), [])
+
+    def test_missing_blob_is_a_404(self):
+        """A secret whose blob has gone can't be revealed"""
+        secret = self.create()
+        os.unlink(self.files()[0])
+        deferred = Secret.available.metadata().get(pk=secret.pk)
+        form = SecretUpdateForm(data={'passphrase': 'pass'}, instance=deferred)
+        with self.assertRaises(Http404):
+            form.is_valid()
+
+    def test_purge_unlinks_blobs(self):
+        """Batch deletion removes the blobs of the deleted rows"""
+        for i in range(3):
+            self.create(data='secret%d' % i)
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = list(Secret.objects.all().delete_in_batches(batch_size=2))
+        self.assertEqual(deleted, [2, 1])
+        self.assertEqual(self.files(), [])
+
+    def test_failed_insert_leaves_no_blob(self):
+        """A blob whose row couldn't be saved is removed again"""
+        secret = self.create()
+        duplicate = Secret(id=uuid.uuid4(), data='again', salt=generate_salt())
+        with patch('django.db.models.Model.save', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                duplicate.save()
+        self.assertEqual(self.files(), [os.path.join(self.root, secret.blob)])
+
+
+@override_settings(SECRETS_SHARDS=('default', 'shard1'))
+class ShardingTests(TestCase):
+    """Test spreading secrets over several databases by ID"""
+    databases = {'default', 'shard1'}
+
+    def create(self, shard, data='sharded', passphrase='pass'):
+        # Keep creating until one lands on the wanted shard
+        while True:
+            form = SecretCreateForm(data={'data': data, 'passphrase': passphrase})
+            self.assertTrue(form.is_valid())
+            secret = form.save()
+            if secret._state.db == shard:
+                return secret
+            secret.delete()
+
+    def count(self, alias):
+        return Secret.objects.using(alias).count()
+
+    def test_database_for_is_stable(self):
+        """The shard of an ID is derived from the ID alone"""
+        pk = uuid.UUID(int=7)
+        self.assertEqual(sharding.database_for(pk), 'shard1')
+        self.assertEqual(sharding.database_for(str(pk)), 'shard1')
+        with override_settings(SECRETS_SHARDS=None):
+            self.assertIsNone(sharding.database_for(pk))
+
+    def test_creates_go_to_their_shard(self):
+        """Saved secrets are written to the shard of their ID"""
+        for alias in ('default', 'shard1'):
+            secret = self.create(alias)
+            self.assertEqual(sharding.database_for(secret.pk), alias)
+            self.assertTrue(Secret.objects.using(alias).filter(pk=secret.pk).exists())
+
+    def test_reveal_from_second_shard(self):
+        """A secret on another shard is found, decrypted and deleted there"""
+        secret = self.create('shard1')
+        response = self.client.get(secret.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(secret.get_absolute_url(), {'passphrase': 'pass'},
+                                    REMOTE_ADDR='10.3.6.1')
+        self.assertContains(response, 'sharded')
+        self.assertFalse(Secret.objects.using('shard1').filter(pk=secret.pk).exists())
+
+    def test_lookup_queries_only_its_shard(self):
+        """Looking a secret up by oid touches no other database"""
+        secret = self.create('shard1')
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(secret.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('django_secrets_secret' in q['sql']
+                             for q in queries.captured_queries))
+
+    def test_purge_covers_every_shard(self):
+        """purge_secrets deletes on every shard"""
+        self.create('default')
+        self.create('shard1')
+        call_command('purge_secrets', '--all', stdout=StringIO())
+        self.assertEqual(self.count('default'), 0)
+        self.assertEqual(self.count('shard1'), 0)
+
+    def test_admin_lists_one_shard(self):
+        """The admin lists the shard picked in its filter and finds any secret"""
+        on_default, on_shard1 = self.create('default'), self.create('shard1')
+        admin_site = AdminSite()
+        model_admin = SecretAdmin(Secret, admin_site)
+        factory = RequestFactory()
+
+        request = factory.get('/', {'shard': 'shard1'})
+        self.assertEqual(list(model_admin.get_queryset(request).values_list('pk', flat=True)),
+                         [on_shard1.pk])
+        request = factory.get('/')
+        self.assertEqual(list(model_admin.get_queryset(request).values_list('pk', flat=True)),
+                         [on_default.pk])
+        self.assertEqual(model_admin.get_object(request, str(on_shard1.pk)), on_shard1)
+        self.assertIn(ShardListFilter, model_admin.get_list_filter(request))
+
+    def test_router_migrates_secrets_on_shards_only(self):
+        """The secrets table only belongs on the configured shards"""
+        router = sharding.ShardRouter()
+        self.assertTrue(router.allow_migrate('shard1', 'django_secrets'))
+        self.assertFalse(router.allow_migrate('other', 'django_secrets'))
+        self.assertIsNone(router.allow_migrate('shard1', 'auth'))
+        self.assertFalse(router.allow_migrate('shard1', 'django_secrets', model_name='usagebucket'))
+        self.assertTrue(router.allow_migrate('default', 'django_secrets', model_name='usagebucket'))
+
+    def test_recipients_share_the_payload_shard(self):
+        """A shared payload and all its recipients land on one shard"""
+        payload = uuid.uuid4()
+        for i in range(10):
+            self.assertEqual(sharding.database_for(sharding.co_located_id(payload)),
+                             sharding.database_for(payload))
+
+    def test_shared_payload_end_to_end(self):
+        """Recipients of a shared payload are created and revealed on its shard"""
+        form = SecretCreateForm(data={'data': 'team', 'passphrase': 'pass', 'recipients': 3})
+        self.assertTrue(form.is_valid())
+        form.save()
+        alias = form.recipients[0]._state.db
+        self.assertEqual(Payload.objects.using(alias).count(), 1)
+        self.assertEqual(self.count(alias), 3)
+        for recipient in form.recipients:
+            response = self.client.post(recipient.get_absolute_url(), {'passphrase': 'pass'},
+                                        REMOTE_ADDR='10.6.1.1')
+            self.assertContains(response, 'team')
+        self.assertEqual(self.count(alias), 0)
+        self.assertFalse(Payload.objects.using(alias).exists())
+
+    @override_settings(SECRETS_USAGE_STATS=True)
+    def test_usage_stays_on_default(self):
+        """Usage buckets are not routed like secrets"""
+        usage.record(created=1)
+        usage.record(created=1)
+        self.assertEqual(UsageBucket.objects.using('default').get().created, 2)
+
+
+class PartitionWindowTests(TestCase):
+    """Test partition window arithmetic"""
+
+    def test_window_start_aligns_to_interval(self):
+        moment = datetime.datetime(2026, 10, 18, 20, 47, 13, tzinfo=datetime.timezone.utc)
+        start = partitioning.window_start(moment, datetime.timedelta(minutes=15))
+        self.assertEqual(start, moment.replace(minute=45, second=0))
+
+    def test_partition_name(self):
+        start = datetime.datetime(2026, 10, 18, 20, 45, tzinfo=datetime.timezone.utc)
+        self.assertEqual(partitioning.partition_name(start),
+                         'django_secrets_secret_p202610182045')
+
+
+@skipUnless(connection.vendor == 'postgresql' and partitioning.is_enabled(),
+            'requires PostgreSQL with SECRETS_POSTGRES_PARTITIONING')
+class PartitioningTests(TestCase):
+    """Test the partitioned table layout against a local PostgreSQL"""
+
+    def create_secret(self, created_at):
+        secret = Secret.objects.create(id=uuid.uuid4(), data='x', salt=generate_salt())
+        Secret.objects.filter(pk=secret.pk).update(
+            created_at=created_at, expires_at=created_at + datetime.timedelta(minutes=10))
+        return secret
+
+    def test_table_is_partitioned(self):
+        self.assertTrue(partitioning.is_partitioned(connection))
+
+    def test_create_partitions_is_idempotent(self):
+        partitioning.create_partitions(connection, premake=2)
+        self.assertEqual(partitioning.create_partitions(connection, premake=2), [])
+
+    def test_drop_expired_partitions(self):
+        past = timezone.now() - datetime.timedelta(hours=5)
+        created = partitioning.create_partitions(connection, now=past, premake=0)
+        old = self.create_secret(past)
+        fresh = self.create_secret(timezone.now())
+
+        dropped = partitioning.drop_expired_partitions(connection)
+
+        self.assertEqual(dropped, created)
+        self.assertFalse(Secret.objects.filter(pk=old.pk).exists())
+        self.assertTrue(Secret.objects.filter(pk=fresh.pk).exists())
+
+    @override_settings(SECRETS_QUOTA={'MAX_SECRETS': 100})
+    def test_drop_updates_quota(self):
+        past = timezone.now() - datetime.timedelta(hours=5)
+        partitioning.create_partitions(connection, now=past, premake=0)
+        self.create_secret(past)
+        self.create_secret(timezone.now())
+        self.assertEqual(quota.usage(), {'secrets': 2, 'bytes': 2})
+
+        partitioning.drop_expired_partitions(connection)
+        self.assertEqual(quota.usage(), {'secrets': 1, 'bytes': 1})
+
+    def test_available_queries_prune_partitions(self):
+        past = timezone.now() - datetime.timedelta(hours=5)
+        old_partition = partitioning.create_partitions(connection, now=past, premake=0)[0]
+        secret = self.create_secret(timezone.now())
+
+        plan = Secret.available.filter(pk=secret.pk).explain()
+        self.assertNotIn(old_partition, plan)
+
+    def test_command_reports_changes(self):
+        out = StringIO()
+        call_command('secrets_partitions', '--premake', '6', stdout=out)
+        self.assertIn('Created partition', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL')
+class UnloggedTableTests(TestCase):
+    """Test switching the secrets tables to UNLOGGED on PostgreSQL"""
+
+    def persistence(self):
+        return dict(unlogged.list_tables(connection))
+
+    def test_switch_both_ways(self):
+        """Every table and partition is switched, and switching is idempotent"""
+        changed = unlogged.set_logged(connection, False)
+        self.assertIn('django_secrets_payload', changed)
+        self.assertTrue(all(self.persistence().values()))
+        self.assertEqual(unlogged.set_logged(connection, False), [])
+
+        self.assertEqual(sorted(unlogged.set_logged(connection, True)), sorted(changed))
+        self.assertFalse(any(self.persistence().values()))
+
+    @skipUnless(partitioning.is_enabled(), 'requires SECRETS_POSTGRES_PARTITIONING')
+    @override_settings(SECRETS_POSTGRES_UNLOGGED=True)
+    def test_new_partitions_are_unlogged(self):
+        later = timezone.now() + datetime.timedelta(days=30)
+        name, = partitioning.create_partitions(connection, now=later, premake=0)
+        self.assertTrue(self.persistence()[name])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('secrets_unlogged', stdout=out)
+        self.assertIn('django_secrets_secret', out.getvalue())
+        call_command('secrets_unlogged', '--logged', stdout=out)
+        self.assertFalse(any(self.persistence().values()))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'requires SQLite')
+class SQLiteProfileTests(TestCase):
+    """Test the single-node SQLite support"""
+
+    def open_connection(self):
+        import os
+        import tempfile
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        settings_dict = dict(connection.settings_dict,
+                             NAME=os.path.join(directory, 'db.sqlite3'))
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    @override_settings(SECRETS_SQLITE_PRAGMAS={'journal_mode': 'wal', 'synchronous': 'normal'})
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.open_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+
+    @override_settings(SECRETS_SQLITE_PRAGMAS=None)
+    def test_no_pragmas_by_default(self):
+        wrapper = self.open_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+
+    def test_retry_on_locked_retries(self):
+        func = Mock(side_effect=[OperationalError('database is locked'),
+                                 OperationalError('database is locked'), 'done'])
+        self.assertEqual(sqlite.retry_on_locked(func, attempts=3, delay=0), 'done')
+        self.assertEqual(func.call_count, 3)
+
+    def test_retry_on_locked_gives_up(self):
+        func = Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(func, attempts=2, delay=0)
+        self.assertEqual(func.call_count, 2)
+
+    def test_retry_on_locked_reraises_other_errors(self):
+        func = Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(func, attempts=3, delay=0)
+        self.assertEqual(func.call_count, 1)
+
+    @override_settings(SECRETS_SQLITE_CHECKPOINT_INTERVAL=60)
+    def test_maybe_checkpoint_is_rate_limited(self):
+        sqlite._last_checkpoint.clear()
+        self.assertTrue(sqlite.maybe_checkpoint())
+        self.assertFalse(sqlite.maybe_checkpoint())
+
+
+class PrerenderTests(TestCase):
+    """Test pages rendered at build time and served by WhiteNoise"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def prerender(self):
+        out = StringIO()
+        call_command('prerender_pages', root=self.root, stdout=out)
+        return out.getvalue()
+
+    def read(self, path):
+        with open(os.path.join(self.root, path, 'index.html')) as f:
+            return f.read()
+
+    def test_pages_written(self):
+        """Every configured page is written with a gzipped copy"""
+        output = self.prerender()
+        for path in ('', 'about', 'terms'):
+            self.assertTrue(os.path.exists(os.path.join(self.root, path, 'index.html.gz')))
+        self.assertIn('/about/ ->', output)
+        self.assertIn('About Us', self.read('about'))
+
+    def test_create_form_has_no_baked_token(self):
+        """The pre-rendered form fetches its CSRF token instead"""
+        self.prerender()
+        page = self.read('')
+        self.assertIn('data-csrf-url="%s"' % reverse('secrets:csrf'), page)
+        self.assertIn('name="csrfmiddlewaretoken" value=""', page)
+
+    def test_rendered_form_still_has_token(self):
+        """The create view keeps its token when rendered per request"""
+        response = self.client.get(reverse('secrets:secret-create'))
+        self.assertNotContains(response, 'data-csrf-url')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_csrf_endpoint(self):
+        """The endpoint returns a token and sets the CSRF cookie"""
+        response = self.client.get(reverse('secrets:csrf'))
+        self.assertTrue(response.json()['token'])
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_root_required(self):
+        """Without an output directory the command refuses to run"""
+        with override_settings(SECRETS_PRERENDER_ROOT=None):
+            with self.assertRaises(CommandError):
+                call_command('prerender_pages', stdout=StringIO())
+
+    def test_served_by_whitenoise(self):
+        """Pre-rendered pages are answered before any view runs"""
+        from . import prerender
+        self.prerender()
+        with override_settings(SECRETS_PRERENDER_ROOT=self.root, WHITENOISE_ROOT=self.root,
+                               WHITENOISE_INDEX_FILE=True,
+                               WHITENOISE_ADD_HEADERS_FUNCTION=prerender.add_headers), \
+                patch.object(SecretCreateView, 'get') as view:
+            response = Client().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        view.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+
+class AdmissionControlTests(TestCase):
+    """Test shedding KDF requests under load"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = []
+
+    def view(self, request):
+        self.calls.append(request)
+        return HttpResponse('ok')
+
+    def call(self, **meta):
+        return admission.admission_control(self.view)(self.factory.post('/', **meta))
+
+    def test_disabled_by_default(self):
+        """Without SECRETS_ADMISSION every request goes through"""
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_queue_time_parsing(self):
+        """X-Request-Start in seconds, milliseconds and microseconds"""
+        now = 1700000010.0
+        for value in ('t=1700000000.0', '1700000000000', 't=1700000000000000'):
+            request = self.factory.get('/', HTTP_X_REQUEST_START=value)
+            self.assertAlmostEqual(admission.queue_time(request, now=now), 10.0)
+        self.assertIsNone(admission.queue_time(self.factory.get('/')))
+
+    @override_settings(SECRETS_ADMISSION={'MAX_QUEUE_TIME': 5, 'RETRY_AFTER': 2})
+    def test_shed_after_queueing_too_long(self):
+        """A request that queued past the budget is shed without running"""
+        start = 't=%f' % (time.time() - 30)
+        response = self.call(HTTP_X_REQUEST_START=start)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.call(HTTP_X_REQUEST_START='t=%f' % time.time()).status_code, 200)
+
+    @override_settings(SECRETS_ADMISSION={'MAX_CONCURRENCY': 1})
+    def test_shed_when_slots_are_busy(self):
+        """With every slot held, further requests are shed"""
+        with admission.process_slot(1) as admitted:
+            self.assertTrue(admitted)
+            self.assertEqual(self.call().status_code, 503)
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_node_slots_are_shared_between_holders(self):
+        """File-lock slots are exclusive across independent holders"""
+        import tempfile
+        directory = tempfile.mkdtemp()
+        with admission.node_slot(directory, 2) as first, \
+                admission.node_slot(directory, 2) as second, \
+                admission.node_slot(directory, 2) as third:
+            self.assertEqual((first, second, third), (True, True, False))
+        with admission.node_slot(directory, 2) as again:
+            self.assertTrue(again)
+
+    @override_settings(SECRETS_ADMISSION={'MAX_CONCURRENCY': 1})
+    def test_form_pages_never_shed(self):
+        """GET requests to the KDF views are not subject to admission"""
+        with admission.process_slot(1):
+            response = self.client.get(reverse('secrets:secret-create'))
+            self.assertEqual(response.status_code, 200)
+            response = self.client.post(reverse('secrets:secret-create'),
+                                        {'data': 'x', 'passphrase': 'y'}, REMOTE_ADDR='10.3.9.1')
+            self.assertEqual(response.status_code, 503)
+        self.assertFalse(Secret.objects.exists())
+
+    @override_settings(SECRETS_ADMISSION={'MAX_CONCURRENCY': 1})
+    def test_shed_counts_exposed(self):
+        """Shed and admitted requests are counted and exported"""
+        with admission.process_slot(1):
+            self.call()
+            self.call()
+        self.call()
+        self.assertEqual(metrics.get_counters()['admission_shed_concurrency'], 2)
+        self.assertEqual(metrics.get_counters()['admission_admitted'], 1)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('secrets:metrics'))
+        self.assertContains(response, 'django_secrets_admission_shed_concurrency_total 2')
+
+    def test_metrics_require_staff(self):
+        """The metrics endpoint is not public"""
+        response = self.client.get(reverse('secrets:metrics'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(SECRETS_METRICS_TOKEN='scrape-me')
+    def test_metrics_token(self):
+        """Scrapers authenticate with the bearer token instead of a session"""
+        url = reverse('secrets:metrics')
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertContains(response, 'django_secrets_admission_admitted_total')
+        for header in ('Bearer wrong', 'Basic scrape-me', ''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=header).status_code, 302)
+        with self.settings(SECRETS_METRICS_TOKEN=None):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 302)
+
+
+class SharedPayloadTests(TestCase):
+    """Test secrets with several recipients sharing one payload"""
+
+    def create(self, count=3, data='shared credential', passphrase='pass'):
+        form = SecretCreateForm(data={'data': data, 'passphrase': passphrase, 'recipients': count})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        return form.recipients
+
+    def reveal(self, secret, passphrase='pass'):
+        secret = Secret.objects.metadata().get(pk=secret.pk)
+        form = SecretUpdateForm(data={'passphrase': passphrase}, instance=secret)
+        self.assertTrue(form.is_valid(), form.errors)
+        secret.delete()
+        return secret.decrypted_data
+
+    def test_payload_encrypted_once(self):
+        """One payload, one key derivation and a small wrapped key per recipient"""
+        with patch('django_secrets.forms.derive_key', wraps=utils.derive_key) as derive:
+            recipients = self.create(count=5, data='x' * 10000)
+        self.assertEqual(derive.call_count, 1)
+        self.assertEqual(Payload.objects.count(), 1)
+        self.assertEqual(Secret.objects.count(), 5)
+        payload = Payload.objects.get()
+        self.assertGreater(payload.size, 10000)
+        self.assertEqual(len({r.pk for r in recipients}), 5)
+        for recipient in Secret.objects.all():
+            self.assertEqual(recipient.payload_id, payload.pk)
+            self.assertLess(recipient.size, 200)
+
+    def test_each_link_reveals_once(self):
+        """Every recipient reveals the data; the payload goes with the last one"""
+        first, second = self.create(count=2)
+        self.assertEqual(self.reveal(first), 'shared credential')
+        self.assertFalse(Secret.objects.filter(pk=first.pk).exists())
+        self.assertTrue(Payload.objects.exists())
+        self.assertEqual(self.reveal(second), 'shared credential')
+        self.assertFalse(Payload.objects.exists())
+
+    @override_settings(SECRETS_CIPHER='chacha20-poly1305')
+    def test_aead_engine(self):
+        recipient, = self.create(count=2)[:1]
+        self.assertTrue(recipient.data.startswith('A'))
+        self.assertEqual(self.reveal(recipient), 'shared credential')
+
+    def test_wrong_passphrase(self):
+        recipient = self.create(count=2)[0]
+        form = SecretUpdateForm(data={'passphrase': 'wrong'},
+                                instance=Secret.objects.get(pk=recipient.pk))
+        self.assertFalse(form.is_valid())
+        self.assertIn('passphrase', form.errors)
+
+    def test_missing_payload_is_gone(self):
+        """A payload purged after the recipient was loaded answers 404"""
+        recipient = Secret.objects.get(pk=self.create(count=2)[0].pk)
+        Payload.objects.all().delete()
+        with self.assertRaises(Http404):
+            SecretUpdateForm(data={'passphrase': 'pass'}, instance=recipient).is_valid()
+
+    def test_recipient_limit(self):
+        form = SecretCreateForm(data={'data': 'x', 'passphrase': 'p', 'recipients': 11})
+        self.assertFalse(form.is_valid())
+        self.assertIn('recipients', form.errors)
+        with self.settings(SECRETS_MAX_RECIPIENTS=1):
+            self.assertNotIn('recipients', SecretCreateForm().fields)
+
+    @override_settings(SECRETS_USAGE_STATS=True)
+    def test_create_view_lists_links(self):
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': 'for the team', 'passphrase': 'pass', 'recipients': 3,
+        }, REMOTE_ADDR='10.6.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'django_secrets/secret_links.html')
+        for recipient in Secret.objects.all():
+            self.assertContains(response, 'http://testserver' + recipient.get_absolute_url())
+        self.assertEqual(UsageBucket.objects.get().created, 3)
+
+    def test_purge_removes_orphaned_payloads(self):
+        self.create(count=2)
+        Secret.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        call_command('purge_secrets', '--expired', stdout=StringIO())
+        self.assertFalse(Secret.objects.exists())
+        self.assertFalse(Payload.objects.exists())
+
+
+class IdempotencyTests(TestCase):
+    """Test replaying creates that carry an idempotency key"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def post(self, key='retry-1', ip='10.7.0.1', **data):
+        data = dict({'data': 'once', 'passphrase': 'pass'}, **data)
+        return self.client.post(reverse('secrets:secret-create'), data,
+                                HTTP_IDEMPOTENCY_KEY=key, REMOTE_ADDR=ip)
+
+    def test_retry_replays_without_kdf(self):
+        """A repeated key returns the first result without deriving a key"""
+        first = self.post()
+        with patch('django_secrets.utils.derive_key') as derive:
+            second = self.post()
+        derive.assert_not_called()
+        self.assertEqual(Secret.objects.count(), 1)
+        self.assertEqual(second.status_code, 302)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+
+    def test_form_field(self):
+        """Browsers send the key as a hidden field"""
+        url = reverse('secrets:secret-create')
+        for i in range(2):
+            self.client.post(url, {'data': 'once', 'passphrase': 'pass', 'idempotency_key': 'abc'},
+                             REMOTE_ADDR='10.7.0.2')
+        self.assertEqual(Secret.objects.count(), 1)
+        self.assertContains(self.client.get(url), 'name="idempotency_key"')
+
+    def test_keys_are_per_client(self):
+        self.post(ip='10.7.0.3')
+        self.post(ip='10.7.0.4')
+        self.assertEqual(Secret.objects.count(), 2)
+
+    def test_failed_attempt_releases_key(self):
+        """An invalid submission is not stored, so the fixed one goes through"""
+        self.assertEqual(self.post(data='', ip='10.7.0.5').status_code, 200)
+        self.assertEqual(self.post(ip='10.7.0.5').status_code, 302)
+        self.assertEqual(Secret.objects.count(), 1)
+
+    def test_exception_releases_key(self):
+        with patch('django_secrets.forms.encrypt', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post(ip='10.7.0.6')
+        self.assertEqual(self.post(ip='10.7.0.6').status_code, 302)
+
+    def test_links_page_not_replayed(self):
+        """The one-time links are shown once, never to a repeat"""
+        first = self.post(ip='10.7.0.7', recipients=2)
+        second = self.post(ip='10.7.0.7', recipients=2)
+        self.assertEqual(Secret.objects.count(), 2)
+        self.assertEqual(second.status_code, 409)
+        for secret in Secret.objects.all():
+            self.assertContains(first, secret.get_absolute_url())
+            self.assertNotContains(second, secret.get_absolute_url(), status_code=409)
+        stored = idempotency.get_cache().get(idempotency.cache_key(second.wsgi_request))
+        self.assertNotIn('content', stored)
+
+    @override_settings(SECRETS_IDEMPOTENCY={'WAIT': 0})
+    def test_in_flight_duplicate_conflicts(self):
+        """A duplicate that outwaits the first request gets 409"""
+        request = RequestFactory().post('/', HTTP_IDEMPOTENCY_KEY='retry-1', REMOTE_ADDR='10.7.0.8')
+        idempotency.get_cache().set(idempotency.cache_key(request), idempotency.IN_FLIGHT)
+        response = self.post(ip='10.7.0.8')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Secret.objects.exists())
+
+    def test_in_flight_duplicate_waits(self):
+        """A duplicate waits for the first request and replays its result"""
+        request = RequestFactory().post('/', HTTP_IDEMPOTENCY_KEY='retry-1', REMOTE_ADDR='10.7.0.9')
+        key = idempotency.cache_key(request)
+        cache = idempotency.get_cache()
+        cache.set(key, idempotency.IN_FLIGHT)
+        finished = idempotency.store(idempotency.mark(HttpResponse(status=302, headers={'Location': '/x/'})))
+        with patch('time.sleep', side_effect=lambda delay: cache.set(key, finished)) as sleep:
+            response = self.post(ip='10.7.0.9')
+        sleep.assert_called_once()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/x/')
+        self.assertFalse(Secret.objects.exists())
+
+    @override_settings(SECRETS_IDEMPOTENCY=None)
+    def test_disabled(self):
+        self.post(ip='10.7.0.10')
+        self.post(ip='10.7.0.10')
+        self.assertEqual(Secret.objects.count(), 2)
+
+
+class RequestSizeLimitTests(TestCase):
+    """Test refusing oversized bodies before they are read"""
+
+    def handle(self, path, size, **extra):
+        """Run the middleware on a POST declaring size bytes, none of them read"""
+        import tracemalloc
+        from .middleware import RequestSizeLimitMiddleware
+
+        class Body(object):
+            """A body of any size, produced only as far as it is read"""
+            read_bytes = 0
+
+            def read(self, size=-1):
+                size = 64 * 1024 if size is None or size < 0 else size
+                self.read_bytes += size
+                return b'x' * size
+
+            readline = read
+
+        body = Body()
+        request = RequestFactory().post(path, data=b'', content_type='application/x-www-form-urlencoded',
+                                        CONTENT_LENGTH=str(size), **{'wsgi.input': body}, **extra)
+        passed = []
+        middleware = RequestSizeLimitMiddleware(lambda request: passed.append(request) or HttpResponse())
+        tracemalloc.start()
+        try:
+            response = middleware(request)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return response, bool(passed), peak, body.read_bytes
+
+    def test_oversized_create_refused_unread(self):
+        """A huge create is answered 413 without reading or buffering its body"""
+        for size in (1024 * 1024, 1024 ** 3):
+            response, passed, peak, read = self.handle(reverse('secrets:secret-create'), size)
+            self.assertEqual(response.status_code, 413)
+            self.assertFalse(passed)
+            self.assertLess(peak, 64 * 1024)
+            self.assertEqual(read, 0)
+
+    def test_limits_are_per_route(self):
+        url = reverse('secrets:secret-update', kwargs={'oid': encode_id(uuid.uuid4())})
+        self.assertEqual(self.handle(url, 100 * 1024)[0].status_code, 413)
+        self.assertTrue(self.handle(reverse('secrets:secret-create'), 100 * 1024)[1])
+        self.assertTrue(self.handle(url, 1024)[1])
+
+    def test_other_routes_untouched(self):
+        self.assertTrue(self.handle(reverse('secrets:csrf'), 10 * 1024 * 1024)[1])
+        self.assertTrue(self.handle('/no/such/page/', 10 * 1024 * 1024)[1])
+        with self.settings(SECRETS_REQUEST_SIZE_LIMITS={}):
+            self.assertTrue(self.handle(reverse('secrets:secret-create'), 10 * 1024 * 1024)[1])
+
+    def test_large_post_through_the_stack(self):
+        """A multi-megabyte create never reaches the form or the database"""
+        with patch('django_secrets.forms.SecretCreateForm.clean_data') as clean_data:
+            response = self.client.post(reverse('secrets:secret-create'), {
+                'data': 'x' * (4 * 1024 * 1024), 'passphrase': 'pass'}, REMOTE_ADDR='10.8.0.1')
+        self.assertEqual(response.status_code, 413)
+        clean_data.assert_not_called()
+        self.assertFalse(Secret.objects.exists())
+
+    def test_largest_valid_secret_fits(self):
+        """50 KB of multi-byte text, percent-encoded, is under the create limit"""
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': '\u20ac' * (50 * 1024 // 3), 'passphrase': 'pass'}, REMOTE_ADDR='10.8.0.2')
+        self.assertEqual(response.status_code, 302)
+
+
+class WarmupTests(TestCase):
+    """Test warming up a freshly loaded application"""
+    databases = {'default', 'shard1'}
+
+    def test_runs_every_step(self):
+        timings = warmup.warm_up()
+        self.assertEqual(set(timings), {name for name, step in warmup.STEPS})
+
+    def test_renders_the_prerenderable_pages(self):
+        with patch('django_secrets.prerender.render_page', wraps=prerender.render_page) as render:
+            warmup.warm_up()
+        self.assertIn(call('secrets:secret-create'), render.call_args_list)
+
+    def test_failing_step_is_skipped(self):
+        """A failing step is logged and the rest still runs"""
+        with patch('django_secrets.prerender.render_page', side_effect=ValueError):
+            with self.assertLogs('django_secrets.warmup', 'WARNING'):
+                timings = warmup.warm_up()
+        self.assertNotIn('pages', timings)
+        self.assertIn('database', timings)
+
+    def test_leaves_connections_as_found(self):
+        """Connections opened by any step are closed again, open ones kept"""
+        closed = Mock(alias='closed', connection=None)
+        opened = Mock(alias='opened', connection=object())
+
+        def render_page(name):
+            # Like a page whose form queries the database
+            closed.connection = object()
+
+        with patch('django_secrets.warmup.connections', Mock(all=lambda: [closed, opened])), \
+                patch('django_secrets.prerender.render_page', side_effect=render_page):
+            warmup.warm_up()
+        closed.close.assert_called_once()
+        opened.close.assert_not_called()
+
+    def test_connect_survives_a_database_outage(self):
+        down = Mock(alias='default', **{'ensure_connection.side_effect': OperationalError})
+        with patch('django_secrets.warmup.connections', Mock(all=lambda: [down])):
+            with self.assertLogs('django_secrets.warmup', 'WARNING'):
+                warmup.connect()
+
+    @override_settings(SECRETS_WARMUP=False)
+    def test_disabled(self):
+        self.assertEqual(warmup.warm_up(), {})
+
+
+@skipUnless(jinja2, 'requires Jinja2')
+class JinjaTemplateTests(TestCase):
+    """Test the public pages rendered by the Jinja2 engine"""
+
+    def setUp(self):
+        engines = [settings.JINJA2_TEMPLATES,
+                   *(e for e in settings.TEMPLATES if e != settings.JINJA2_TEMPLATES)]
+        override = override_settings(TEMPLATES=engines)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def render(self, using, name, context):
+        from django.template import engines
+        import re
+        html = engines[using].get_template(name).render(context, RequestFactory().get('/'))
+        html = re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', html)
+        return re.sub(r'\s+', ' ', re.sub(r'\s*(<|>)\s*', r'\1', html)).strip()
+
+    def test_form_markup_matches_crispy(self):
+        """The macros produce the markup crispy's foundation pack does"""
+        for data in (None, {'data': '', 'passphrase': '', 'ttl': '3', 'recipients': '0'}):
+            form = SecretCreateForm(data=data)
+            if data:
+                form.is_valid()
+                form.add_error(None, 'Not now')
+            self.assertEqual(
+                self.render('jinja2', 'django_secrets/secret_create.html', {'form': form}),
+                self.render('django', 'django_secrets/secret_create.html', {'form': form}))
+
+    def test_create_and_reveal(self):
+        """The Django templates are not rendered along the way"""
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': 'Rendered by Jinja2', 'passphrase': 'jinja', 'ttl': 10})
+        self.assertTemplateNotUsed(response, 'django_secrets/secret_create.html')
+        response = self.client.get(response.url)
+        path = reverse('secrets:secret-update', args=[Secret.objects.get().oid])
+        self.assertContains(response, path)
+        self.assertTemplateNotUsed(response, 'django_secrets/secret_share.html')
+        response = self.client.get(path)
+        self.assertContains(response, 'name="passphrase"')
+        self.assertTemplateNotUsed(response, 'django_secrets/secret_update.html')
+        response = self.client.post(path, {'passphrase': 'jinja'})
+        self.assertContains(response, 'Rendered by Jinja2')
+        self.assertTemplateNotUsed(response, 'django_secrets/secret_detail.html')
+
+    def test_escapes_secret(self):
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': '<script>alert(1)</script>', 'passphrase': 'jinja', 'ttl': 10})
+        path = reverse('secrets:secret-update', args=[Secret.objects.get().oid])
+        response = self.client.post(path, {'passphrase': 'jinja'})
+        self.assertContains(response, '&lt;script&gt;alert(1)&lt;/script&gt;')
+        self.assertNotContains(response, '<script>alert(1)')
+
+    def test_admin_keeps_django_templates(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('admin:django_secrets_secret_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin/change_list.html')
+
+    def test_pages_without_jinja_template(self):
+        """Pages that only exist as Django templates still render"""
+        response = self.client.get(reverse('about'))
+        self.assertContains(response, 'About Us')
+
+
+class HeavyHitterTests(TestCase):
+    """Test the fixed-memory per-client counts"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        heavy_hitters.reset()
+        self.addCleanup(heavy_hitters.reset)
+
+    def test_sketch_never_undercounts(self):
+        sketch = heavy_hitters.CountMinSketch(256, 4)
+        counts = {('key-%d' % i).encode(): i % 7 + 1 for i in range(2000)}
+        for key, count in counts.items():
+            sketch.add(sketch.indexes(key), count)
+        total = sum(counts.values())
+        for key, count in counts.items():
+            estimate = sketch.estimate(sketch.indexes(key))
+            self.assertGreaterEqual(estimate, count)
+        # e / width of the total, with room for the odd unlucky key
+        errors = sorted(sketch.estimate(sketch.indexes(key)) - count
+                        for key, count in counts.items())
+        self.assertLess(errors[len(errors) * 9 // 10], total * 2.72 / 256)
+
+    def test_memory_does_not_grow_with_clients(self):
+        tracker = heavy_hitters.Tracker(width=512, depth=4, top=5)
+        rows = [id(row) for row in tracker.current.rows]
+        for _ in range(300):
+            tracker.record('requests', '203.0.113.7')
+        for i in range(20000):
+            tracker.record('requests', '10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255))
+        self.assertEqual([id(row) for row in tracker.current.rows], rows)
+        self.assertEqual({len(row) for row in tracker.current.rows}, {512})
+        self.assertEqual(len(tracker.top['requests', 'ip'].counts), 5)
+        self.assertEqual(tracker.heaviest('requests', 'ip')[0][0], '203.0.113.7')
+        prefixes = dict(tracker.heaviest('requests', 'prefix'))
+        self.assertEqual(len(prefixes), 5)
+        self.assertGreaterEqual(prefixes['203.0.113.0/24'], 300)
+
+    def test_prefixes(self):
+        self.assertEqual(heavy_hitters.network('192.0.2.77'),
+                         {'ip': '192.0.2.77', 'prefix': '192.0.2.0/24'})
+        self.assertEqual(heavy_hitters.network('2001:db8:1:2:3::4'),
+                         {'ip': '2001:db8:1:2:3::4', 'prefix': '2001:db8:1:2::/64'})
+        self.assertIsNone(heavy_hitters.network('not an address'))
+        self.assertIsNone(heavy_hitters.network(None))
+
+    def test_sliding_window(self):
+        tracker = heavy_hitters.Tracker(window=60)
+        start = tracker.started
+        for _ in range(10):
+            tracker.record('failures', '192.0.2.1', now=start + 1)
+        self.assertEqual(tracker.estimates('failures', '192.0.2.1', now=start + 59)['ip'], 10)
+        # Half of the previous window still overlaps
+        self.assertEqual(tracker.estimates('failures', '192.0.2.1', now=start + 90)['ip'], 5)
+        self.assertEqual(tracker.heaviest('failures', 'ip', now=start + 90), [('192.0.2.1', 5)])
+        self.assertEqual(tracker.estimates('failures', '192.0.2.1', now=start + 180)['ip'], 0)
+
+    def post(self, address, **data):
+        data = dict({'data': 'hitters', 'passphrase': 'pass', 'ttl': 10}, **data)
+        return self.client.post(reverse('secrets:secret-create'), data, REMOTE_ADDR=address)
+
+    @override_settings(SECRETS_HEAVY_HITTERS={'REQUESTS_PER_IP': 2, 'WINDOW': 600})
+    def test_blocks_busy_ip(self):
+        self.assertEqual(self.post('192.0.2.10').status_code, 302)
+        self.assertEqual(self.post('192.0.2.10').status_code, 302)
+        response = self.post('192.0.2.10')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '600')
+        self.assertEqual(Secret.objects.count(), 2)
+        self.assertEqual(metrics.get_counters()['heavy_hitters_blocked'], 1)
+        self.assertEqual(self.post('192.0.2.11').status_code, 302)
+
+    @override_settings(SECRETS_HEAVY_HITTERS={'REQUESTS_PER_IP': 1})
+    def test_blocks_before_idempotency(self):
+        """A blocked client never reaches the idempotency cache"""
+        self.assertEqual(self.post('192.0.2.12').status_code, 302)
+        with patch('django_secrets.idempotency.get_cache') as get_cache:
+            response = self.client.post(reverse('secrets:secret-create'), {
+                'data': 'hh', 'passphrase': 'pass'}, REMOTE_ADDR='192.0.2.12',
+                HTTP_IDEMPOTENCY_KEY='retry')
+        self.assertEqual(response.status_code, 429)
+        get_cache.assert_not_called()
+
+    @override_settings(SECRETS_HEAVY_HITTERS={'REQUESTS_PER_PREFIX': 2})
+    def test_blocks_busy_prefix(self):
+        self.assertEqual(self.post('198.51.100.1').status_code, 302)
+        self.assertEqual(self.post('198.51.100.2').status_code, 302)
+        self.assertEqual(self.post('198.51.100.3').status_code, 429)
+        self.assertEqual(self.post('198.51.101.3').status_code, 302)
+
+    @override_settings(SECRETS_HEAVY_HITTERS={'FAILURES_PER_IP': 1})
+    def test_blocks_passphrase_guessing(self):
+        self.post('192.0.2.20')
+        path = reverse('secrets:secret-update', args=[Secret.objects.get().oid])
+        for _ in range(2):
+            response = self.client.post(path, {'passphrase': 'wrong'}, REMOTE_ADDR='192.0.2.21')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(path, {'passphrase': 'pass'}, REMOTE_ADDR='192.0.2.21')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(Secret.objects.exists())
+        response = self.client.post(path, {'passphrase': 'pass'}, REMOTE_ADDR='192.0.2.22')
+        self.assertContains(response, 'hitters')
+
+    @override_settings(SECRETS_HEAVY_HITTERS={})
+    def test_disabled(self):
+        for _ in range(3):
+            self.assertEqual(self.post('192.0.2.30').status_code, 302)
+        self.assertIsNone(heavy_hitters._tracker)
+
+    @override_settings(SECRETS_HEAVY_HITTERS={'TOP': 3})
+    def test_dashboard(self):
+        self.post('192.0.2.40')
+        admin_user = User.objects.create_superuser('hitters', 'hitters@example.com', 'pass')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:django_secrets_usagebucket_changelist'))
+        self.assertContains(response, 'id="top-offenders"')
+        self.assertContains(response, '192.0.2.40 (1)')
+        self.assertContains(response, '192.0.2.0/24 (1)')
+
+
+@override_settings(SECRETS_QUOTA={'MAX_SECRETS': 5, 'MAX_BYTES': 100 * 1024, 'SLOTS': 4})
+class QuotaTests(TestCase):
+    """Test the storage quota and its incrementally kept counters"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def post(self, address='192.0.2.50', **data):
+        data = dict({'data': 'quota', 'passphrase': 'pass', 'ttl': 10}, **data)
+        return self.client.post(reverse('secrets:secret-create'), data, REMOTE_ADDR=address)
+
+    def stored(self):
+        return {'secrets': Secret.objects.count(),
+                'bytes': sum(Secret.objects.values_list('size', flat=True))
+                + sum(Payload.objects.values_list('size', flat=True))}
+
+    def test_counters_follow_creates_and_reveals(self):
+        self.post()
+        self.post(data='shared', recipients=3)
+        self.assertEqual(quota.usage(), self.stored())
+        self.assertEqual(quota.usage()['secrets'], 4)
+
+        for secret in Secret.objects.all():
+            self.client.post(secret.get_absolute_url(), {'passphrase': 'pass'},
+                             REMOTE_ADDR='192.0.2.51')
+        self.assertEqual(quota.usage(), {'secrets': 0, 'bytes': 0})
+        self.assertFalse(Payload.objects.exists())
+
+    def test_counters_follow_purges(self):
+        self.post()
+        self.post(data='shared', recipients=2)
+        Secret.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        call_command('purge_secrets', '--expired', stdout=StringIO())
+        self.assertEqual(quota.usage(), {'secrets': 0, 'bytes': 0})
+
+    def test_counters_spread_over_slots(self):
+        for _ in range(50):
+            quota.add(secrets=1, size=10)
+        self.assertLessEqual(StorageCounter.objects.count(), 4)
+        self.assertEqual(quota.usage(), {'secrets': 50, 'bytes': 500})
+
+    def test_failing_counter_update_is_logged(self):
+        """A locked database while counting never fails the create or the reveal"""
+        locked = OperationalError('database is locked')
+        with patch('django_secrets.quota.update', side_effect=locked):
+            with self.assertLogs('django_secrets.quota', 'WARNING'):
+                self.assertEqual(self.post(data='shared', recipients=2).status_code, 200)
+            secret = Secret.objects.first()
+            with self.assertLogs('django_secrets.quota', 'WARNING'):
+                response = self.client.post(secret.get_absolute_url(), {'passphrase': 'pass'},
+                                            REMOTE_ADDR='192.0.2.51')
+        self.assertContains(response, 'shared')
+        self.assertFalse(Secret.objects.filter(pk=secret.pk).exists())
+        self.assertEqual(quota.recount(), self.stored())
+
+    def test_refuses_creates_when_full(self):
+        for i in range(5):
+            self.assertEqual(self.post('192.0.2.%d' % (60 + i)).status_code, 302)
+        response = self.post('192.0.2.70')
+        self.assertContains(response, 'storing as many secrets as we can')
+        self.assertEqual(Secret.objects.count(), 5)
+        self.assertEqual(metrics.get_counters()['quota_refused'], 1)
+
+        # Revealing one makes room again
+        secret = Secret.objects.first()
+        self.client.post(secret.get_absolute_url(), {'passphrase': 'pass'}, REMOTE_ADDR='192.0.2.71')
+        self.assertEqual(self.post('192.0.2.72').status_code, 302)
+
+    def test_refuses_too_many_bytes(self):
+        with override_settings(SECRETS_QUOTA={'MAX_BYTES': 1000}):
+            response = self.post(data='x' * 2000)
+        self.assertContains(response, 'storing as many secrets as we can')
+        self.assertFalse(Secret.objects.exists())
+
+    def test_checks_the_stored_size(self):
+        """Room is checked for the ciphertexts save() stores, not the plaintext"""
+        for recipients in (1, 3):
+            form = SecretCreateForm(data={'data': 'caf\u00e9' * 100, 'passphrase': 'pass',
+                                          'ttl': 10, 'recipients': recipients})
+            self.assertTrue(form.is_valid())
+            form.save()
+            self.assertEqual(form.stored_size(recipients), self.stored()['bytes'])
+            # Exactly that much room left fits, a byte less doesn't
+            with override_settings(SECRETS_QUOTA={'MAX_BYTES': 2 * self.stored()['bytes']}):
+                self.assertTrue(SecretCreateForm(data=form.data).is_valid())
+            with override_settings(SECRETS_QUOTA={'MAX_BYTES': 2 * self.stored()['bytes'] - 1}):
+                self.assertFalse(SecretCreateForm(data=form.data).is_valid())
+            Secret.objects.all().delete()
+            Payload.objects.all().delete()
+            StorageCounter.objects.all().delete()
+
+    @override_settings(SECRETS_QUOTA={'MAX_SECRETS': 10, 'NEAR': 0.5, 'NEAR_MAX_TTL': 5})
+    def test_shorter_lifetimes_when_near(self):
+        self.assertEqual(max(value for value, label in SecretCreateForm().fields['ttl'].choices), 10)
+        quota.add(secrets=5)
+        form = SecretCreateForm()
+        self.assertEqual(max(value for value, label in form.fields['ttl'].choices), 5)
+        self.assertEqual(form.fields['ttl'].initial, 5)
+        self.assertIn('nearly full', str(form.fields['ttl'].help_text))
+
+        # Longer lifetimes picked on a page rendered earlier are shortened
+        self.assertEqual(self.post(ttl=10).status_code, 302)
+        self.post('192.0.2.51', ttl='')
+        for secret in Secret.objects.all():
+            self.assertLessEqual(secret.expires_at, timezone.now() + datetime.timedelta(minutes=5))
+
+    @override_settings(SECRETS_QUOTA={'MAX_SECRETS': 10, 'NEAR': 0.5, 'NEAR_MAX_TTL': 5})
+    def test_prerendered_page_leaves_quota_out(self):
+        """A page written to a file offers every lifetime; the POST checks"""
+        quota.add(secrets=5)
+        self.assertContains(self.client.get(reverse('secrets:secret-create')), 'nearly full')
+        path, content = prerender.render_page('secrets:secret-create')
+        self.assertNotIn(b'nearly full', content)
+        self.assertIn(b'<option value="10"', content)
+
+    @override_settings(SECRETS_PROOF_OF_WORK={'DIFFICULTY': 6})
+    def test_checked_after_proof_of_work(self):
+        """Forms without a solved challenge never query the counters"""
+        form = SecretCreateForm(data={'data': 'quota', 'passphrase': 'pass', 'ttl': 10,
+                                      'pow_challenge': 'bogus', 'pow_solution': '0'})
+        with patch('django_secrets.quota.usage') as counters:
+            self.assertFalse(form.is_valid())
+        counters.assert_not_called()
+
+    def test_metrics(self):
+        self.post()
+        admin_user = User.objects.create_superuser('quota', 'quota@example.com', 'pass')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('secrets:metrics'))
+        self.assertContains(response, 'django_secrets_stored_secrets 1\n')
+        self.assertContains(response, 'django_secrets_quota_secrets 5\n')
+        self.assertContains(response, 'django_secrets_quota_bytes 102400\n')
+
+    def test_recount(self):
+        self.post()
+        self.post(data='shared', recipients=2)
+        StorageCounter.objects.all().delete()
+        out = StringIO()
+        call_command('secrets_quota', '--recount', stdout=out)
+        self.assertEqual(quota.usage(), self.stored())
+        self.assertIn('Secrets: 3 of 5', out.getvalue())
+
+    @override_settings(SECRETS_QUOTA=None)
+    def test_disabled(self):
+        self.post()
+        self.assertFalse(StorageCounter.objects.exists())
+        self.assertEqual(SecretCreateForm().max_ttl, None)
+        with self.assertRaises(CommandError):
+            call_command('secrets_quota', stdout=StringIO())
+
+
+@override_settings(SECRETS_USAGE_STATS=True)
+class UsageStatsTests(TestCase):
+    """Test the per-minute usage counters and their dashboard"""
+
+    def create(self, data='usage', passphrase='pass', ip='10.5.0.1'):
+        self.client.post(reverse('secrets:secret-create'), {
+            'data': data, 'passphrase': passphrase}, REMOTE_ADDR=ip)
+        return Secret.objects.latest('created_at')
+
+    def bucket(self):
+        return UsageBucket.objects.get(minute=usage.bucket_for())
+
+    def test_record_adds_to_current_minute(self):
+        """Counts land in one bucket per minute, updated in place"""
+        usage.record(created=1, bytes_stored=100)
+        usage.record(created=1, bytes_stored=50, revealed=0)
+        bucket = self.bucket()
+        self.assertEqual((bucket.created, bucket.bytes_stored, bucket.revealed), (2, 150, 0))
+        self.assertEqual(UsageBucket.objects.count(), 1)
+
+    def test_record_single_update_once_bucket_exists(self):
+        usage.record(created=1)
+        with CaptureQueriesContext(connection) as queries:
+            usage.record(created=1)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertTrue(queries.captured_queries[0]['sql'].startswith('UPDATE'))
+
+    def test_record_rejects_unknown_counter(self):
+        with self.assertRaises(ValueError):
+            usage.record(viewed=1)
+
+    @override_settings(SECRETS_USAGE_STATS=False)
+    def test_disabled(self):
+        usage.record(created=1)
+        self.assertFalse(UsageBucket.objects.exists())
+
+    def test_off_by_default(self):
+        with self.settings():
+            del settings.SECRETS_USAGE_STATS
+            self.create(ip='10.5.0.5')
+        self.assertFalse(UsageBucket.objects.exists())
+
+    def test_failing_record_still_reveals(self):
+        """A locked database while counting is logged, the secret still shown"""
+        secret = self.create(ip='10.5.0.4')
+        with patch('django_secrets.usage.add', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('django_secrets.usage', 'WARNING'):
+                response = self.client.post(
+                    secret.get_absolute_url(), {'passphrase': 'pass'}, REMOTE_ADDR='10.5.0.4')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'usage')
+        self.assertFalse(Secret.objects.filter(pk=secret.pk).exists())
+
+    def test_views_record_usage(self):
+        """Creating, failing to reveal, revealing and expiring are counted"""
+        secret = self.create(ip='10.5.0.2')
+        url = secret.get_absolute_url()
+        self.client.post(url, {'passphrase': 'wrong'}, REMOTE_ADDR='10.5.0.2')
+        self.client.post(url, {'passphrase': 'pass'}, REMOTE_ADDR='10.5.0.2')
+
+        # Expires between the lookup and the expiry check
+        expired = self.create(ip='10.5.0.3')
+        with patch.object(Secret, 'is_expired', new_callable=PropertyMock, return_value=True):
+            self.client.post(expired.get_absolute_url(), {'passphrase': 'pass'}, REMOTE_ADDR='10.5.0.3')
+
+        bucket = self.bucket()
+        self.assertEqual(bucket.created, 2)
+        self.assertEqual(bucket.bytes_stored, secret.size + expired.size)
+        self.assertEqual(bucket.failed_attempts, 1)
+        self.assertEqual(bucket.revealed, 1)
+        self.assertEqual(bucket.expired, 1)
+
+    def test_purge_counts_expired_and_prunes(self):
+        """purge_secrets --expired counts its deletions and drops old buckets"""
+        old = usage.bucket_for() - usage.get_retention() - datetime.timedelta(minutes=1)
+        UsageBucket.objects.create(minute=old, created=3)
+        Secret.objects.create(
+            id=uuid.uuid4(), data='x', salt=generate_salt(),
+            expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        call_command('purge_secrets', '--expired', stdout=StringIO())
+        self.assertEqual(self.bucket().expired, 1)
+        self.assertFalse(UsageBucket.objects.filter(minute=old).exists())
+
+    def test_totals(self):
+        now = usage.bucket_for()
+        UsageBucket.objects.create(minute=now, created=4, revealed=1, bytes_stored=400)
+        UsageBucket.objects.create(minute=now - datetime.timedelta(hours=2), created=6)
+        self.assertEqual(usage.totals(now - datetime.timedelta(hours=1))['created'], 4)
+        self.assertEqual(usage.totals(now - datetime.timedelta(days=1))['created'], 10)
+        self.assertEqual(usage.totals(now + datetime.timedelta(minutes=1))['created'], 0)
+
+    def test_dashboard(self):
+        """The admin shows totals per window without touching the secrets table"""
+        UsageBucket.objects.create(
+            minute=usage.bucket_for(), created=4, revealed=3, bytes_stored=4096)
+        admin_user = User.objects.create_superuser('usage', 'usage@example.com', 'pass')
+        self.client.force_login(admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:django_secrets_usagebucket_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="usage-summary"')
+        self.assertContains(response, '75%')
+        self.assertContains(response, '1.0\xa0KB')
+        self.assertFalse(any('django_secrets_secret' in q['sql'] for q in queries.captured_queries))
+
+
+@override_settings(SECRETS_PROOF_OF_WORK={'DIFFICULTY': 6, 'MAX_DIFFICULTY': 10, 'TARGET_RATE': 4})
+class ProofOfWorkTests(TestCase):
+    """Test the hashcash challenge on secret creation"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def solve(self, challenge, difficulty):
+        import hashlib
+        counter = 0
+        while True:
+            digest = hashlib.sha256(('%s:%d' % (challenge, counter)).encode()).digest()
+            if proof_of_work.leading_zero_bits(digest) >= difficulty:
+                return str(counter)
+            counter += 1
+
+    def solved(self):
+        challenge, difficulty = proof_of_work.issue()
+        return challenge, self.solve(challenge, difficulty)
+
+    def test_leading_zero_bits(self):
+        self.assertEqual(proof_of_work.leading_zero_bits(b'\x00\x00\x80'), 16)
+        self.assertEqual(proof_of_work.leading_zero_bits(b'\x0f'), 4)
+        self.assertEqual(proof_of_work.leading_zero_bits(b'\x00'), 8)
+
+    def test_solution_accepted_once(self):
+        """A solved challenge is accepted, then refused when replayed"""
+        challenge, solution = self.solved()
+        proof_of_work.verify(challenge, solution)
+        with self.assertRaises(proof_of_work.InvalidSolution):
+            proof_of_work.verify(challenge, solution)
+
+    def test_wrong_or_forged_challenge_rejected(self):
+        """Unsolved, tampered and expired challenges are refused"""
+        import hashlib
+        challenge, solution = self.solved()
+        # The first counter whose hash falls short of the difficulty
+        wrong = next(str(n) for n in range(100) if proof_of_work.leading_zero_bits(
+            hashlib.sha256(('%s:%d' % (challenge, n)).encode()).digest()) < 6)
+        forged = challenge.replace('.6:', '.0:')
+        for bad in ((challenge, wrong), (forged, '0'), ('garbage', '0')):
+            with self.assertRaises(proof_of_work.InvalidSolution):
+                proof_of_work.verify(*bad)
+        with patch('time.time', return_value=time.time() + 3600):
+            with self.assertRaises(proof_of_work.InvalidSolution):
+                proof_of_work.verify(challenge, solution)
+
+    def test_difficulty_follows_load(self):
+        """Every doubling over the target rate adds a bit, up to the cap"""
+        self.assertEqual(proof_of_work.current_difficulty(solved=4), 6)
+        self.assertEqual(proof_of_work.current_difficulty(solved=8), 7)
+        self.assertEqual(proof_of_work.current_difficulty(solved=30), 9)
+        self.assertEqual(proof_of_work.current_difficulty(solved=10000), 10)
+
+    def test_only_solved_challenges_raise_difficulty(self):
+        """Fetching challenges is free, so it doesn't count as load"""
+        for _ in range(20):
+            self.client.get(reverse('secrets:challenge'))
+        self.assertEqual(proof_of_work.current_difficulty(), 6)
+        for _ in range(8):
+            proof_of_work.verify(*self.solved())
+        self.assertEqual(proof_of_work.current_difficulty(), 7)
+
+    def test_challenge_endpoint(self):
+        """The endpoint hands out fresh challenges"""
+        first = self.client.get(reverse('secrets:challenge')).json()
+        second = self.client.get(reverse('secrets:challenge')).json()
+        self.assertNotEqual(first['challenge'], second['challenge'])
+        self.assertEqual(first['difficulty'], 6)
+
+    def test_create_requires_solution(self):
+        """Without a valid solution no key is derived and nothing is stored"""
+        with patch('django_secrets.forms.encrypt') as encrypt:
+            response = self.client.post(reverse('secrets:secret-create'), {
+                'data': 'paid for', 'passphrase': 'pass',
+                'pow_challenge': proof_of_work.issue()[0], 'pow_solution': 'x',
+            }, REMOTE_ADDR='10.4.0.1')
+        encrypt.assert_not_called()
+        self.assertContains(response, 'anti-abuse check')
+        self.assertFalse(Secret.objects.exists())
+
+    def test_create_with_solution(self):
+        """A solved challenge lets the secret be created"""
+        challenge, solution = self.solved()
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': 'paid for', 'passphrase': 'pass',
+            'pow_challenge': challenge, 'pow_solution': solution,
+        }, REMOTE_ADDR='10.4.0.2')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Secret.objects.count(), 1)
+
+    def test_form_links_challenge_endpoint(self):
+        """The create page tells the browser where to fetch its challenge"""
+        response = self.client.get(reverse('secrets:secret-create'))
+        self.assertContains(response, 'data-challenge-url="%s"' % reverse('secrets:challenge'))
+
+    @override_settings(SECRETS_PROOF_OF_WORK=None)
+    def test_disabled_by_default(self):
+        """Without the setting the form has no challenge fields"""
+        self.assertNotIn('pow_challenge', SecretCreateForm().fields)
+        self.assertEqual(self.client.get(reverse('secrets:challenge')).status_code, 404)
+
 
 class IntegrationTests(TestCase):
     """Integration tests for complete workflows"""
@@ -732,6 +2667,31 @@ class IntegrationTests(TestCase):
         # Step 3: Verify secret was deleted
         self.assertEqual(Secret.objects.filter(pk=secret.pk).count(), 0)
 
+    def test_create_redirects_to_share_page(self):
+        """The creator gets the share link without another lookup of the secret"""
+        response = self.client.post(reverse('secrets:secret-create'), {
+            'data': 'secret', 'passphrase': 'pass'
+        }, REMOTE_ADDR='192.0.2.8')
+        secret = Secret.objects.get()
+        self.assertRedirects(response, reverse('secrets:secret-share', kwargs={'oid': secret.oid}))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response['Location'])
+        self.assertEqual(queries.captured_queries, [])
+        self.assertContains(response, 'value="http://testserver%s"' % secret.get_absolute_url())
+        self.assertNotContains(response, 'name="passphrase"')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_share_page_rejects_malformed_oid(self):
+        self.assertEqual(self.client.get('/not-an-oid/share/').status_code, 404)
+
+    def test_create_view_records_creator_ip(self):
+        """Test that the creator's address is stored with the secret"""
+        self.client.post(reverse('secrets:secret-create'), {
+            'data': 'secret', 'passphrase': 'pass'
+        }, REMOTE_ADDR='192.0.2.7')
+        self.assertEqual(Secret.objects.get().creator_ip, '192.0.2.7')
+
     def test_get_request_to_create_view(self):
         """Test GET request to create view shows form"""
         response = self.client.get(reverse('secrets:secret-create'))
@@ -782,9 +2742,8 @@ class IntegrationTests(TestCase):
 
     def test_invalid_oid_returns_404(self):
         """Test that invalid OID in URL returns 404"""
-        response = self.client.get(
-            reverse('secrets:secret-update', kwargs={'oid': 'invalid-oid'})
-        )
+        # Malformed oids no longer match the URL pattern at all
+        response = self.client.get('/invalid-oid/')
         self.assertEqual(response.status_code, 404)
 
     def test_secret_not_viewable_after_deletion(self):
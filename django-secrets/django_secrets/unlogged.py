@@ -0,0 +1,52 @@
+"""
+Optional UNLOGGED storage for the secrets tables on PostgreSQL.
+
+Secrets live for minutes and are deleted once read, yet every insert and
+delete of a logged table is written to the WAL, fsynced at commit and
+shipped to replicas. With SECRETS_POSTGRES_UNLOGGED = True the secrets
+and payload tables (and every partition of the secrets table) skip the
+WAL instead. The price:
+
+- after a crash (not a clean shutdown) PostgreSQL truncates them, so
+  every live secret is lost;
+- they are not replicated, so standbys see them empty and a failover
+  loses every live secret too.
+
+Only tables, never their partitioned parent, carry the setting, so new
+partitions are created UNLOGGED as well.
+"""
+from django.conf import settings
+
+TABLES = ('django_secrets_secret', 'django_secrets_payload')
+
+
+def is_enabled():
+    return getattr(settings, 'SECRETS_POSTGRES_UNLOGGED', False)
+
+
+def create_table_sql():
+    """CREATE TABLE, or CREATE UNLOGGED TABLE when enabled"""
+    return 'CREATE UNLOGGED TABLE' if is_enabled() else 'CREATE TABLE'
+
+
+def list_tables(connection):
+    """Return (name, unlogged) for the secrets tables and their partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.relpersistence = 'u' FROM pg_class c "
+            "WHERE c.relkind = 'r' AND (c.oid = ANY(%s::regclass[]) OR c.oid IN ("
+            "SELECT inhrelid FROM pg_inherits WHERE inhparent = ANY(%s::regclass[]))) "
+            "ORDER BY c.relname", [list(TABLES), list(TABLES)])
+        return cursor.fetchall()
+
+
+def set_logged(connection, logged):
+    """Switch every secrets table to logged or unlogged, returning the ones changed"""
+    quote = connection.ops.quote_name
+    changed = []
+    with connection.cursor() as cursor:
+        for name, unlogged in list_tables(connection):
+            if unlogged == logged:
+                cursor.execute("ALTER TABLE %s SET %s" % (quote(name), 'LOGGED' if logged else 'UNLOGGED'))
+                changed.append(name)
+    return changed
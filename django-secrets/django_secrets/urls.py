@@ -1,9 +1,17 @@
-from django.urls import path, re_path
-from .views import SecretCreateView, SecretUpdateView
+from django.urls import path, register_converter
+from .converters import OidConverter
+from .views import (SecretCreateView, SecretUpdateView, challenge, csrf_token, prometheus_metrics,
+                    secret_share)
 
 app_name = 'secrets'
 
+register_converter(OidConverter, 'oid')
+
 urlpatterns = [
     path('', SecretCreateView.as_view(), name='secret-create'),
-    re_path(r'^(?P<oid>[a-zA-Z0-9\-_]+)/$', SecretUpdateView.as_view(), name='secret-update'),
+    path('csrf/', csrf_token, name='csrf'),
+    path('challenge/', challenge, name='challenge'),
+    path('metrics/', prometheus_metrics, name='metrics'),
+    path('<oid:oid>/', SecretUpdateView.as_view(), name='secret-update'),
+    path('<oid:oid>/share/', secret_share, name='secret-share'),
 ]
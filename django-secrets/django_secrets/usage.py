@@ -0,0 +1,83 @@
+"""
+Usage statistics kept as per-minute counters.
+
+The create and reveal paths add to the UsageBucket row of the current
+minute with a single UPDATE, so the admin dashboard aggregates a few
+buckets instead of scanning the secrets table, whose rows are gone once
+revealed anyway. Buckets older than SECRETS_USAGE_RETENTION are removed
+by ``purge_secrets --expired``.
+
+Recording is best effort: it runs after the secret is stored or deleted,
+so a failing write (e.g. SQLite reporting the database as locked) is
+logged and the request it counts still succeeds. Don't call it inside a
+transaction, which such an error could leave unusable.
+
+Every event of a minute writes the same row, and on SQLite it is a second
+write transaction per request, so the counters are off unless
+SECRETS_USAGE_STATS = True.
+"""
+import datetime
+import logging
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import UsageBucket
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('created', 'revealed', 'expired', 'failed_attempts', 'bytes_stored')
+
+
+def is_enabled():
+    return getattr(settings, 'SECRETS_USAGE_STATS', False)
+
+
+def get_retention():
+    return datetime.timedelta(minutes=getattr(settings, 'SECRETS_USAGE_RETENTION', 7 * 24 * 60))
+
+
+def bucket_for(when=None):
+    return (when or timezone.now()).replace(second=0, microsecond=0)
+
+
+def record(**counts):
+    """Add counts (e.g. created=1, bytes_stored=size) to the current minute"""
+    counts = {name: value for name, value in counts.items() if value}
+    if not counts or not is_enabled():
+        return
+    unknown = set(counts) - set(COUNTERS)
+    if unknown:
+        raise ValueError('Unknown usage counters: %s' % ', '.join(sorted(unknown)))
+
+    try:
+        add(bucket_for(), counts)
+    except DatabaseError:
+        logger.warning('Could not record usage %s', counts, exc_info=True)
+
+
+def add(minute, counts):
+    buckets = UsageBucket.objects.filter(minute=minute)
+    changes = {name: F(name) + value for name, value in counts.items()}
+    if buckets.update(**changes):
+        return
+    try:
+        # First event of the minute; another worker may insert it first
+        with transaction.atomic():
+            UsageBucket.objects.create(minute=minute, **counts)
+    except IntegrityError:
+        buckets.update(**changes)
+
+
+def prune(now=None):
+    """Delete buckets past the retention period, returning how many"""
+    threshold = (now or timezone.now()) - get_retention()
+    deleted, _ = UsageBucket.objects.filter(minute__lt=threshold).delete()
+    return deleted
+
+
+def totals(since):
+    """Sum of every counter over the buckets from since on"""
+    sums = UsageBucket.objects.filter(minute__gte=bucket_for(since)).aggregate(
+        **{name: Sum(name) for name in COUNTERS})
+    return {name: value or 0 for name, value in sums.items()}
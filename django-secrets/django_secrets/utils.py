@@ -1,10 +1,31 @@
 import os
 import base64
+import binascii
+import datetime
+import struct
+import time
 import uuid
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from cryptography.exceptions import InvalidSignature, InvalidTag
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import InvalidToken
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.hmac import HMAC
+
+
+def get_default_ttl():
+    """Lifetime of a secret when none is chosen"""
+    return datetime.timedelta(minutes=getattr(settings, 'SECRETS_DEFAULT_TTL', 10))
+
+
+def get_ttl_bounds():
+    """Shortest and longest lifetime a secret may be given"""
+    return (datetime.timedelta(minutes=getattr(settings, 'SECRETS_MIN_TTL', 1)),
+            datetime.timedelta(minutes=getattr(settings, 'SECRETS_MAX_TTL', 10)))
 
 
 def generate_salt():
@@ -36,9 +57,9 @@ def decode_id(encoded_id):
         return None
 
 
-def passphrase_to_key(passphrase, salt):
+def derive_key(passphrase, salt):
     """
-    Derive encryption key from passphrase using PBKDF2.
+    Derive the raw 32-byte key from passphrase using PBKDF2.
     CRITICAL: Uses unique salt per secret (not shared SECRET_KEY).
     """
     kdf = PBKDF2HMAC(
@@ -48,33 +69,247 @@ def passphrase_to_key(passphrase, salt):
         iterations=600000,  # Increased from 100k for better security (OWASP 2023 recommendation)
         backend=default_backend()
     )
-    key = base64.urlsafe_b64encode(kdf.derive(passphrase.encode('utf-8')))
-    return key
+    return kdf.derive(passphrase.encode('utf-8'))
 
 
-def encrypt(data, passphrase, salt):
+def passphrase_to_key(passphrase, salt):
+    """Derive the urlsafe-base64 Fernet key from passphrase"""
+    return base64.urlsafe_b64encode(derive_key(passphrase, salt))
+
+
+def wipe(buffer):
+    """Overwrite a mutable buffer with zeros, in place"""
+    buffer[:] = bytes(len(buffer))
+
+
+# Fernet token layout: version, timestamp, IV, AES-128-CBC ciphertext, HMAC-SHA256
+FERNET_VERSION = 0x80
+FERNET_HEADER = 1 + 8 + 16
+FERNET_MAC = 32
+BLOCK = 16
+
+
+def fernet_encrypt(key, plain):
     """
-    Encrypt data with passphrase using unique salt.
-    Returns base64-encoded string (for storage in TextField).
+    Fernet-encrypt a bytes-like plaintext with a raw 32-byte key and return
+    the urlsafe-base64 token. The ciphertext is written into the token
+    buffer directly and only the padded last block is copied, so the
+    plaintext is never duplicated.
     """
-    key = passphrase_to_key(passphrase, salt)
-    plain = data.encode('utf-8')
-    encrypted_bytes = Fernet(key).encrypt(plain)
-    # Encode as base64 string for TextField storage
-    return base64.b64encode(encrypted_bytes).decode('ascii')
+    plain = memoryview(plain)
+    length = len(plain)
+    full = length - length % BLOCK
+    padding = BLOCK - length % BLOCK
 
+    iv = os.urandom(16)
+    token = bytearray(FERNET_HEADER + full + BLOCK + FERNET_MAC + BLOCK - 1)
+    token[0] = FERNET_VERSION
+    struct.pack_into('>Q', token, 1, int(time.time()))
+    token[9:FERNET_HEADER] = iv
 
-def decrypt(token, passphrase, salt):
+    out = memoryview(token)
+    encryptor = Cipher(algorithms.AES(key[16:]), modes.CBC(iv)).encryptor()
+    end = FERNET_HEADER
+    if full:
+        end += encryptor.update_into(plain[:full], out[end:])
+    last = bytearray(BLOCK)
+    last[:length - full] = plain[full:]
+    last[length - full:] = bytes((padding, )) * padding
+    end += encryptor.update_into(last, out[end:])
+    wipe(last)
+    encryptor.finalize()
+
+    mac = HMAC(key[:16], hashes.SHA256())
+    mac.update(out[:end])
+    out[end:end + FERNET_MAC] = mac.finalize()
+    return base64.urlsafe_b64encode(out[:end + FERNET_MAC])
+
+
+def fernet_decrypt(key, token):
     """
-    Decrypt token with passphrase using the provided salt.
-    Returns decrypted string (not bytes).
+    Verify and decrypt a urlsafe-base64 Fernet token with a raw 32-byte key.
+    Returns a bytearray and the plaintext length within it; the caller
+    wipes the bytearray once done with the plaintext.
     """
-    key = passphrase_to_key(passphrase, salt)
+    try:
+        raw = base64.urlsafe_b64decode(token)
+    except (TypeError, binascii.Error):
+        raise InvalidToken
+    size = len(raw) - FERNET_HEADER - FERNET_MAC
+    if size < BLOCK or size % BLOCK or raw[0] != FERNET_VERSION:
+        raise InvalidToken
+
+    view = memoryview(raw)
+    mac = HMAC(key[:16], hashes.SHA256())
+    mac.update(view[:-FERNET_MAC])
+    try:
+        mac.verify(raw[-FERNET_MAC:])
+    except InvalidSignature:
+        raise InvalidToken
+
+    decryptor = Cipher(algorithms.AES(key[16:]), modes.CBC(raw[9:FERNET_HEADER])).decryptor()
+    plain = bytearray(size + BLOCK - 1)
+    length = decryptor.update_into(view[FERNET_HEADER:-FERNET_MAC], plain)
+    decryptor.finalize()
+
+    padding = plain[length - 1]
+    if not 1 <= padding <= BLOCK or plain[length - padding:length] != bytes((padding, )) * padding:
+        wipe(plain)
+        raise InvalidToken
+    return plain, length - padding
+
+
+# Envelope layout: version, algorithm, reserved, nonce, ciphertext with tag.
+# The 15-byte header keeps the ciphertext base64-aligned and the version
+# byte makes every envelope start with 'A', unlike Fernet tokens ('g').
+ENVELOPE_VERSION = 0x01
+ENVELOPE_HEADER = struct.Struct('>BBB12s')
+AES_256_GCM = 1
+CHACHA20_POLY1305 = 2
+TAG = 16
+CIPHERS = {
+    'aes-256-gcm': AES_256_GCM,
+    'chacha20-poly1305': CHACHA20_POLY1305,
+}
+
+
+def get_cipher():
+    """Name of the engine new secrets are encrypted with"""
+    name = getattr(settings, 'SECRETS_CIPHER', 'fernet')
+    if name != 'fernet' and name not in CIPHERS:
+        raise ImproperlyConfigured(
+            "SECRETS_CIPHER must be 'fernet' or one of %s" % ', '.join(sorted(CIPHERS)))
+    return name
+
+
+def aead_encrypt(key, plain, algorithm=AES_256_GCM):
+    """
+    Encrypt a bytes-like plaintext with a raw 32-byte key into a urlsafe
+    base64 envelope. The header is authenticated as associated data.
+    """
+    nonce = os.urandom(12)
+    header = ENVELOPE_HEADER.pack(ENVELOPE_VERSION, algorithm, 0, nonce)
+
+    if algorithm == AES_256_GCM:
+        plain = memoryview(plain)
+        envelope = bytearray(ENVELOPE_HEADER.size + len(plain) + BLOCK - 1 + TAG)
+        envelope[:ENVELOPE_HEADER.size] = header
+        out = memoryview(envelope)
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+        encryptor.authenticate_additional_data(header)
+        end = ENVELOPE_HEADER.size + encryptor.update_into(plain, out[ENVELOPE_HEADER.size:])
+        encryptor.finalize()
+        out[end:end + TAG] = encryptor.tag
+        return base64.urlsafe_b64encode(out[:end + TAG])
+    if algorithm == CHACHA20_POLY1305:
+        return base64.urlsafe_b64encode(header + ChaCha20Poly1305(key).encrypt(nonce, plain, header))
+    raise ValueError('Unknown algorithm %r' % algorithm)
 
-    # Decode from base64 string to bytes
+
+def aead_decrypt(key, token):
+    """
+    Verify and decrypt a urlsafe-base64 envelope with a raw 32-byte key.
+    Returns a bytearray and the plaintext length within it, like
+    fernet_decrypt().
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token)
+    except (TypeError, binascii.Error):
+        raise InvalidToken
+    if len(raw) < ENVELOPE_HEADER.size + TAG:
+        raise InvalidToken
+    version, algorithm, reserved, nonce = ENVELOPE_HEADER.unpack_from(raw)
+    if version != ENVELOPE_VERSION:
+        raise InvalidToken
+
+    view = memoryview(raw)
+    header = view[:ENVELOPE_HEADER.size]
+    body = view[ENVELOPE_HEADER.size:]
+    try:
+        if algorithm == AES_256_GCM:
+            decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce, bytes(body[-TAG:]))).decryptor()
+            decryptor.authenticate_additional_data(header)
+            plain = bytearray(len(body) - TAG + BLOCK - 1)
+            length = decryptor.update_into(body[:-TAG], plain)
+            try:
+                decryptor.finalize()
+            except InvalidTag:
+                wipe(plain)
+                raise
+            return plain, length
+        if algorithm == CHACHA20_POLY1305:
+            plain = bytearray(ChaCha20Poly1305(key).decrypt(nonce, body, header))
+            return plain, len(plain)
+    except InvalidTag:
+        raise InvalidToken
+    raise InvalidToken
+
+
+def generate_data_key():
+    """A random raw 32-byte key for encrypting one payload"""
+    return bytearray(os.urandom(32))
+
+
+def encrypt_with_key(data, key):
+    """
+    Encrypt data (str or bytes-like) with a raw 32-byte key and the engine
+    named by SECRETS_CIPHER. Returns a Fernet token or an envelope as a str.
+    """
+    cipher = get_cipher()
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if cipher == 'fernet':
+        return fernet_encrypt(key, data).decode('ascii')
+    return aead_encrypt(key, data, CIPHERS[cipher]).decode('ascii')
+
+
+def ciphertext_size(length):
+    """
+    Length of what encrypt_with_key() returns for length bytes of
+    plaintext with the engine named by SECRETS_CIPHER.
+    """
+    if get_cipher() == 'fernet':
+        raw = FERNET_HEADER + (length // BLOCK + 1) * BLOCK + FERNET_MAC
+    else:
+        raw = ENVELOPE_HEADER.size + length + TAG
+    return 4 * -(-raw // 3)
+
+
+def decrypt_with_key(token, key):
+    """
+    Decrypt a Fernet token or envelope with a raw 32-byte key, whatever
+    SECRETS_CIPHER is now. Returns decrypted string (not bytes).
+    """
     if isinstance(token, str):
-        token = base64.b64decode(token.encode('ascii'))
+        token = token.encode('ascii')
+    if token[:1] == b'A':
+        plain, length = aead_decrypt(key, token)
+    else:
+        # Secrets stored before the token was kept as is hold base64 of it
+        if token[:1] != b'g':
+            try:
+                token = base64.b64decode(token)
+            except binascii.Error:
+                raise InvalidToken
+        plain, length = fernet_decrypt(key, token)
+    try:
+        return str(memoryview(plain)[:length], 'utf-8')
+    finally:
+        wipe(plain)
 
-    decrypted_bytes = Fernet(key).decrypt(token)
-    # Decode bytes to string before returning
-    return decrypted_bytes.decode('utf-8')
+
+def encrypt(data, passphrase, salt):
+    """
+    Encrypt data (str or bytes-like) with passphrase using unique salt and
+    the engine named by SECRETS_CIPHER. Returns a Fernet token or an
+    envelope as a str (for storage in TextField).
+    """
+    return encrypt_with_key(data, derive_key(passphrase, salt))
+
+
+def decrypt(token, passphrase, salt):
+    """
+    Decrypt a Fernet token or envelope with passphrase using the provided
+    salt, whatever SECRETS_CIPHER is now. Returns decrypted string (not bytes).
+    """
+    return decrypt_with_key(token, derive_key(passphrase, salt))
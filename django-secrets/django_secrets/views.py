@@ -1,23 +1,64 @@
-import datetime
 from django.views.generic.edit import CreateView, UpdateView
 from django.shortcuts import render
 from django.views.decorators.cache import never_cache
-from django.utils import timezone
-from django.http import Http404
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
+from django.urls import reverse
+from . import heavy_hitters, idempotency, metrics, proof_of_work, quota, usage
+from .admission import admission_control
 from .forms import SecretCreateForm, SecretUpdateForm
 from .mixins import KnuthIdMixin
 from .models import Secret
+from .sqlite import retry_on_locked, maybe_checkpoint
 
 
+@method_decorator(heavy_hitters.guard, name='post')
+@method_decorator(idempotency.idempotent, name='post')
+@method_decorator(admission_control, name='post')
 @method_decorator(ratelimit(key='ip', rate='10/h', method='POST'), name='post')
 class SecretCreateView(CreateView):
     model = Secret
     form_class = SecretCreateForm
     template_name_suffix = '_create'
 
+    def get_context_data(self, **kwargs):
+        context = super(SecretCreateView, self).get_context_data(**kwargs)
+        # Pre-rendered pages fetch their CSRF token from csrf_token()
+        context['prerendered'] = getattr(self.request, 'prerendered', False)
+        return context
 
+    def get_form_kwargs(self):
+        kwargs = super(SecretCreateView, self).get_form_kwargs()
+        kwargs['prerendered'] = getattr(self.request, 'prerendered', False)
+        return kwargs
+
+    def get_success_url(self):
+        # The share page is built from the oid alone, without a query
+        return reverse('secrets:secret-share', kwargs={'oid': self.object.oid})
+
+    def form_valid(self, form):
+        form.instance.creator_ip = self.request.META.get('REMOTE_ADDR')
+        response = super(SecretCreateView, self).form_valid(form)
+        recipients = form.recipients
+        stored = sum(recipient.size for recipient in recipients)
+        if self.object.payload_id:
+            stored += self.object.payload.size
+        usage.record(created=len(recipients), bytes_stored=stored)
+
+        if len(recipients) > 1:
+            # Every link is only ever shown here; retries get 409 instead
+            response = render(self.request, 'django_secrets/secret_links.html', {
+                'object': self.object,
+                'links': [self.request.build_absolute_uri(recipient.get_absolute_url())
+                          for recipient in recipients],
+            })
+        return idempotency.mark(response)
+
+
+@method_decorator(heavy_hitters.guard, name='post')
+@method_decorator(admission_control, name='post')
 @method_decorator(ratelimit(key='ip', rate='20/h', method='POST'), name='post')
 class SecretUpdateView(KnuthIdMixin, UpdateView):
     model = Secret
@@ -30,19 +71,83 @@ class SecretUpdateView(KnuthIdMixin, UpdateView):
         view = super(SecretUpdateView, cls).as_view(**kwargs)
         return never_cache(view)
 
-    def form_valid(self, form):
-        self.object = form.save(commit=False)
+    def get_queryset(self):
+        # The ciphertext is only read when a passphrase is checked
+        return super(SecretUpdateView, self).get_queryset().metadata()
 
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        # Expired rows are dropped before their ciphertext is ever fetched
+        self.check_expired()
+        form = self.get_form()
+        if form.is_valid():
+            return self.form_valid(form)
+        if form.has_error('passphrase'):
+            usage.record(failed_attempts=1)
+            heavy_hitters.record_failure(request)
+        return self.form_invalid(form)
+
+    def check_expired(self):
         # SECURITY: Double-check expiration before displaying
-        now = timezone.now()
-        threshold = now - datetime.timedelta(minutes=10)
-        if self.object.created_at < threshold:
-            self.object.delete()
+        if self.object.is_expired:
+            retry_on_locked(self.object.delete)
+            usage.record(expired=1)
             raise Http404("This secret has expired")
 
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        self.check_expired()
+
         # Delete the secret after successful retrieval
-        self.object.delete()
+        retry_on_locked(self.object.delete)
+        usage.record(revealed=1)
+        maybe_checkpoint(self.object._state.db)
 
         return render(self.request, 'django_secrets/secret_detail.html', {
             "object": self.object,
         })
+
+
+@never_cache
+def secret_share(request, oid):
+    """Where the creator lands: the link to share, for any well-formed oid"""
+    return render(request, 'django_secrets/secret_share.html', {
+        'share_url': request.build_absolute_uri(reverse('secrets:secret-update', kwargs={'oid': oid})),
+    })
+
+
+@never_cache
+def csrf_token(request):
+    """A CSRF token (and cookie) for forms on pre-rendered pages"""
+    return JsonResponse({'token': get_token(request)})
+
+
+@never_cache
+def challenge(request):
+    """A fresh proof-of-work challenge for the create form"""
+    if not proof_of_work.is_enabled():
+        raise Http404
+    value, difficulty = proof_of_work.issue()
+    return JsonResponse({'challenge': value, 'difficulty': difficulty})
+
+
+@never_cache
+@metrics.scraper_or_staff
+def prometheus_metrics(request):
+    """Counters in the Prometheus text exposition format"""
+    lines = []
+    for name, value in metrics.get_counters().items():
+        lines.append('# HELP django_secrets_%s_total %s' % (name, metrics.COUNTERS[name]))
+        lines.append('# TYPE django_secrets_%s_total counter' % name)
+        lines.append('django_secrets_%s_total %d' % (name, value))
+    if quota.is_enabled():
+        limits = quota.limits()
+        for name, value in quota.usage().items():
+            lines.append('# HELP django_secrets_stored_%s Live %s counted against the quota' % (name, name))
+            lines.append('# TYPE django_secrets_stored_%s gauge' % name)
+            lines.append('django_secrets_stored_%s %d' % (name, value))
+            if limits[name] is not None:
+                lines.append('# HELP django_secrets_quota_%s Quota on stored %s' % (name, name))
+                lines.append('# TYPE django_secrets_quota_%s gauge' % name)
+                lines.append('django_secrets_quota_%s %d' % (name, limits[name]))
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
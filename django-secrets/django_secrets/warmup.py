@@ -0,0 +1,127 @@
+"""
+Warm-up of a freshly loaded application.
+
+The first request a worker serves otherwise pays for work done lazily
+once per process: compiling the URL resolver, loading and compiling
+templates (and the crispy-forms template pack), initialising the OpenSSL
+backend of cryptography, and loading the database driver. ``warm_up``
+does all of it at import time in ``website.wsgi``, before the worker
+accepts traffic.
+
+With gunicorn's preload_app the warm-up runs once in the master and the
+workers inherit the result. Database connections are left as they were
+found: any the steps open, rendering pages included, are closed once they
+are done, so the master never hands an open socket to its children. Call
+``connect`` from the post_fork hook to open each worker's own.
+
+Set SECRETS_WARMUP = False to skip it.
+"""
+import logging
+import os
+import time
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+from . import prerender, utils
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = (
+    'django_secrets/secret_create.html',
+    'django_secrets/secret_update.html',
+    'django_secrets/secret_share.html',
+    'django_secrets/secret_detail.html',
+    'django_secrets/secret_links.html',
+)
+
+
+def is_enabled():
+    return getattr(settings, 'SECRETS_WARMUP', True)
+
+
+def warm_crypto():
+    """Run every cipher once so OpenSSL and its bindings are initialised"""
+    key = os.urandom(32)
+    plain, length = utils.fernet_decrypt(key, utils.fernet_encrypt(key, b'warm-up'))
+    utils.wipe(plain)
+    for algorithm in utils.CIPHERS.values():
+        plain, length = utils.aead_decrypt(key, utils.aead_encrypt(key, b'warm-up', algorithm))
+        utils.wipe(plain)
+    # One iteration is enough to load the KDF, without its real cost
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=key[:16], iterations=1).derive(b'warm-up')
+
+
+def warm_urls():
+    """Import the URLconf and compile its patterns both ways"""
+    resolve(reverse('secrets:secret-create'))
+
+
+def warm_templates():
+    for name in getattr(settings, 'SECRETS_WARMUP_TEMPLATES', TEMPLATES):
+        get_template(name)
+
+
+def warm_pages():
+    """Render the pre-renderable pages, which runs their views and forms"""
+    for name in prerender.get_pages():
+        prerender.render_page(name)
+
+
+def warm_database():
+    """Load the drivers and check every database"""
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def open_connections():
+    return {connection.alias for connection in connections.all()
+            if connection.connection is not None}
+
+
+def close_new_connections(opened):
+    """Close the connections that weren't open before, i.e. not in opened"""
+    for connection in connections.all():
+        if connection.alias not in opened and connection.connection is not None:
+            connection.close()
+
+
+def connect():
+    """Open this process' database connections ahead of its first request"""
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except Exception:
+            logger.warning('Could not connect to %s', connection.alias, exc_info=True)
+
+
+STEPS = (
+    ('crypto', warm_crypto),
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('pages', warm_pages),
+    ('database', warm_database),
+)
+
+
+def warm_up():
+    """Run every warm-up step; returns the seconds each one took"""
+    timings = {}
+    if not is_enabled():
+        return timings
+    opened = open_connections()
+    try:
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                # A cold worker is better than one that doesn't start
+                logger.warning('Warm-up step %s failed', name, exc_info=True)
+                continue
+            timings[name] = time.perf_counter() - start
+    finally:
+        close_new_connections(opened)
+    return timings
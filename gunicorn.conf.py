@@ -0,0 +1,22 @@
+"""
+Gunicorn settings, read from the working directory.
+
+The application is loaded and warmed up once in the master (see
+website.wsgi and django_secrets.warmup), then every worker is forked from
+that warm copy and shares its memory. gc.freeze() right before each fork
+moves everything loaded so far out of the collector's reach, so the
+workers' collections don't write to, and so copy, those shared pages.
+"""
+import gc
+
+preload_app = True
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The master closed its connections; open this worker's own
+    from django_secrets import warmup
+    warmup.connect()
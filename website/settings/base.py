@@ -42,6 +42,8 @@ INSTALLED_APPS = (
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Before anything reads the body
+    'django_secrets.middleware.RequestSizeLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,6 +55,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'website.urls'
 
+# Places secrets on the databases listed in SECRETS_SHARDS, if any
+DATABASE_ROUTERS = ['django_secrets.sharding.ShardRouter']
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -72,6 +77,25 @@ TEMPLATES = [
     },
 ]
 
+# Public pages rendered by Jinja2 (see django_secrets/jinja.py); templates
+# it cannot find, the admin's included, still come from the engine above
+JINJA2_TEMPLATES = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'DIRS': [
+        os.path.join(BASE_DIR, "jinja2"),
+    ],
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'environment': 'django_secrets.jinja.environment',
+        'context_processors': [
+            'website.context_processors.google_analytics',
+        ],
+    },
+}
+
+if os.environ.get('TEMPLATE_ENGINE') == 'jinja2':
+    TEMPLATES.insert(0, JINJA2_TEMPLATES)
+
 WSGI_APPLICATION = 'website.wsgi.application'
 
 
@@ -122,6 +146,11 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, '..', 'media')
 
+# Pages written to files by `manage.py prerender_pages`
+SECRETS_PRERENDER_ROOT = os.path.join(BASE_DIR, '..', 'prerendered')
+
+SECRETS_PRERENDER_PAGES = ('about', 'terms', 'secrets:secret-create', )
+
 LOCALE_PATHS = (
     os.path.join(BASE_DIR, "locales"),
 )
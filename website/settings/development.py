@@ -24,4 +24,9 @@ DATABASES = {
     }
 }
 
+SECRETS_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+}
+
 # Allow stricter CSP in development too (no unsafe-inline)
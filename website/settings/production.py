@@ -11,6 +11,8 @@ GOOGLE_ANALYTICS_PROPERTY_ID = os.environ['GOOGLE_ANALYTICS_PROPERTY_ID']
 SECRET_KNUTH_PRIME = int(os.environ['SECRET_KNUTH_PRIME'])
 SECRET_KNUTH_INVERSE = int(os.environ['SECRET_KNUTH_INVERSE'])
 SECRET_KNUTH_RANDOM = int(os.environ['SECRET_KNUTH_RANDOM'])
+# Lets Prometheus scrape /metrics/ with it as a bearer token
+SECRETS_METRICS_TOKEN = os.environ.get('SECRETS_METRICS_TOKEN')
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -22,7 +24,9 @@ ALLOWED_HOSTS = ['xms.herokuapp.com', ]
 
 import dj_database_url
 DATABASES = {}
-DATABASES['default'] =  dj_database_url.config()
+# Keep connections between requests, so the one each gunicorn worker opens
+# after the fork (see gunicorn.conf.py) serves its first request too
+DATABASES['default'] =  dj_database_url.config(conn_max_age=600, conn_health_checks=True)
 
 SECURE_SSL_REDIRECT = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -32,3 +36,9 @@ SECURE_BROWSER_XSS_FILTER = True
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 X_FRAME_OPTIONS = 'DENY'
+
+# Serve the pages written by `manage.py prerender_pages` (see bin/post_compile)
+from django_secrets.prerender import add_headers
+WHITENOISE_ROOT = SECRETS_PRERENDER_ROOT
+WHITENOISE_INDEX_FILE = True
+WHITENOISE_ADD_HEADERS_FUNCTION = add_headers
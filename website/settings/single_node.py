@@ -0,0 +1,50 @@
+import os
+from .base import *
+
+
+# Profile for small self-hosted installs: several gunicorn workers on one
+# machine sharing a single SQLite file.
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ['SECRET_KEY']
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost').split(',')
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/databases/#sqlite-notes
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'SQLITE_PATH', os.path.join(BASE_DIR, '..', 'db', 'secrets.sqlite3')),
+        # Keep the connection, and the pragmas set on it, between requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds a writer waits for the lock before "database is locked"
+            'timeout': 5,
+        },
+    }
+}
+
+# WAL lets readers proceed while a writer commits, and synchronous=normal
+# only fsyncs at checkpoints. A crash can lose the last few commits, which
+# is acceptable for secrets that live ten minutes.
+SECRETS_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+SECRETS_SQLITE_CHECKPOINT_INTERVAL = 60
+
+# Never run more key derivations at once than there are cores; shed the rest
+SECRETS_ADMISSION = {
+    'MAX_CONCURRENCY': os.cpu_count() or 1,
+    'LOCK_DIR': os.path.join(BASE_DIR, '..', 'db', 'admission'),
+    'RETRY_AFTER': 1,
+}
@@ -19,7 +19,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory',
-    }
+    },
+    # Second secrets database for the sharding tests (SECRETS_SHARDS)
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
 }
 
 # Use simple static file storage for tests (no manifest)
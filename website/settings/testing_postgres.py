@@ -0,0 +1,21 @@
+import os
+from .testing import *
+
+
+# Run the test suite against a local PostgreSQL, e.g.
+#   POSTGRES_DB=secrets python manage.py test django_secrets \
+#       --settings=website.settings.testing_postgres
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'secrets'),
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', ''),
+        'PORT': os.environ.get('POSTGRES_PORT', ''),
+    }
+}
+DATABASES['shard1'] = dict(DATABASES['default'], NAME=DATABASES['default']['NAME'] + '_shard1')
+
+SECRETS_POSTGRES_PARTITIONING = True
@@ -15,3 +15,8 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "website.settings.development")
 
 # WhiteNoise is now handled via middleware in settings.py
 application = get_wsgi_application()
+
+# Pay the first-request costs now, before this process takes any traffic
+from django_secrets.warmup import warm_up  # noqa: E402
+
+warm_up()